@@ -0,0 +1,2 @@
+# Growth and meshing benchmarks along scaling axes, through the python bindings and the native library.
+# Run from the directory containing the m_tree library: python -m benchmarks run -o results.json
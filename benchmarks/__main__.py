@@ -0,0 +1,164 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from .cases import AXES, get_cases, get_description
+
+RESULTS_VERSION = 1
+COMPARED_METRICS = ["growth_time", "meshing_time", "peak_memory"]
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark tree growth and meshing along scaling axes, and compare results between commits.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks and write their results as json")
+    run_parser.add_argument("-o", "--output", default="benchmark_results.json", help="path of the results file")
+    run_parser.add_argument("-r", "--repeat", type=int, default=3, help="repetitions of each case, the fastest one is kept")
+    run_parser.add_argument("-a", "--axis", action="append", choices=list(AXES), help="only run the cases of this axis, can be given several times")
+    run_parser.add_argument("-p", "--path", choices=["python", "native", "both"], default="both", help="run the cases through the python bindings, the native library or both")
+    run_parser.add_argument("--native", default=None, help="path of the m_tree_benchmarks executable, searched in m_tree/binaries by default")
+
+    compare_parser = subparsers.add_parser("compare", help="compare two results files")
+    compare_parser.add_argument("baseline", help="results of the reference commit")
+    compare_parser.add_argument("candidate", help="results of the commit to check")
+    compare_parser.add_argument("-t", "--threshold", type=float, default=.1, help="relative increase of a metric reported as a regression")
+    return parser.parse_args(argv)
+
+
+def run_python_case(parameters, repeat):
+    # imported in the worker process only, the parent process doesn't need the library
+    import m_tree
+    from headless.graph import create_function, create_mesher
+    description = get_description(parameters)
+    growth_times, meshing_times = [], []
+    for _ in range(repeat):
+        tree = m_tree.Tree()
+        tree.set_trunk_function(create_function(description["trunk"]))
+        start = time.perf_counter()
+        tree.execute_functions()
+        growth_times.append(time.perf_counter() - start)
+        mesher = create_mesher(description["mesher"]) # a new mesher each time, so that the smoothing adjacency is not reused
+        start = time.perf_counter()
+        mesh = mesher.mesh_tree(tree)
+        meshing_times.append(time.perf_counter() - start)
+    return {
+        "growth_time": min(growth_times),
+        "meshing_time": min(meshing_times),
+        "node_count": tree.get_node_count(),
+        "vertex_count": len(mesh.get_vertices()) // 3,
+        "polygon_count": len(mesh.get_polygons()) // 4,
+        "peak_memory": m_tree.get_peak_memory_usage(),
+    }
+
+
+def run_native_case(executable, parameters, repeat):
+    arguments = [executable, "--repeat", str(repeat)]
+    for name, value in parameters.items():
+        arguments += ["--" + name.replace("_", "-"), str(value)]
+    output = subprocess.run(arguments, capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def find_native_executable():
+    name = "m_tree_benchmarks.exe" if platform.system() == "Windows" else "m_tree_benchmarks"
+    for directory in ["binaries", os.path.join("binaries", "Release")]:
+        path = os.path.join(REPOSITORY_DIRECTORY, "m_tree", directory, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPOSITORY_DIRECTORY, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def add_rates(result):
+    result["nodes_per_second"] = result["node_count"] / result["growth_time"] if result["growth_time"] > 0 else None
+    result["vertices_per_second"] = result["vertex_count"] / result["meshing_time"] if result["meshing_time"] > 0 else None
+    return result
+
+
+def run(arguments):
+    paths = ["python", "native"] if arguments.path == "both" else [arguments.path]
+    native_executable = arguments.native or find_native_executable()
+    if "native" in paths and native_executable is None:
+        print("m_tree_benchmarks executable not found, build m_tree or give its path with --native. Only the python path is run")
+        paths.remove("native")
+    if not paths:
+        return 1
+
+    results = []
+    cases = get_cases(arguments.axis)
+    for i, (axis, value, parameters) in enumerate(cases, 1):
+        for path in paths:
+            # each case runs in its own process, so that its peak memory isn't hidden by the previous cases
+            if path == "python":
+                with ProcessPoolExecutor(max_workers=1) as executor:
+                    result = executor.submit(run_python_case, parameters, arguments.repeat).result()
+            else:
+                result = run_native_case(native_executable, parameters, arguments.repeat)
+            results.append({"path": path, "axis": axis, "value": value, "parameters": parameters, **add_rates(result)})
+            print(f"[{i}/{len(cases)}] {path} {axis}={value}: growth {result['growth_time'] * 1000:.1f} ms, meshing {result['meshing_time'] * 1000:.1f} ms, "
+                  f"{result['node_count']} nodes, {result['vertex_count']} vertices, peak memory {result['peak_memory'] / 2**20:.0f} MB")
+
+    report = {
+        "version": RESULTS_VERSION,
+        "commit": get_commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "repeat": arguments.repeat,
+        "results": results,
+    }
+    with open(arguments.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"results written to {arguments.output}")
+    return 0
+
+
+def compare(arguments):
+    with open(arguments.baseline) as file:
+        baseline = json.load(file)
+    with open(arguments.candidate) as file:
+        candidate = json.load(file)
+    baseline_results = {(result["path"], result["axis"], result["value"]): result for result in baseline["results"]}
+
+    regression_count = 0
+    for result in candidate["results"]:
+        key = (result["path"], result["axis"], result["value"])
+        reference = baseline_results.get(key, None)
+        if reference is None:
+            continue
+        ratios = []
+        for metric in COMPARED_METRICS:
+            ratio = result[metric] / reference[metric] if reference[metric] > 0 else 1
+            is_regression = ratio > 1 + arguments.threshold
+            regression_count += is_regression
+            ratios.append(f"{metric} x{ratio:.2f}{' REGRESSION' if is_regression else ''}")
+        # a different tree takes a different time, the timings are then not comparable
+        if result["node_count"] != reference["node_count"] or result["vertex_count"] != reference["vertex_count"]:
+            ratios.append("tree changed")
+        print(f"{key[0]} {key[1]}={key[2]}: {', '.join(ratios)}")
+    print(f"{regression_count} regressions above {arguments.threshold:.0%} between {baseline.get('commit')} and {candidate.get('commit')}")
+    return 1 if regression_count > 0 else 0
+
+
+def main(argv=None):
+    arguments = parse_arguments(sys.argv[1:] if argv is None else argv)
+    if arguments.command == "run":
+        return run(arguments)
+    return compare(arguments)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+# Each case changes one parameter of the base tree along a scaling axis.
+# The graph is the one of create_graph in m_tree/benchmarks/main.cpp, so that both paths grow the same trees
+
+BASE_PARAMETERS = {
+    "trunk_length": 10,
+    "branch_layers": 2,
+    "branches_density": 1,
+    "resolution": 2,
+    "growth_iterations": 0, # no growth function when 0
+    "radial_resolution": 32,
+    "smooth_iterations": 4,
+}
+
+AXES = {
+    "trunk_length": [5, 10, 20, 40],
+    "branch_layers": [1, 2, 3],
+    "branches_density": [.5, 1, 2, 4],
+    "resolution": [1, 2, 4, 8],
+    "growth_iterations": [0, 3, 6],
+    "radial_resolution": [8, 16, 32, 64],
+    "smooth_iterations": [0, 4, 8],
+}
+
+
+def get_cases(axes=None):
+    # (axis, value, parameters) of every case of the given axes, all axes by default
+    cases = []
+    for axis in AXES if axes is None else axes:
+        if axis not in AXES:
+            raise ValueError(f"unknown axis '{axis}', expected one of {list(AXES)}")
+        for value in AXES[axis]:
+            cases.append((axis, value, {**BASE_PARAMETERS, axis: value}))
+    return cases
+
+
+def get_description(parameters):
+    # graph description in the format of the headless generator
+    trunk = {"type": "trunk", "seed": 1, "length": parameters["trunk_length"], "resolution": parameters["resolution"], "children": []}
+    parent = trunk
+    if parameters["growth_iterations"] > 0:
+        growth = {"type": "growth", "seed": 2, "iterations": parameters["growth_iterations"], "children": []}
+        parent["children"].append(growth)
+        parent = growth
+    for i in range(parameters["branch_layers"]):
+        branch = {"type": "branch", "seed": 3 + i, "length": 9 / (i + 1), "branches_density": parameters["branches_density"],
+                  "resolution": parameters["resolution"], "children": []}
+        parent["children"].append(branch)
+        parent = branch
+    mesher = {"radial_resolution": parameters["radial_resolution"], "smoothness": parameters["smooth_iterations"]}
+    return {"mesher": mesher, "trunk": trunk}
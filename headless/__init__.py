@@ -0,0 +1,2 @@
+# Tree generation without blender, on top of the m_tree python module.
+# Run from the directory containing the m_tree library: python -m headless description.json -n 100 -f ply
@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import m_tree
+from .graph import load_description, create_function, create_mesher, create_lod_levels, create_leaves_function
+from .export import WRITERS
+
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(prog="python -m headless", description="Generate trees from a json or yaml description of a function graph, without blender.")
+    parser.add_argument("description", help="path to the json or yaml description of the tree")
+    parser.add_argument("-o", "--output", default="trees", help="directory in which the meshes are written")
+    parser.add_argument("-n", "--count", type=int, default=1, help="number of trees to generate")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="variant seed of the first tree, the following trees use the next seeds")
+    parser.add_argument("-f", "--format", choices=list(WRITERS), default="obj", help="file format of the meshes")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--name", default="tree", help="file name prefix of the meshes")
+    parser.add_argument("--profile", action="store_true", help="print the time spent in each function and meshing step of every tree")
+    return parser.parse_args(argv)
+
+
+def generate_tree(description, variant_seed, path, file_format, profile=False):
+    trunk_function = create_function(description["trunk"])
+    trunk_function.reseed(variant_seed)
+    tree = m_tree.Tree()
+    tree.set_trunk_function(trunk_function)
+    tree.execute_functions()
+    mesher = create_mesher(description.get("mesher", {}))
+    mesher.detailed_profiling = profile
+    if "lods" in description:
+        # every level is meshed from the same grown tree, written next to each other with a _lod suffix
+        root, extension = os.path.splitext(path)
+        paths = [f"{root}_lod{i}{extension}" for i in range(len(description["lods"]))]
+        for mesh, lod_path in zip(mesher.mesh_tree_lods(tree, create_lod_levels(description["lods"])), paths):
+            WRITERS[file_format](mesh, lod_path)
+    else:
+        paths = [path]
+        WRITERS[file_format](mesher.mesh_tree(tree), path)
+    instances = tree.get_branch_instances()
+    if len(instances["prototype_indices"]) > 0:
+        # instanced branches are written once per prototype, with the transforms placing them in the tree
+        root, extension = os.path.splitext(path)
+        for i, mesh in enumerate(mesher.mesh_prototypes(tree)):
+            paths.append(f"{root}_prototype{i}{extension}")
+            WRITERS[file_format](mesh, paths[-1])
+        paths.append(f"{root}_instances.npz")
+        np.savez(paths[-1], **instances)
+    if "leaves" in description:
+        # placements of the leaves, for instancing a leaf mesh on them
+        paths.append(f"{os.path.splitext(path)[0]}_leaves.npz")
+        np.savez(paths[-1], **create_leaves_function(description["leaves"]).execute(tree))
+    if not profile:
+        return paths, None
+    meshing = None if "lods" in description else mesher.get_profile() # levels of detail are not profiled
+    return paths, {"growth": tree.get_profile(), "meshing": meshing, "peak_memory": m_tree.get_peak_memory_usage()}
+
+
+def format_profile(profile):
+    lines = []
+    for function in profile["growth"]["functions"]:
+        lines.append(f"    {function['id']} {function['name']}: {function['time'] * 1000:.1f} ms, {function['node_count']} nodes")
+    meshing = profile["meshing"]
+    if meshing is not None:
+        lines.append(f"    meshing: {meshing['meshing_time'] * 1000:.1f} ms (rings {meshing['ring_time'] * 1000:.1f} ms, bridges {meshing['bridge_time'] * 1000:.1f} ms), smoothing: {meshing['smoothing_time'] * 1000:.1f} ms")
+        lines.append(f"    {meshing['vertex_count']} vertices, {meshing['polygon_count']} polygons")
+    lines.append(f"    peak memory {profile['peak_memory'] / 2**20:.0f} MB")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    arguments = parse_arguments(sys.argv[1:] if argv is None else argv)
+    description = load_description(arguments.description)
+    create_function(description["trunk"]) # report description errors before starting the workers
+    create_leaves_function(description.get("leaves", {}))
+    os.makedirs(arguments.output, exist_ok=True)
+
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(1, arguments.workers)) as executor:
+        futures = []
+        for i in range(arguments.count):
+            variant_seed = arguments.seed + i
+            path = os.path.join(arguments.output, f"{arguments.name}_{variant_seed}.{arguments.format}")
+            futures.append(executor.submit(generate_tree, description, variant_seed, path, arguments.format, arguments.profile))
+        for finished_count, future in enumerate(as_completed(futures), 1):
+            paths, profile = future.result()
+            print(f"[{finished_count}/{arguments.count}] {', '.join(paths)}")
+            if profile is not None:
+                print(format_profile(profile))
+    print(f"generated {arguments.count} trees in {time.perf_counter() - start_time:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
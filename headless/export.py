@@ -0,0 +1,48 @@
+import numpy as np
+
+
+# polygons are reversed when written, the same way the blender addon flips them to get outward normals
+def get_faces(buffers):
+    faces = buffers["polygons"].reshape(-1, 4)[:, ::-1]
+    uv_faces = buffers["uv_loops"].reshape(-1, 4)[:, ::-1]
+    return faces, uv_faces
+
+
+def write_obj(mesh, path):
+    buffers = mesh.get_buffers()
+    faces, uv_faces = get_faces(buffers)
+    with open(path, "w") as file:
+        np.savetxt(file, buffers["vertices"].reshape(-1, 3), fmt="v %.6f %.6f %.6f")
+        np.savetxt(file, buffers["uvs"].reshape(-1, 2), fmt="vt %.6f %.6f")
+        # obj indices start at 1, each corner is written as vertex/uv
+        corners = np.stack((faces + 1, uv_faces + 1), axis=-1).reshape(-1, 8)
+        np.savetxt(file, corners, fmt="f %d/%d %d/%d %d/%d %d/%d")
+
+
+# binary formats are written natively, with the radius and direction attributes and the uvs
+def write_ply(mesh, path):
+    mesh.write(path, "ply")
+
+
+def write_glb(mesh, path):
+    mesh.write(path, "glb")
+
+
+def write_raw(mesh, path):
+    mesh.write(path, "raw")
+
+
+def write_npz(mesh, path):
+    # raw buffers of the mesh, as returned by Mesh.get_buffers
+    buffers = mesh.get_buffers()
+    attributes = {f"attribute_{name}": data for name, data in buffers["attributes"].items()}
+    np.savez(path, vertices=buffers["vertices"], polygons=buffers["polygons"], uvs=buffers["uvs"], uv_loops=buffers["uv_loops"], **attributes)
+
+
+WRITERS = {
+    "obj": write_obj,
+    "ply": write_ply,
+    "glb": write_glb,
+    "raw": write_raw,
+    "npz": write_npz,
+}
@@ -0,0 +1,103 @@
+import json
+import m_tree
+
+
+FUNCTION_TYPES = {
+    "trunk": m_tree.TrunkFunction,
+    "branch": m_tree.BranchFunction,
+    "growth": m_tree.GrowthFunction,
+    "pipe_radius": m_tree.PipeRadiusFunction,
+}
+
+PROPERTY_TYPES = {
+    "constant": m_tree.ConstantProperty,
+    "random": m_tree.RandomProperty,
+    "ramp": m_tree.SimpleCurveProperty,
+    "curve": m_tree.CurveProperty,
+}
+
+
+def load_description(path):
+    with open(path) as file:
+        if path.endswith(".yaml") or path.endswith(".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("PyYAML is needed to read yaml descriptions, use a json description instead")
+            return yaml.safe_load(file)
+        return json.load(file)
+
+
+def create_property(description):
+    # a number is a constant property, a dict describes the property node: {"type": "random", "min": .5, "max": 1}
+    # or {"type": "curve", "points": [[0, 9], [.5, 6], [1, 2]]}
+    if not isinstance(description, dict):
+        description = {"type": "constant", "value": description}
+    description = dict(description)
+    property_type = description.pop("type", "constant")
+    if property_type not in PROPERTY_TYPES:
+        raise ValueError(f"unknown property type '{property_type}', expected one of {list(PROPERTY_TYPES)}")
+    property = PROPERTY_TYPES[property_type]()
+    for name, value in description.items():
+        if not hasattr(property, name):
+            raise ValueError(f"{property_type} property has no parameter '{name}'")
+        if name == "points": # [[x, y], ...] of a curve
+            value = [(float(x), float(y)) for x, y in value]
+        else:
+            value = float(value)
+        setattr(property, name, value)
+    return m_tree.PropertyWrapper(property)
+
+
+def create_function(description):
+    # {"type": "branch", "length": 9, "start_angle": {"type": "random", "min": 30, "max": 60}, "children": [...]}
+    description = dict(description)
+    function_type = description.pop("type", None)
+    if function_type not in FUNCTION_TYPES:
+        raise ValueError(f"unknown function type '{function_type}', expected one of {list(FUNCTION_TYPES)}")
+    children = description.pop("children", [])
+    function = FUNCTION_TYPES[function_type]()
+    for name, value in description.items():
+        if not hasattr(function, name):
+            raise ValueError(f"{function_type} function has no parameter '{name}'")
+        if isinstance(getattr(function, name), m_tree.PropertyWrapper):
+            value = create_property(value)
+        setattr(function, name, value)
+    for child in children:
+        function.add_child(create_function(child))
+    return function
+
+
+def create_mesher(description):
+    mesher = m_tree.ManifoldMesher()
+    mesher.radial_n_points = description.get("radial_resolution", 32)
+    mesher.smooth_iterations = description.get("smoothness", 4)
+    mesher.target_edge_length = description.get("target_edge_length", 0)
+    mesher.min_radial_resolution = description.get("min_radial_resolution", 4)
+    mesher.thread_count = 1 # trees are already generated in parallel by the worker processes
+    return mesher
+
+
+def create_leaves_function(description):
+    # {"density": 10, "max_radius": .05, "size": .1, ...}, any parameter of m_tree.LeavesFunction
+    leaves_function = m_tree.LeavesFunction()
+    for name, value in description.items():
+        if not hasattr(leaves_function, name):
+            raise ValueError(f"leaves function has no parameter '{name}'")
+        setattr(leaves_function, name, value)
+    return leaves_function
+
+
+def create_lod_levels(descriptions):
+    # [{"radial_resolution": 16, "min_radius": .005, "max_angle": 5, "smoothness": 2}, ...]
+    levels = []
+    for description in descriptions:
+        level = m_tree.LodLevel()
+        level.radial_resolution = description.get("radial_resolution", 8)
+        level.min_radius = description.get("min_radius", 0)
+        level.max_angle = description.get("max_angle", 0)
+        level.smooth_iterations = description.get("smoothness", 0)
+        level.target_edge_length = description.get("target_edge_length", 0)
+        level.min_radial_resolution = description.get("min_radial_resolution", 4)
+        levels.append(level)
+    return levels
@@ -0,0 +1,128 @@
+#include <iostream>
+#include <string>
+#include <map>
+#include <chrono>
+#include <algorithm>
+#include <stdexcept>
+
+#include "source/tree/Tree.hpp"
+#include "source/tree_functions/TrunkFunction.hpp"
+#include "source/tree_functions/BranchFunction.hpp"
+#include "source/tree_functions/GrowthFunction.hpp"
+#include "source/meshers/manifold_mesher/ManifoldMesher.hpp"
+#include "source/utilities/Profiling.hpp"
+
+// Grows and meshes one benchmark tree and prints its timings as json.
+// The graph is the one built by benchmarks/cases.py for the python bindings, the suite is run by `python -m benchmarks`
+
+using namespace Mtree;
+
+struct BenchmarkParameters
+{
+    float trunk_length = 10;
+    int branch_layers = 2;
+    float branches_density = 1;
+    float resolution = 2;
+    int growth_iterations = 0; // no growth function when 0
+    int radial_resolution = 32;
+    int smooth_iterations = 4;
+    int repeat = 3;
+};
+
+std::shared_ptr<TreeFunction> create_graph(const BenchmarkParameters& parameters)
+{
+    auto trunk = std::make_shared<TrunkFunction>();
+    trunk->seed = 1;
+    trunk->length = parameters.trunk_length;
+    trunk->resolution = parameters.resolution;
+    std::shared_ptr<TreeFunction> parent = trunk;
+    if (parameters.growth_iterations > 0)
+    {
+        auto growth = std::make_shared<GrowthFunction>();
+        growth->seed = 2;
+        growth->iterations = parameters.growth_iterations;
+        parent->add_child(growth);
+        parent = growth;
+    }
+    for (int i = 0; i < parameters.branch_layers; i++)
+    {
+        auto branch = std::make_shared<BranchFunction>();
+        branch->seed = 3 + i;
+        branch->length = ConstantProperty{ 9.f / (i + 1) };
+        branch->branches_density = parameters.branches_density;
+        branch->resolution = parameters.resolution;
+        parent->add_child(branch);
+        parent = branch;
+    }
+    return trunk;
+}
+
+BenchmarkParameters parse_arguments(int argc, char** argv)
+{
+    BenchmarkParameters parameters;
+    std::map<std::string, float*> float_arguments{ {"--trunk-length", &parameters.trunk_length}, {"--branches-density", &parameters.branches_density}, {"--resolution", &parameters.resolution} };
+    std::map<std::string, int*> int_arguments{ {"--branch-layers", &parameters.branch_layers}, {"--growth-iterations", &parameters.growth_iterations},
+        {"--radial-resolution", &parameters.radial_resolution}, {"--smooth-iterations", &parameters.smooth_iterations}, {"--repeat", &parameters.repeat} };
+    for (int i = 1; i < argc; i += 2)
+    {
+        std::string name = argv[i];
+        if (i + 1 >= argc)
+            throw std::invalid_argument("missing value of " + name);
+        if (float_arguments.count(name))
+            *float_arguments[name] = std::stof(argv[i + 1]);
+        else if (int_arguments.count(name))
+            *int_arguments[name] = std::stoi(argv[i + 1]);
+        else
+            throw std::invalid_argument("unknown argument " + name);
+    }
+    parameters.repeat = std::max(1, parameters.repeat);
+    return parameters;
+}
+
+float get_seconds_since(std::chrono::steady_clock::time_point start)
+{
+    return std::chrono::duration<float>(std::chrono::steady_clock::now() - start).count();
+}
+
+int main(int argc, char** argv)
+{
+    BenchmarkParameters parameters;
+    try
+    {
+        parameters = parse_arguments(argc, argv);
+    }
+    catch (const std::exception& e)
+    {
+        std::cerr << e.what() << std::endl;
+        return 2;
+    }
+
+    // the fastest repetition is kept, it is the least disturbed by the rest of the machine
+    float growth_time = -1, meshing_time = -1;
+    int node_count = 0, vertex_count = 0, polygon_count = 0;
+    for (int i = 0; i < parameters.repeat; i++)
+    {
+        Tree tree{ create_graph(parameters) };
+        auto start = std::chrono::steady_clock::now();
+        tree.execute_functions();
+        float time = get_seconds_since(start);
+        growth_time = growth_time < 0 ? time : std::min(growth_time, time);
+
+        ManifoldMesher mesher; // a new mesher each time, so that the smoothing adjacency is not reused
+        mesher.radial_resolution = parameters.radial_resolution;
+        mesher.smooth_iterations = parameters.smooth_iterations;
+        start = std::chrono::steady_clock::now();
+        Mesh mesh = mesher.mesh_tree(tree);
+        time = get_seconds_since(start);
+        meshing_time = meshing_time < 0 ? time : std::min(meshing_time, time);
+
+        node_count = tree.get_node_count();
+        vertex_count = (int)mesh.vertices.size();
+        polygon_count = (int)mesh.polygons.size();
+    }
+
+    std::cout << "{\"growth_time\": " << growth_time << ", \"meshing_time\": " << meshing_time
+        << ", \"node_count\": " << node_count << ", \"vertex_count\": " << vertex_count << ", \"polygon_count\": " << polygon_count
+        << ", \"peak_memory\": " << get_peak_memory_usage() << "}" << std::endl;
+    return 0;
+}
@@ -1,31 +1,74 @@
 #include <iostream>
 #include <exception>
+#include <algorithm>
+#include <sstream>
+#include <fstream>
 
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
 #include <pybind11/pybind11.h>
 #include <pybind11/numpy.h>
+#include <pybind11/functional.h>
 
 #include "source/mesh/Mesh.hpp"
+#include "source/mesh/MeshExport.hpp"
 #include "source/tree/Tree.hpp"
 #include "source/tree_functions/base_types/Property.hpp"
 #include "source/tree_functions/TrunkFunction.hpp"
 #include "source/tree_functions/BranchFunction.hpp"
 #include "source/tree_functions/GrowthFunction.hpp"
 #include "source/tree_functions/PipeRadiusFunction.hpp"
+#include "source/tree_functions/LeavesFunction.hpp"
 #include "source/meshers/splines_mesher/BasicMesher.hpp"
 #include "source/meshers/manifold_mesher/ManifoldMesher.hpp"
+#include "source/forest/ForestGenerator.hpp"
+#include "source/utilities/Progress.hpp"
+#include "source/utilities/Profiling.hpp"
 
 
 using namespace Mtree;
 namespace py = pybind11;
 
+static_assert(sizeof(Vector3) == 3 * sizeof(float), "vertices are exposed to python as packed float triplets");
+static_assert(sizeof(Vector2) == 2 * sizeof(float), "uvs are exposed to python as packed float pairs");
+static_assert(sizeof(std::array<int, 4>) == 4 * sizeof(int), "polygons are exposed to python as packed int quadruplets");
+static_assert(sizeof(std::array<int, 2>) == 2 * sizeof(int), "edges are exposed to python as packed int pairs");
+
+namespace
+{
+    // read-only numpy array borrowing the memory of a mesh buffer. The array holds a reference to the python mesh so the buffer outlives it
+    template <typename T>
+    py::array_t<T> make_view(const T* data, size_t size, py::handle owner)
+    {
+        py::array_t<T> view({ size }, { sizeof(T) }, data, owner);
+        view.attr("setflags")(py::arg("write") = false);
+        return view;
+    }
+
+    template <typename T>
+    Attribute<T>& get_attribute(const Mesh& mesh, const std::string& name)
+    {
+        if (mesh.attributes.count(name) == 0)
+        {
+            throw std::invalid_argument("attribute " + name + " doesn't exist");
+        }
+        auto* attribute = dynamic_cast<Attribute<T>*>(mesh.attributes.at(name).get());
+        if (attribute == nullptr)
+        {
+            throw std::invalid_argument("attribute " + name + " has a different type");
+        }
+        return *attribute;
+    }
+}
+
 
 PYBIND11_MODULE(m_tree, m) {
 
     py::class_<TreeFunction, std::shared_ptr<TreeFunction>>(m, "TreeFunction")
         .def_readwrite("seed", &TreeFunction::seed)
-        .def("add_child", &TreeFunction::add_child);
+        .def("add_child", &TreeFunction::add_child)
+        .def("clone", &TreeFunction::clone)
+        .def("reseed", &TreeFunction::reseed);
 
     py::class_<ConstantProperty, std::shared_ptr<ConstantProperty>>(m, "ConstantProperty")
         .def(py::init<>())
@@ -48,14 +91,36 @@ PYBIND11_MODULE(m_tree, m) {
         .def_readwrite("power", &SimpleCurveProperty::power)
         ;
 
+    py::class_<CurveProperty, std::shared_ptr<CurveProperty>>(m, "CurveProperty")
+        .def(py::init<>())
+        .def(py::init<std::vector<std::pair<float, float>>>(), py::arg("points"))
+        .def_property("points", &CurveProperty::get_points, [](CurveProperty& property, std::vector<std::pair<float, float>> points) { property = CurveProperty{ points }; })
+        ;
+
     py::class_<PropertyWrapper, std::shared_ptr<PropertyWrapper>>(m, "PropertyWrapper")
         .def(py::init<>())
         .def(py::init<ConstantProperty&>())
         .def(py::init<RandomProperty&>())
         .def(py::init<SimpleCurveProperty&>())
+        .def(py::init<CurveProperty&>())
         .def("set_constant_property", &PropertyWrapper::set_property<ConstantProperty>)
         .def("set_random_property", &PropertyWrapper::set_property<RandomProperty>)
         .def("set_simple_curve_property", &PropertyWrapper::set_property<SimpleCurveProperty>)
+        .def("set_curve_property", &PropertyWrapper::set_property<CurveProperty>)
+        .def("evaluate", [](const PropertyWrapper& wrapper, py::array_t<float, py::array::c_style | py::array::forcecast> factors)
+            {
+                // random values are drawn from a copy of the stream of the wrapper, evaluating doesn't change the tree
+                py::array_t<float> values(std::vector<py::ssize_t>(factors.shape(), factors.shape() + factors.ndim()));
+                RandomGenerator rand_gen = wrapper.rand_gen;
+                const float* factors_data = factors.data();
+                float* values_data = values.mutable_data();
+                size_t count = (size_t)factors.size();
+                {
+                    py::gil_scoped_release release;
+                    wrapper.property->execute_batch(factors_data, values_data, count, rand_gen);
+                }
+                return values;
+            }, py::arg("factors"))
         ;
 
     py::class_<TrunkFunction, std::shared_ptr<TrunkFunction>, TreeFunction>(m, "TrunkFunction")
@@ -96,6 +161,7 @@ PYBIND11_MODULE(m_tree, m) {
         .def_readwrite("start_angle", &BranchFunction::start_angle)
         .def_readwrite("split_angle", &BranchFunction::split_angle)
         .def_readwrite("split_proba", &BranchFunction::split_proba)
+        .def_readwrite("prototype_count", &BranchFunction::prototype_count)
         ;
 
     py::class_<GrowthFunction, std::shared_ptr<GrowthFunction>, TreeFunction>(m, "GrowthFunction")
@@ -112,111 +178,205 @@ PYBIND11_MODULE(m_tree, m) {
         .def_readwrite("gravity_strength", &GrowthFunction::gravity_strength)
         ;
 
+    py::class_<LeavesFunction>(m, "LeavesFunction")
+        .def(py::init<>())
+        .def_readwrite("seed", &LeavesFunction::seed)
+        .def_readwrite("density", &LeavesFunction::density)
+        .def_readwrite("phyllotaxis", &LeavesFunction::phyllotaxis)
+        .def_readwrite("start_angle", &LeavesFunction::start_angle)
+        .def_readwrite("max_radius", &LeavesFunction::max_radius)
+        .def_readwrite("max_distance_to_tip", &LeavesFunction::max_distance_to_tip)
+        .def_readwrite("size", &LeavesFunction::size)
+        .def_readwrite("tip_size", &LeavesFunction::tip_size)
+        .def_readwrite("maturity_length", &LeavesFunction::maturity_length)
+        .def_readwrite("randomness", &LeavesFunction::randomness)
+        .def("execute", [](const LeavesFunction& function, Tree& tree)
+            {
+                // arrays of "positions" (N, 3), "normals" (N, 3), "scales" (N,) and "rotations" (N, 4) as w, x, y, z quaternions,
+                // all views on the single buffer of the leaves
+                LeafInstances* leaves;
+                {
+                    py::gil_scoped_release release;
+                    leaves = new LeafInstances(function.execute(tree));
+                }
+                py::capsule owner(leaves, [](void* data) { delete static_cast<LeafInstances*>(data); });
+                size_t count = leaves->count;
+                auto make_array = [&](float* data, size_t width)
+                {
+                    if (width == 1)
+                        return py::array_t<float>({ count }, { sizeof(float) }, data, owner);
+                    return py::array_t<float>({ count, width }, { width * sizeof(float), sizeof(float) }, data, owner);
+                };
+                py::dict result;
+                result["positions"] = make_array(leaves->positions(), 3);
+                result["normals"] = make_array(leaves->normals(), 3);
+                result["scales"] = make_array(leaves->scales(), 1);
+                result["rotations"] = make_array(leaves->rotations(), 4);
+                return result;
+            }, py::arg("tree"))
+        ;
+
+
+    m.def("get_peak_memory_usage", &get_peak_memory_usage);
+
+    py::class_<CancellationToken, std::shared_ptr<CancellationToken>>(m, "CancellationToken")
+        .def(py::init<>())
+        .def("cancel", &CancellationToken::cancel)
+        .def("is_cancelled", &CancellationToken::is_cancelled);
+
+    py::register_exception<OperationCancelled>(m, "OperationCancelled");
 
     py::class_<Tree>(m, "Tree")
         .def(py::init<>())
         .def("set_trunk_function", &Tree::set_first_function)
         .def("get_trunk_function", &Tree::get_first_function)
-        .def("execute_functions", &Tree::execute_functions);
-
-    py::class_<Mesh>(m, "Mesh")
-        .def("get_vertices", [](const Mesh& mesh)
+        .def("execute_functions", [](Tree& tree, ProgressCallback progress_callback, std::shared_ptr<CancellationToken> cancellation_token)
             {
-        	    py::array_t<float> result(mesh.vertices.size() * 3);
-			    py::buffer_info buff = result.request();
-
-			    float* ptr = (float*)buff.ptr;
-			    for (int i = 0; i < mesh.vertices.size(); i++)
-			    {
-				    for (size_t j = 0; j < 3; j++)
-				    {
-					    ptr[i*3+j] = mesh.vertices[i][j];
-				    }
-			    }
-
-			    return result;
-            })
-        .def("get_float_attribute", [](const Mesh& mesh, std::string name)
+                // the callback takes the GIL back when it is called
+                Progress progress{ progress_callback, cancellation_token };
+                py::gil_scoped_release release;
+                tree.execute_functions(progress);
+            }, py::arg("progress_callback") = py::none(), py::arg("cancellation_token") = py::none())
+        .def_readwrite("store_snapshots", &Tree::store_snapshots)
+        .def("inherit_snapshots", &Tree::inherit_snapshots)
+        .def("get_node_count", &Tree::get_node_count)
+        .def("get_memory_usage", &Tree::get_memory_usage)
+        .def("get_profile", [](const Tree& tree)
             {
-                if (mesh.attributes.count(name) == 0)
-                {
-                    throw std::invalid_argument("attribute " + name + " doesn't exist");
-                }
-                auto& attribute = *static_cast<Attribute<float>*>(mesh.attributes.at(name).get());
-                py::array_t<float> result(mesh.vertices.size());
-                py::buffer_info buff = result.request();
-
-                float* ptr = (float*)buff.ptr;
-                for (int i = 0; i < mesh.vertices.size(); i++)
+                // functions of the last execution, in execution order, with the number of nodes they created
+                std::map<int, int> node_counts = tree.get_node_counts_by_creator();
+                py::list functions;
+                float total_time = 0;
+                for (auto& function : tree.get_function_profiles())
                 {
-                    ptr[i] = attribute.data[i];
+                    py::dict profile;
+                    profile["id"] = function.id;
+                    profile["parent_id"] = function.parent_id;
+                    profile["name"] = function.name;
+                    profile["time"] = function.time;
+                    profile["from_snapshot"] = function.from_snapshot;
+                    auto count = node_counts.find(function.id);
+                    profile["node_count"] = count == node_counts.end() ? 0 : count->second;
+                    functions.append(profile);
+                    total_time += function.time;
                 }
-                return result;
+                py::dict profile;
+                profile["functions"] = functions;
+                profile["time"] = total_time;
+                return profile;
             })
-        .def("get_vector3_attribute", [](const Mesh& mesh, std::string name)
+        .def("get_branch_instances", [](const Tree& tree)
             {
-                if (mesh.attributes.count(name) == 0)
+                // row major 4x4 transforms, placing the meshes of ManifoldMesher.mesh_prototypes
+                std::vector<BranchInstance> instances = tree.get_branch_instances();
+                py::array_t<int> prototype_indices(instances.size());
+                py::array_t<float> transforms({ instances.size(), (size_t)4, (size_t)4 });
+                auto indices_view = prototype_indices.mutable_unchecked<1>();
+                auto transforms_view = transforms.mutable_unchecked<3>();
+                for (size_t i = 0; i < instances.size(); i++)
                 {
-                    throw std::invalid_argument("attribute " + name + " doesn't exist");
+                    indices_view(i) = instances[i].prototype_index;
+                    Eigen::Matrix4f transform = instances[i].get_transform();
+                    for (int row = 0; row < 4; row++)
+                        for (int column = 0; column < 4; column++)
+                            transforms_view(i, row, column) = transform(row, column);
                 }
-                auto& attribute = *static_cast<Attribute<Vector3>*>(mesh.attributes.at(name).get());
-                py::array_t<float> result(mesh.vertices.size() * 3);
-                py::buffer_info buff = result.request();
+                py::dict result;
+                result["prototype_indices"] = prototype_indices;
+                result["transforms"] = transforms;
+                return result;
+            });
 
-                float* ptr = (float*)buff.ptr;
-                for (int i = 0; i < mesh.vertices.size(); i++)
+    py::class_<Mesh>(m, "Mesh")
+        .def("get_vertices", [](py::object self)
+            {
+                const Mesh& mesh = self.cast<const Mesh&>();
+                return make_view(reinterpret_cast<const float*>(mesh.vertices.data()), mesh.vertices.size() * 3, self);
+            })
+        .def("get_float_attribute", [](py::object self, std::string name)
+            {
+                auto& attribute = get_attribute<float>(self.cast<const Mesh&>(), name);
+                return make_view(attribute.data.data(), attribute.data.size(), self);
+            })
+        .def("get_vector3_attribute", [](py::object self, std::string name)
+            {
+                auto& attribute = get_attribute<Vector3>(self.cast<const Mesh&>(), name);
+                return make_view(reinterpret_cast<const float*>(attribute.data.data()), attribute.data.size() * 3, self);
+            })        
+        .def("get_polygons", [](py::object self) 
+            {
+                const Mesh& mesh = self.cast<const Mesh&>();
+                return make_view(reinterpret_cast<const int*>(mesh.polygons.data()), mesh.polygons.size() * 4, self);
+            })
+        .def("get_uvs", [](py::object self)
+            {
+                const Mesh& mesh = self.cast<const Mesh&>();
+                return make_view(reinterpret_cast<const float*>(mesh.uvs.data()), mesh.uvs.size() * 2, self);
+            })
+        .def("get_uv_loops", [](py::object self)
+            {
+                const Mesh& mesh = self.cast<const Mesh&>();
+                return make_view(reinterpret_cast<const int*>(mesh.uv_loops.data()), mesh.uv_loops.size() * 4, self);
+            })
+        .def("get_buffers", [](py::object self)
+            {
+                const Mesh& mesh = self.cast<const Mesh&>();
+                py::dict attributes;
+                for (auto& [name, attribute] : mesh.attributes)
                 {
-                    ptr[i*3] = attribute.data[i][0];
-                    ptr[i*3 + 1] = attribute.data[i][1];
-                    ptr[i*3 + 2] = attribute.data[i][2];
+                    if (auto* float_attribute = dynamic_cast<Attribute<float>*>(attribute.get()))
+                        attributes[name.c_str()] = make_view(float_attribute->data.data(), float_attribute->data.size(), self);
+                    else if (auto* vector_attribute = dynamic_cast<Attribute<Vector3>*>(attribute.get()))
+                        attributes[name.c_str()] = make_view(reinterpret_cast<const float*>(vector_attribute->data.data()), vector_attribute->data.size() * 3, self);
                 }
-                return result;
-            })        
-        .def("get_polygons", [](const Mesh& mesh) 
-            {
-                py::array_t<int> result(mesh.polygons.size() * 4);
-             	py::buffer_info buff = result.request();
-
-             	int* ptr = (int*)buff.ptr;
-             	for (int i = 0; i < mesh.polygons.size(); i++)
-             	{
-             		for (int j = 0; j < 4; j++)
-             		{
-             			ptr[i * 4 + j] = mesh.polygons[i][j];
-             		}
-             	}
-             	return result;
+                py::dict buffers;
+                buffers["vertices"] = make_view(reinterpret_cast<const float*>(mesh.vertices.data()), mesh.vertices.size() * 3, self);
+                buffers["polygons"] = make_view(reinterpret_cast<const int*>(mesh.polygons.data()), mesh.polygons.size() * 4, self);
+                buffers["uvs"] = make_view(reinterpret_cast<const float*>(mesh.uvs.data()), mesh.uvs.size() * 2, self);
+                buffers["uv_loops"] = make_view(reinterpret_cast<const int*>(mesh.uv_loops.data()), mesh.uv_loops.size() * 4, self);
+                buffers["attributes"] = attributes;
+                return buffers;
             })
-        .def("get_uvs", [](const Mesh& mesh)
+        .def("get_topology_hash", &Mesh::get_topology_hash)
+        .def("get_edges", [](const Mesh& mesh)
             {
-                py::array_t<float> result(mesh.uvs.size() * 2);
-                py::buffer_info buff = result.request();
-
-                float* ptr = (float*)buff.ptr;
-                for (int i = 0; i < mesh.uvs.size(); i++)
+                // flat arrays owning their data: two vertex indices per edge, and the edge of each polygon corner
+                std::vector<int> loop_edges;
+                std::vector<std::array<int, 2>> edges;
                 {
-                    for (size_t j = 0; j < 2; j++)
-                    {
-                        ptr[i * 2 + j] = mesh.uvs[i][j];
-                    }
+                    py::gil_scoped_release release;
+                    edges = mesh.get_edges(loop_edges);
                 }
-
-                return result;
+                py::array_t<int> edges_array(edges.size() * 2);
+                std::copy_n(reinterpret_cast<const int*>(edges.data()), edges.size() * 2, edges_array.mutable_data());
+                py::array_t<int> loop_edges_array(loop_edges.size());
+                std::copy(loop_edges.begin(), loop_edges.end(), loop_edges_array.mutable_data());
+                return py::make_tuple(edges_array, loop_edges_array);
             })
-        .def("get_uv_loops", [](const Mesh& mesh)
+        .def("write", [](const Mesh& mesh, const std::string& path, const std::string& format, bool memory_mapped)
             {
-                py::array_t<int> result(mesh.uv_loops.size() * 4);
-                py::buffer_info buff = result.request();
-
-                int* ptr = (int*)buff.ptr;
-                for (int i = 0; i < mesh.uv_loops.size(); i++)
+                MeshFormat mesh_format = get_mesh_format(format);
+                py::gil_scoped_release release;
+                write_mesh(mesh, mesh_format, path, memory_mapped);
+            }, py::arg("path"), py::arg("format") = "ply", py::arg("memory_mapped") = false)
+        .def("to_bytes", [](const Mesh& mesh, const std::string& format)
+            {
+                MeshFormat mesh_format = get_mesh_format(format);
+                std::ostringstream stream;
                 {
-                    for (int j = 0; j < 4; j++)
-                    {
-                        ptr[i * 4 + j] = mesh.uv_loops[i][j];
-                    }
+                    py::gil_scoped_release release;
+                    write_mesh(mesh, mesh_format, stream);
                 }
-                return result;
+                return py::bytes(stream.str());
+            }, py::arg("format") = "ply")
+        .def("get_export_size", [](const Mesh& mesh, const std::string& format) { return get_export_size(mesh, get_mesh_format(format)); }, py::arg("format") = "ply")
+        .def_static("read_raw", [](const std::string& path)
+            {
+                py::gil_scoped_release release;
+                std::ifstream file{ path, std::ios::binary };
+                if (!file)
+                    throw std::runtime_error("could not open " + path);
+                return read_raw_mesh(file);
             });
 
 
@@ -224,13 +384,106 @@ PYBIND11_MODULE(m_tree, m) {
 
     py::class_<BasicMesher>(m, "BasicMesher")
         .def(py::init<>())
-        .def("mesh_tree", &BasicMesher::mesh_tree);
+        .def("mesh_tree", [](BasicMesher& mesher, Tree& tree, ProgressCallback progress_callback, std::shared_ptr<CancellationToken> cancellation_token)
+            {
+                Progress progress{ progress_callback, cancellation_token };
+                py::gil_scoped_release release;
+                return mesher.mesh_tree(tree, progress);
+            }, py::arg("tree"), py::arg("progress_callback") = py::none(), py::arg("cancellation_token") = py::none());
     
+    py::class_<LodLevel>(m, "LodLevel")
+        .def(py::init<>())
+        .def(py::init([](int radial_resolution, float min_radius, float max_angle, int smooth_iterations, float target_edge_length, int min_radial_resolution)
+            {
+                return LodLevel{ radial_resolution, min_radius, max_angle, smooth_iterations, target_edge_length, min_radial_resolution };
+            }), py::arg("radial_resolution") = 8, py::arg("min_radius") = 0.f, py::arg("max_angle") = 0.f, py::arg("smooth_iterations") = 0,
+            py::arg("target_edge_length") = 0.f, py::arg("min_radial_resolution") = 4)
+        .def_readwrite("radial_resolution", &LodLevel::radial_resolution)
+        .def_readwrite("min_radius", &LodLevel::min_radius)
+        .def_readwrite("max_angle", &LodLevel::max_angle)
+        .def_readwrite("smooth_iterations", &LodLevel::smooth_iterations)
+        .def_readwrite("target_edge_length", &LodLevel::target_edge_length)
+        .def_readwrite("min_radial_resolution", &LodLevel::min_radial_resolution);
+
     py::class_<ManifoldMesher>(m, "ManifoldMesher")
         .def(py::init<>())
         .def_readwrite("radial_n_points", &ManifoldMesher::radial_resolution)
         .def_readwrite("smooth_iterations", &ManifoldMesher::smooth_iterations)
-        .def("mesh_tree", &ManifoldMesher::mesh_tree);
+        .def_readwrite("target_edge_length", &ManifoldMesher::target_edge_length)
+        .def_readwrite("min_radial_resolution", &ManifoldMesher::min_radial_resolution)
+        .def_readwrite("thread_count", &ManifoldMesher::thread_count)
+        .def_readwrite("detailed_profiling", &ManifoldMesher::detailed_profiling)
+        .def("get_profile", [](const ManifoldMesher& mesher)
+            {
+                MeshingProfile meshing_profile = mesher.get_profile();
+                py::dict profile;
+                profile["meshing_time"] = meshing_profile.meshing_time;
+                profile["ring_time"] = meshing_profile.ring_time;
+                profile["bridge_time"] = meshing_profile.bridge_time;
+                profile["smoothing_time"] = meshing_profile.smoothing_time;
+                profile["vertex_count"] = meshing_profile.vertex_count;
+                profile["polygon_count"] = meshing_profile.polygon_count;
+                return profile;
+            })
+        .def("__copy__", [](const ManifoldMesher& mesher) { return ManifoldMesher(mesher); })
+        .def("mesh_tree", [](ManifoldMesher& mesher, Tree& tree, ProgressCallback progress_callback, std::shared_ptr<CancellationToken> cancellation_token)
+            {
+                Progress progress{ progress_callback, cancellation_token };
+                py::gil_scoped_release release;
+                return mesher.mesh_tree(tree, progress);
+            }, py::arg("tree"), py::arg("progress_callback") = py::none(), py::arg("cancellation_token") = py::none())
+        .def("mesh_tree_lods", [](ManifoldMesher& mesher, Tree& tree, const std::vector<LodLevel>& levels, ProgressCallback progress_callback, std::shared_ptr<CancellationToken> cancellation_token)
+            {
+                Progress progress{ progress_callback, cancellation_token };
+                py::gil_scoped_release release;
+                return mesher.mesh_tree_lods(tree, levels, progress);
+            }, py::arg("tree"), py::arg("levels"), py::arg("progress_callback") = py::none(), py::arg("cancellation_token") = py::none())
+        .def("mesh_prototypes", &ManifoldMesher::mesh_prototypes, py::arg("tree"), py::call_guard<py::gil_scoped_release>())
+        .def("mesh_tree_chunks", &ManifoldMesher::mesh_tree_chunks, py::arg("tree"), py::arg("chunk_size") = 65536, py::keep_alive<0, 2>());
+
+    py::class_<MeshChunkStream, std::shared_ptr<MeshChunkStream>>(m, "MeshChunkStream")
+        .def("__iter__", [](py::object self) { return self; })
+        .def("__next__", [](MeshChunkStream& stream)
+            {
+                MeshChunk chunk;
+                bool has_chunk;
+                {
+                    py::gil_scoped_release release;
+                    has_chunk = stream.next(chunk);
+                }
+                if (!has_chunk)
+                {
+                    throw py::stop_iteration();
+                }
+                return py::make_tuple(chunk.vertex_offset, chunk.uv_offset, std::move(chunk.mesh));
+            });
+
+    py::class_<ForestStream, std::shared_ptr<ForestStream>>(m, "ForestStream")
+        .def("__iter__", [](py::object self) { return self; })
+        .def("__next__", [](ForestStream& stream)
+            {
+                ForestResult result;
+                bool has_result;
+                {
+                    py::gil_scoped_release release;
+                    has_result = stream.next(result);
+                }
+                if (!has_result)
+                {
+                    throw py::stop_iteration();
+                }
+                return py::make_tuple(result.index, std::move(result.mesh));
+            })
+        .def("cancel", &ForestStream::cancel);
+
+    py::class_<ForestGenerator>(m, "ForestGenerator")
+        .def(py::init<>())
+        .def_readwrite("thread_count", &ForestGenerator::thread_count)
+        .def_readwrite("mesher", &ForestGenerator::mesher)
+        .def("generate", py::overload_cast<std::shared_ptr<TreeFunction>, const std::vector<int>&>(&ForestGenerator::generate), py::call_guard<py::gil_scoped_release>())
+        .def("generate", py::overload_cast<const std::vector<std::shared_ptr<TreeFunction>>&>(&ForestGenerator::generate), py::call_guard<py::gil_scoped_release>())
+        .def("stream", py::overload_cast<std::shared_ptr<TreeFunction>, const std::vector<int>&>(&ForestGenerator::stream))
+        .def("stream", py::overload_cast<const std::vector<std::shared_ptr<TreeFunction>>&>(&ForestGenerator::stream));
 
 
 #ifdef VERSION_INFO
@@ -0,0 +1,128 @@
+#include "ForestGenerator.hpp"
+
+namespace
+{
+	using namespace Mtree;
+
+	std::vector<std::shared_ptr<TreeFunction>> get_variants(std::shared_ptr<TreeFunction> trunk_function, const std::vector<int>& seeds)
+	{
+		std::vector<std::shared_ptr<TreeFunction>> variants;
+		for (int seed : seeds)
+		{
+			auto variant = trunk_function->clone();
+			variant->reseed(seed);
+			variants.push_back(variant);
+		}
+		return variants;
+	}
+
+	std::vector<Mesh> get_meshes(ForestStream& forest, const size_t tree_count)
+	{
+		std::vector<Mesh> meshes(tree_count);
+		ForestResult result;
+		while (forest.next(result))
+		{
+			meshes[result.index] = std::move(result.mesh);
+		}
+		return meshes;
+	}
+}
+
+namespace Mtree
+{
+	ForestStream::ForestStream(std::vector<std::shared_ptr<TreeFunction>> trunk_functions, const ManifoldMesher& mesher, const int thread_count)
+	{
+		remaining_count = (int)trunk_functions.size();
+		pool = std::make_unique<ThreadPool>(thread_count);
+		ManifoldMesher tree_mesher = mesher;
+		tree_mesher.thread_count = 1; // trees are already generated in parallel
+		for (size_t i = 0; i < trunk_functions.size(); i++)
+		{
+			pool->submit([this, i, trunk_function = trunk_functions[i], tree_mesher]() mutable
+				{
+					ForestResult result{ (int)i, Mesh{} };
+					bool finished = false;
+					try
+					{
+						if (!cancelled)
+						{
+							Tree tree{ trunk_function };
+							tree.execute_functions();
+							result.mesh = tree_mesher.mesh_tree(tree);
+							finished = true;
+						}
+					}
+					catch (...)
+					{
+						std::lock_guard<std::mutex> lock{ mutex };
+						if (exception == nullptr)
+							exception = std::current_exception();
+					}
+					{
+						std::lock_guard<std::mutex> lock{ mutex };
+						if (finished)
+							results.push_back(std::move(result));
+						else
+							remaining_count--; // skipped trees are never returned
+					}
+					result_available.notify_one();
+				});
+		}
+	}
+
+	ForestStream::~ForestStream()
+	{
+		cancel();
+		pool.reset();
+	}
+
+	bool ForestStream::next(ForestResult& result)
+	{
+		std::unique_lock<std::mutex> lock{ mutex };
+		if (remaining_count == 0)
+			return false;
+		result_available.wait(lock, [this] { return !results.empty() || remaining_count == 0 || exception != nullptr; });
+		if (exception != nullptr)
+		{
+			remaining_count = 0;
+			std::rethrow_exception(exception);
+		}
+		if (results.empty())
+			return false;
+		result = std::move(results.front());
+		results.pop_front();
+		remaining_count--;
+		return true;
+	}
+
+	void ForestStream::cancel()
+	{
+		cancelled = true;
+	}
+
+	std::vector<Mesh> ForestGenerator::generate(std::shared_ptr<TreeFunction> trunk_function, const std::vector<int>& seeds)
+	{
+		return get_meshes(*stream(trunk_function, seeds), seeds.size());
+	}
+
+	std::vector<Mesh> ForestGenerator::generate(const std::vector<std::shared_ptr<TreeFunction>>& trunk_functions)
+	{
+		return get_meshes(*stream(trunk_functions), trunk_functions.size());
+	}
+
+	std::shared_ptr<ForestStream> ForestGenerator::stream(std::shared_ptr<TreeFunction> trunk_function, const std::vector<int>& seeds)
+	{
+		return std::make_shared<ForestStream>(get_variants(trunk_function, seeds), mesher, thread_count);
+	}
+
+	std::shared_ptr<ForestStream> ForestGenerator::stream(const std::vector<std::shared_ptr<TreeFunction>>& trunk_functions)
+	{
+		// functions hold random generators, so each tree gets its own copy of the graph
+		std::vector<std::shared_ptr<TreeFunction>> copies;
+		for (auto& trunk_function : trunk_functions)
+		{
+			copies.push_back(trunk_function->clone());
+		}
+		return std::make_shared<ForestStream>(copies, mesher, thread_count);
+	}
+}
\ No newline at end of file
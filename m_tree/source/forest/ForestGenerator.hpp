@@ -0,0 +1,50 @@
+#pragma once
+#include <vector>
+#include <deque>
+#include <memory>
+#include <mutex>
+#include <atomic>
+#include <condition_variable>
+#include "source/tree/Tree.hpp"
+#include "source/meshers/manifold_mesher/ManifoldMesher.hpp"
+#include "source/utilities/ThreadPool.hpp"
+
+namespace Mtree
+{
+	struct ForestResult
+	{
+		int index; // index of the variant in the list given to the generator
+		Mesh mesh;
+	};
+
+	// meshes of a forest, available in the order in which the trees are finished
+	class ForestStream
+	{
+	private:
+		std::mutex mutex;
+		std::condition_variable result_available;
+		std::deque<ForestResult> results;
+		int remaining_count;
+		std::exception_ptr exception = nullptr;
+		std::atomic<bool> cancelled{ false };
+		std::unique_ptr<ThreadPool> pool; // declared last so that workers are joined before the other members are destroyed
+
+	public:
+		ForestStream(std::vector<std::shared_ptr<TreeFunction>> trunk_functions, const ManifoldMesher& mesher, const int thread_count); // the trees are grown from the given graphs, which must not be shared
+		~ForestStream();
+		bool next(ForestResult& result); // block until a tree is finished, return false once every tree has been returned
+		void cancel(); // trees that are not started yet are skipped and never returned by next
+	};
+
+	class ForestGenerator
+	{
+	public:
+		int thread_count = 0; // 0 uses all hardware threads
+		ManifoldMesher mesher;
+
+		std::vector<Mesh> generate(std::shared_ptr<TreeFunction> trunk_function, const std::vector<int>& seeds); // one tree per seed, grown from copies of the function graph
+		std::vector<Mesh> generate(const std::vector<std::shared_ptr<TreeFunction>>& trunk_functions); // one tree per function graph
+		std::shared_ptr<ForestStream> stream(std::shared_ptr<TreeFunction> trunk_function, const std::vector<int>& seeds);
+		std::shared_ptr<ForestStream> stream(const std::vector<std::shared_ptr<TreeFunction>>& trunk_functions);
+	};
+}
@@ -10,6 +10,7 @@ namespace Mtree
     struct AbstractAttribute
     {
         virtual void add_data() = 0;
+        virtual void extend(const AbstractAttribute& other) = 0; // append the data of an attribute of the same type
     };
 
 
@@ -25,5 +26,11 @@ namespace Mtree
         {
             data.emplace_back();
         };
+
+        virtual void extend(const AbstractAttribute& other)
+        {
+            auto& other_data = static_cast<const Attribute<T>&>(other).data;
+            data.insert(data.end(), other_data.begin(), other_data.end());
+        };
     };
 }
\ No newline at end of file
@@ -1,4 +1,6 @@
+#include <algorithm>
 #include "Mesh.hpp"
+#include "source/utilities/HashBuilder.hpp"
 
 namespace Mtree
 {
@@ -27,4 +29,57 @@ namespace Mtree
 		uv_loops.emplace_back();
 		return  (int)polygons.size() - 1;
 	}
+
+	std::size_t Mesh::get_topology_hash() const
+	{
+		HashBuilder hash;
+		hash.add((std::uint64_t)vertices.size());
+		for (auto& polygon : polygons)
+		{
+			for (int index : polygon)
+				hash.add(index);
+		}
+		return hash.get();
+	}
+
+	std::vector<std::array<int, 2>> Mesh::get_edges(std::vector<int>& loop_edges) const
+	{
+		// corners are grouped by the smallest vertex of their edge, a vertex only has a few edges to compare
+		std::vector<int> offsets(vertices.size() + 1, 0);
+		for (auto& polygon : polygons)
+		{
+			for (int i = 0; i < 4; i++)
+				offsets[std::min(polygon[i], polygon[(i + 1) % 4]) + 1]++;
+		}
+		for (size_t i = 0; i < vertices.size(); i++)
+			offsets[i + 1] += offsets[i];
+		std::vector<int> corners(offsets.back());
+		std::vector<int> fill_positions(offsets.begin(), offsets.end() - 1);
+		for (int corner = 0; corner < (int)polygons.size() * 4; corner++)
+		{
+			auto& polygon = polygons[corner / 4];
+			int vertex = std::min(polygon[corner % 4], polygon[(corner + 1) % 4]);
+			corners[fill_positions[vertex]++] = corner;
+		}
+
+		std::vector<std::array<int, 2>> edges;
+		loop_edges.resize(polygons.size() * 4);
+		for (int vertex = 0; vertex < (int)vertices.size(); vertex++)
+		{
+			size_t first_edge = edges.size();
+			for (int i = offsets[vertex]; i < offsets[vertex + 1]; i++)
+			{
+				int corner = corners[i];
+				auto& polygon = polygons[corner / 4];
+				int other_vertex = std::max(polygon[corner % 4], polygon[(corner + 1) % 4]);
+				size_t edge = first_edge;
+				while (edge < edges.size() && edges[edge][1] != other_vertex)
+					edge++;
+				if (edge == edges.size())
+					edges.push_back({ vertex, other_vertex });
+				loop_edges[corner] = (int)edge;
+			}
+		}
+		return edges;
+	}
 }
\ No newline at end of file
@@ -32,6 +32,10 @@ namespace Mtree
 		std::vector<std::array<int, 4>> get_polygons() { return this->polygons; };
 		int add_vertex(const Vector3& position);
 		int add_polygon();
+		std::size_t get_topology_hash() const; // identifies the vertex count and polygons of the mesh, positions are ignored
+		// unique edges of the polygons, as pairs of vertex indices with the smallest first.
+		// loop_edges receives the index of the edge going from each polygon corner to the next one
+		std::vector<std::array<int, 2>> get_edges(std::vector<int>& loop_edges) const;
 		template <class T>
 		Attribute<T>& add_attribute(std::string name)
 		{
@@ -0,0 +1,589 @@
+#include <cstring>
+#include <cstdint>
+#include <sstream>
+#include <fstream>
+#include <stdexcept>
+#include <limits>
+#include <locale>
+#include <algorithm>
+#ifdef _WIN32
+#define NOMINMAX
+#include <windows.h>
+#else
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <unistd.h>
+#endif
+#include "MeshExport.hpp"
+
+namespace Mtree
+{
+	namespace
+	{
+		// values are written as they are in memory, the formats being little endian like the platforms the library is built for
+		class ByteSink
+		{
+		public:
+			virtual ~ByteSink() = default;
+			virtual void write(const void* data, std::size_t size) = 0;
+
+			template <class T>
+			void write_value(const T& value)
+			{
+				write(&value, sizeof(T));
+			}
+		};
+
+		class StreamSink : public ByteSink
+		{
+		public:
+			StreamSink(std::ostream& stream) : stream{ stream }, buffer(1 << 16) {};
+
+			void write(const void* data, std::size_t size) override
+			{
+				if (used + size > buffer.size())
+					flush();
+				if (size > buffer.size())
+				{
+					stream.write(static_cast<const char*>(data), size);
+					return;
+				}
+				std::memcpy(buffer.data() + used, data, size);
+				used += size;
+			}
+
+			void flush()
+			{
+				stream.write(buffer.data(), used);
+				used = 0;
+			}
+
+		private:
+			std::ostream& stream;
+			std::vector<char> buffer;
+			std::size_t used = 0;
+		};
+
+		class MemorySink : public ByteSink
+		{
+		public:
+			MemorySink(char* data) : position{ data } {};
+
+			void write(const void* data, std::size_t size) override
+			{
+				std::memcpy(position, data, size);
+				position += size;
+			}
+
+		private:
+			char* position;
+		};
+
+		// file mapped in memory at a fixed size, unmapped and closed when destroyed
+		class MappedFile
+		{
+		public:
+			char* data = nullptr;
+
+			MappedFile(const std::string& path, std::size_t size) : size{ size }
+			{
+#ifdef _WIN32
+				file = CreateFileA(path.c_str(), GENERIC_READ | GENERIC_WRITE, 0, nullptr, CREATE_ALWAYS, FILE_ATTRIBUTE_NORMAL, nullptr);
+				if (file != INVALID_HANDLE_VALUE)
+					mapping = CreateFileMappingA(file, nullptr, PAGE_READWRITE, (DWORD)((std::uint64_t)size >> 32), (DWORD)(size & 0xFFFFFFFF), nullptr);
+				if (mapping != nullptr)
+					data = static_cast<char*>(MapViewOfFile(mapping, FILE_MAP_WRITE, 0, 0, size));
+#else
+				file = open(path.c_str(), O_RDWR | O_CREAT | O_TRUNC, 0644);
+				if (file >= 0 && ftruncate(file, size) == 0)
+				{
+					void* mapped = mmap(nullptr, size, PROT_READ | PROT_WRITE, MAP_SHARED, file, 0);
+					data = mapped == MAP_FAILED ? nullptr : static_cast<char*>(mapped);
+				}
+#endif
+				if (data == nullptr)
+				{
+					close();
+					throw std::runtime_error("could not map " + path + " in memory");
+				}
+			}
+
+			~MappedFile()
+			{
+				close();
+			}
+
+		private:
+			std::size_t size;
+#ifdef _WIN32
+			HANDLE file = INVALID_HANDLE_VALUE;
+			HANDLE mapping = nullptr;
+#else
+			int file = -1;
+#endif
+
+			void close()
+			{
+#ifdef _WIN32
+				if (data != nullptr)
+					UnmapViewOfFile(data);
+				if (mapping != nullptr)
+					CloseHandle(mapping);
+				if (file != INVALID_HANDLE_VALUE)
+					CloseHandle(file);
+#else
+				if (data != nullptr)
+					munmap(data, size);
+				if (file >= 0)
+					::close(file);
+#endif
+				data = nullptr;
+			}
+		};
+
+		struct ExportedAttributes
+		{
+			std::vector<std::pair<std::string, const std::vector<float>*>> floats;
+			std::vector<std::pair<std::string, const std::vector<Vector3>*>> vectors;
+		};
+
+		ExportedAttributes get_exported_attributes(const Mesh& mesh)
+		{
+			ExportedAttributes exported;
+			for (auto& [name, attribute] : mesh.attributes)
+			{
+				std::size_t size;
+				if (auto* float_attribute = dynamic_cast<const Attribute<float>*>(attribute.get()))
+				{
+					exported.floats.emplace_back(name, &float_attribute->data);
+					size = float_attribute->data.size();
+				}
+				else if (auto* vector_attribute = dynamic_cast<const Attribute<Vector3>*>(attribute.get()))
+				{
+					exported.vectors.emplace_back(name, &vector_attribute->data);
+					size = vector_attribute->data.size();
+				}
+				else
+					continue;
+				if (size != mesh.vertices.size())
+					throw std::invalid_argument("attribute " + name + " doesn't have a value per vertex");
+			}
+			return exported;
+		}
+
+		bool has_uvs(const Mesh& mesh)
+		{
+			return !mesh.uvs.empty() && mesh.uv_loops.size() == mesh.polygons.size();
+		}
+
+		// the layout of a format is computed once, it gives the size of the output then is used to write it
+		class MeshWriter
+		{
+		public:
+			virtual ~MeshWriter() = default;
+			virtual std::size_t get_size() const = 0;
+			virtual void write(ByteSink& sink) const = 0;
+		};
+
+		class PlyWriter : public MeshWriter
+		{
+		public:
+			PlyWriter(const Mesh& mesh) : mesh{ mesh }, attributes{ get_exported_attributes(mesh) }, uvs{ has_uvs(mesh) }
+			{
+				std::ostringstream stream;
+				stream << "ply\nformat binary_little_endian 1.0\nelement vertex " << mesh.vertices.size() << "\n";
+				stream << "property float x\nproperty float y\nproperty float z\n";
+				for (auto& [name, data] : attributes.floats)
+					stream << "property float " << name << "\n";
+				for (auto& [name, data] : attributes.vectors)
+					stream << "property float " << name << "_x\nproperty float " << name << "_y\nproperty float " << name << "_z\n";
+				stream << "element face " << mesh.polygons.size() << "\nproperty list uchar int vertex_indices\n";
+				if (uvs)
+					stream << "property list uchar float texcoord\n";
+				stream << "end_header\n";
+				header = stream.str();
+				vertex_size = sizeof(Vector3) * (1 + attributes.vectors.size()) + sizeof(float) * attributes.floats.size();
+				face_size = 1 + 4 * sizeof(int) + (uvs ? 1 + 8 * sizeof(float) : 0);
+			}
+
+			std::size_t get_size() const override
+			{
+				return header.size() + mesh.vertices.size() * vertex_size + mesh.polygons.size() * face_size;
+			}
+
+			void write(ByteSink& sink) const override
+			{
+				sink.write(header.data(), header.size());
+				std::vector<char> record(vertex_size);
+				for (std::size_t i = 0; i < mesh.vertices.size(); i++)
+				{
+					char* position = record.data();
+					auto append = [&](const void* data, std::size_t size) { std::memcpy(position, data, size); position += size; };
+					append(mesh.vertices[i].data(), sizeof(Vector3));
+					for (auto& [name, data] : attributes.floats)
+						append(&(*data)[i], sizeof(float));
+					for (auto& [name, data] : attributes.vectors)
+						append((*data)[i].data(), sizeof(Vector3));
+					sink.write(record.data(), vertex_size);
+				}
+				for (std::size_t i = 0; i < mesh.polygons.size(); i++)
+				{
+					// corners are reversed to flip the normals
+					auto& polygon = mesh.polygons[i];
+					std::uint8_t corner_count = 4;
+					sink.write_value(corner_count);
+					sink.write_value(std::array<int, 4>{ polygon[3], polygon[2], polygon[1], polygon[0] });
+					if (!uvs)
+						continue;
+					std::array<float, 8> texcoords;
+					for (int j = 0; j < 4; j++)
+					{
+						auto& uv = mesh.uvs[mesh.uv_loops[i][3 - j]];
+						texcoords[2 * j] = uv.x();
+						texcoords[2 * j + 1] = uv.y();
+					}
+					sink.write_value(corner_count);
+					sink.write_value(texcoords);
+				}
+			}
+
+		private:
+			const Mesh& mesh;
+			ExportedAttributes attributes;
+			bool uvs;
+			std::string header;
+			std::size_t vertex_size;
+			std::size_t face_size;
+		};
+
+		class GlbWriter : public MeshWriter
+		{
+		public:
+			GlbWriter(const Mesh& mesh) : mesh{ mesh }, attributes{ get_exported_attributes(mesh) }, uvs{ has_uvs(mesh) }
+			{
+				split_uv_seams();
+				binary_size = gltf_vertices.size() * (sizeof(Vector3) * (1 + attributes.vectors.size()) + sizeof(float) * attributes.floats.size())
+					+ (uvs ? gltf_vertices.size() * sizeof(Vector2) : 0) + mesh.polygons.size() * 6 * sizeof(std::uint32_t);
+				create_json();
+			}
+
+			std::size_t get_size() const override
+			{
+				return 12 + 8 + json.size() + (binary_size > 0 ? 8 + binary_size : 0);
+			}
+
+			void write(ByteSink& sink) const override
+			{
+				sink.write_value(std::array<std::uint32_t, 3>{ 0x46546C67, 2, (std::uint32_t)get_size() }); // "glTF", version, length
+				sink.write_value(std::array<std::uint32_t, 2>{ (std::uint32_t)json.size(), 0x4E4F534A }); // JSON chunk
+				sink.write(json.data(), json.size());
+				if (binary_size == 0)
+					return;
+				sink.write_value(std::array<std::uint32_t, 2>{ (std::uint32_t)binary_size, 0x004E4942 }); // BIN chunk
+				for (auto& [vertex, uv] : gltf_vertices)
+					sink.write_value(to_y_up(mesh.vertices[vertex]));
+				if (uvs)
+				{
+					for (auto& [vertex, uv] : gltf_vertices)
+						sink.write_value(Vector2{ mesh.uvs[uv].x(), 1 - mesh.uvs[uv].y() }); // gltf uvs start at the top left corner
+				}
+				for (auto& [name, data] : attributes.floats)
+				{
+					for (auto& [vertex, uv] : gltf_vertices)
+						sink.write_value((*data)[vertex]);
+				}
+				for (auto& [name, data] : attributes.vectors)
+				{
+					for (auto& [vertex, uv] : gltf_vertices)
+						sink.write_value(to_y_up((*data)[vertex]));
+				}
+				for (std::size_t i = 0; i < mesh.polygons.size(); i++)
+				{
+					// each quad is split in two triangles, with the corners reversed to flip the normals
+					const int* corners = &corner_vertices[4 * i];
+					sink.write_value(std::array<std::uint32_t, 6>{ (std::uint32_t)corners[3], (std::uint32_t)corners[2], (std::uint32_t)corners[1],
+						(std::uint32_t)corners[3], (std::uint32_t)corners[1], (std::uint32_t)corners[0] });
+				}
+			}
+
+		private:
+			const Mesh& mesh;
+			ExportedAttributes attributes;
+			bool uvs;
+			std::vector<std::array<int, 2>> gltf_vertices; // vertex and uv of each gltf vertex
+			std::vector<int> corner_vertices; // gltf vertex of each polygon corner
+			std::string json; // padded with spaces to a multiple of 4 bytes
+			std::size_t binary_size;
+
+			static Vector3 to_y_up(const Vector3& vector)
+			{
+				return Vector3{ vector.x(), vector.z(), -vector.y() };
+			}
+
+			void split_uv_seams()
+			{
+				// gltf attributes are per vertex, a vertex is split for each of its uvs. Corners are grouped by vertex
+				// since a vertex only has a few uvs to compare
+				int corner_count = (int)mesh.polygons.size() * 4;
+				std::vector<int> offsets(mesh.vertices.size() + 1, 0);
+				for (auto& polygon : mesh.polygons)
+				{
+					for (int vertex : polygon)
+						offsets[vertex + 1]++;
+				}
+				for (std::size_t i = 0; i < mesh.vertices.size(); i++)
+					offsets[i + 1] += offsets[i];
+				std::vector<int> corners(corner_count);
+				std::vector<int> fill_positions(offsets.begin(), offsets.end() - 1);
+				for (int corner = 0; corner < corner_count; corner++)
+					corners[fill_positions[mesh.polygons[corner / 4][corner % 4]]++] = corner;
+
+				corner_vertices.resize(corner_count);
+				for (int vertex = 0; vertex < (int)mesh.vertices.size(); vertex++)
+				{
+					std::size_t first_gltf_vertex = gltf_vertices.size();
+					for (int i = offsets[vertex]; i < offsets[vertex + 1]; i++)
+					{
+						int corner = corners[i];
+						int uv = uvs ? mesh.uv_loops[corner / 4][corner % 4] : 0;
+						std::size_t gltf_vertex = first_gltf_vertex;
+						while (gltf_vertex < gltf_vertices.size() && gltf_vertices[gltf_vertex][1] != uv)
+							gltf_vertex++;
+						if (gltf_vertex == gltf_vertices.size())
+							gltf_vertices.push_back({ vertex, uv });
+						corner_vertices[corner] = (int)gltf_vertex;
+					}
+				}
+			}
+
+			void create_json()
+			{
+				std::ostringstream stream;
+				stream.imbue(std::locale::classic());
+				stream.precision(std::numeric_limits<float>::max_digits10);
+				stream << R"({"asset":{"version":"2.0","generator":"m_tree"},"scene":0,"scenes":[{"nodes":[0]}],)";
+				if (binary_size == 0)
+				{
+					stream << R"("nodes":[{}]})"; // gltf primitives can't be empty
+				}
+				else
+				{
+					std::ostringstream views, accessors, primitive_attributes;
+					std::size_t offset = 0;
+					int accessor_count = 0;
+					auto add_accessor = [&](const std::string& type, std::size_t count, std::size_t byte_length, int component_type, int target, const std::string& bounds = "")
+					{
+						views << (accessor_count > 0 ? "," : "") << R"({"buffer":0,"byteOffset":)" << offset << R"(,"byteLength":)" << byte_length << R"(,"target":)" << target << "}";
+						accessors << (accessor_count > 0 ? "," : "") << R"({"bufferView":)" << accessor_count << R"(,"componentType":)" << component_type
+							<< R"(,"count":)" << count << R"(,"type":")" << type << "\"" << bounds << "}";
+						offset += byte_length;
+						return accessor_count++;
+					};
+					auto add_attribute = [&](const std::string& name, const std::string& type, std::size_t component_size, const std::string& bounds = "")
+					{
+						int accessor = add_accessor(type, gltf_vertices.size(), gltf_vertices.size() * component_size, 5126, 34962, bounds);
+						primitive_attributes << (accessor > 0 ? "," : "") << "\"" << name << "\":" << accessor;
+					};
+
+					// positions need their bounds
+					Vector3 min_position = Vector3::Constant(std::numeric_limits<float>::max());
+					Vector3 max_position = Vector3::Constant(std::numeric_limits<float>::lowest());
+					for (auto& [vertex, uv] : gltf_vertices)
+					{
+						min_position = min_position.cwiseMin(to_y_up(mesh.vertices[vertex]));
+						max_position = max_position.cwiseMax(to_y_up(mesh.vertices[vertex]));
+					}
+					std::ostringstream bounds;
+					bounds.imbue(std::locale::classic());
+					bounds.precision(std::numeric_limits<float>::max_digits10);
+					bounds << R"(,"min":[)" << min_position.x() << "," << min_position.y() << "," << min_position.z()
+						<< R"(],"max":[)" << max_position.x() << "," << max_position.y() << "," << max_position.z() << "]";
+					add_attribute("POSITION", "VEC3", sizeof(Vector3), bounds.str());
+					if (uvs)
+						add_attribute("TEXCOORD_0", "VEC2", sizeof(Vector2));
+					// custom attributes are prefixed with an underscore and upper case by convention
+					auto get_attribute_name = [](std::string name)
+					{
+						std::transform(name.begin(), name.end(), name.begin(), [](char c) { return std::toupper(c, std::locale::classic()); });
+						return "_" + name;
+					};
+					for (auto& [name, data] : attributes.floats)
+						add_attribute(get_attribute_name(name), "SCALAR", sizeof(float));
+					for (auto& [name, data] : attributes.vectors)
+						add_attribute(get_attribute_name(name), "VEC3", sizeof(Vector3));
+					int indices = add_accessor("SCALAR", mesh.polygons.size() * 6, mesh.polygons.size() * 6 * sizeof(std::uint32_t), 5125, 34963);
+
+					stream << R"("nodes":[{"mesh":0}],"meshes":[{"primitives":[{"attributes":{)" << primitive_attributes.str()
+						<< R"(},"indices":)" << indices << R"(,"mode":4}]}],"buffers":[{"byteLength":)" << binary_size
+						<< R"(}],"bufferViews":[)" << views.str() << R"(],"accessors":[)" << accessors.str() << "]}";
+				}
+				json = stream.str();
+				json.resize((json.size() + 3) / 4 * 4, ' ');
+			}
+		};
+
+		const char raw_magic[8] = { 'M', 'T', 'R', 'E', 'E', 'M', 'S', 'H' };
+		const std::uint32_t raw_version = 1;
+
+		class RawWriter : public MeshWriter
+		{
+		public:
+			RawWriter(const Mesh& mesh) : mesh{ mesh }, attributes{ get_exported_attributes(mesh) } {};
+
+			std::size_t get_size() const override
+			{
+				std::size_t size = sizeof(raw_magic) + 2 * sizeof(std::uint32_t) + 3 * sizeof(std::uint64_t);
+				size += mesh.vertices.size() * sizeof(Vector3) + mesh.uvs.size() * sizeof(Vector2) + mesh.polygons.size() * 2 * sizeof(std::array<int, 4>);
+				for (auto& [name, data] : attributes.floats)
+					size += get_attribute_header_size(name) + data->size() * sizeof(float);
+				for (auto& [name, data] : attributes.vectors)
+					size += get_attribute_header_size(name) + data->size() * sizeof(Vector3);
+				return size;
+			}
+
+			void write(ByteSink& sink) const override
+			{
+				sink.write(raw_magic, sizeof(raw_magic));
+				sink.write_value(std::array<std::uint32_t, 2>{ raw_version, (std::uint32_t)(attributes.floats.size() + attributes.vectors.size()) });
+				sink.write_value(std::array<std::uint64_t, 3>{ mesh.vertices.size(), mesh.uvs.size(), mesh.polygons.size() });
+				sink.write(mesh.vertices.data(), mesh.vertices.size() * sizeof(Vector3));
+				sink.write(mesh.uvs.data(), mesh.uvs.size() * sizeof(Vector2));
+				sink.write(mesh.polygons.data(), mesh.polygons.size() * sizeof(std::array<int, 4>));
+				sink.write(mesh.uv_loops.data(), mesh.uv_loops.size() * sizeof(std::array<int, 4>));
+				for (auto& [name, data] : attributes.floats)
+				{
+					write_attribute_header(sink, name, 0);
+					sink.write(data->data(), data->size() * sizeof(float));
+				}
+				for (auto& [name, data] : attributes.vectors)
+				{
+					write_attribute_header(sink, name, 1);
+					sink.write(data->data(), data->size() * sizeof(Vector3));
+				}
+			}
+
+		private:
+			const Mesh& mesh;
+			ExportedAttributes attributes;
+
+			static std::size_t get_attribute_header_size(const std::string& name)
+			{
+				return 2 * sizeof(std::uint32_t) + (name.size() + 3) / 4 * 4;
+			}
+
+			static void write_attribute_header(ByteSink& sink, const std::string& name, std::uint32_t type)
+			{
+				sink.write_value(std::array<std::uint32_t, 2>{ type, (std::uint32_t)name.size() });
+				std::string padded_name = name;
+				padded_name.resize((name.size() + 3) / 4 * 4, '\0');
+				sink.write(padded_name.data(), padded_name.size());
+			}
+		};
+
+		std::unique_ptr<MeshWriter> create_writer(const Mesh& mesh, MeshFormat format)
+		{
+			switch (format)
+			{
+			case MeshFormat::Ply:
+				return std::make_unique<PlyWriter>(mesh);
+			case MeshFormat::Glb:
+				return std::make_unique<GlbWriter>(mesh);
+			default:
+				return std::make_unique<RawWriter>(mesh);
+			}
+		}
+
+		template <class T>
+		void read_values(std::istream& stream, T* values, std::size_t count)
+		{
+			if (!stream.read(reinterpret_cast<char*>(values), count * sizeof(T)))
+				throw std::runtime_error("raw mesh is truncated");
+		}
+	}
+
+	MeshFormat get_mesh_format(const std::string& name)
+	{
+		if (name == "ply")
+			return MeshFormat::Ply;
+		if (name == "glb")
+			return MeshFormat::Glb;
+		if (name == "raw")
+			return MeshFormat::Raw;
+		throw std::invalid_argument("unknown mesh format " + name);
+	}
+
+	std::size_t get_export_size(const Mesh& mesh, MeshFormat format)
+	{
+		return create_writer(mesh, format)->get_size();
+	}
+
+	void write_mesh(const Mesh& mesh, MeshFormat format, std::ostream& stream)
+	{
+		StreamSink sink{ stream };
+		create_writer(mesh, format)->write(sink);
+		sink.flush();
+	}
+
+	void write_mesh(const Mesh& mesh, MeshFormat format, const std::string& path, bool memory_mapped)
+	{
+		auto writer = create_writer(mesh, format);
+		if (memory_mapped)
+		{
+			MappedFile file{ path, writer->get_size() };
+			MemorySink sink{ file.data };
+			writer->write(sink);
+			return;
+		}
+		std::ofstream file{ path, std::ios::binary };
+		if (!file)
+			throw std::runtime_error("could not open " + path);
+		StreamSink sink{ file };
+		writer->write(sink);
+		sink.flush();
+		if (!file)
+			throw std::runtime_error("could not write " + path);
+	}
+
+	Mesh read_raw_mesh(std::istream& stream)
+	{
+		char magic[sizeof(raw_magic)];
+		std::array<std::uint32_t, 2> header;
+		std::array<std::uint64_t, 3> counts;
+		read_values(stream, magic, sizeof(magic));
+		read_values(stream, header.data(), header.size());
+		if (std::memcmp(magic, raw_magic, sizeof(raw_magic)) != 0 || header[0] != raw_version)
+			throw std::invalid_argument("not a raw mesh of this version");
+		read_values(stream, counts.data(), counts.size());
+
+		Mesh mesh;
+		mesh.vertices.resize(counts[0]);
+		mesh.uvs.resize(counts[1]);
+		mesh.polygons.resize(counts[2]);
+		mesh.uv_loops.resize(counts[2]);
+		read_values(stream, mesh.vertices.data(), mesh.vertices.size());
+		read_values(stream, mesh.uvs.data(), mesh.uvs.size());
+		read_values(stream, mesh.polygons.data(), mesh.polygons.size());
+		read_values(stream, mesh.uv_loops.data(), mesh.uv_loops.size());
+		for (std::uint32_t i = 0; i < header[1]; i++)
+		{
+			std::array<std::uint32_t, 2> attribute_header;
+			read_values(stream, attribute_header.data(), attribute_header.size());
+			std::string name((attribute_header[1] + 3) / 4 * 4, '\0');
+			read_values(stream, name.data(), name.size());
+			name.resize(attribute_header[1]);
+			if (attribute_header[0] == 0)
+			{
+				auto& attribute = mesh.add_attribute<float>(name);
+				attribute.data.resize(mesh.vertices.size());
+				read_values(stream, attribute.data.data(), attribute.data.size());
+			}
+			else
+			{
+				auto& attribute = mesh.add_attribute<Vector3>(name);
+				attribute.data.resize(mesh.vertices.size());
+				read_values(stream, attribute.data.data(), attribute.data.size());
+			}
+		}
+		return mesh;
+	}
+}
\ No newline at end of file
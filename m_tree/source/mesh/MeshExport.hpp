@@ -0,0 +1,28 @@
+#pragma once
+#include <string>
+#include <ostream>
+#include <istream>
+#include "Mesh.hpp"
+
+namespace Mtree
+{
+	enum class MeshFormat
+	{
+		Ply, // binary little endian, with the float and vector3 attributes per vertex and the uvs per face
+		Glb, // binary gltf, y up, with the attributes as _UPPERCASE vertex attributes. Vertices are split along uv seams
+		Raw // the buffers of the mesh as they are in memory, see write_mesh
+	};
+
+	MeshFormat get_mesh_format(const std::string& name); // "ply", "glb" or "raw"
+	std::size_t get_export_size(const Mesh& mesh, MeshFormat format); // size in bytes of the written mesh
+
+	// the mesh is written through a small buffer, the whole file is never held in memory.
+	// faces are reversed the same way the blender addon flips them to get outward normals, except in the raw format.
+	// raw layout: "MTREEMSH", uint32 version and attribute count, uint64 vertex, uv and polygon counts, then the vertices,
+	// uvs, polygons and uv_loops. Each attribute follows as uint32 type (0 float, 1 vector3) and name length,
+	// the name padded with zeros to a multiple of 4 bytes, then its data.
+	void write_mesh(const Mesh& mesh, MeshFormat format, std::ostream& stream);
+	// memory_mapped maps the file at its final size and copies the data into the mapping instead of going through a file stream
+	void write_mesh(const Mesh& mesh, MeshFormat format, const std::string& path, bool memory_mapped = false);
+	Mesh read_raw_mesh(std::istream& stream);
+}
\ No newline at end of file
@@ -1,12 +1,13 @@
 #pragma once
 #include "source/mesh/Mesh.hpp"
 #include "source/tree/Tree.hpp"
+#include "source/utilities/Progress.hpp"
 
 namespace Mtree
 {
 	class TreeMesher
 	{
 	public:
-		virtual Mesh mesh_tree(Tree& tree) = 0;
+		virtual Mesh mesh_tree(Tree& tree, const Progress& progress = Progress{}) = 0; // throws OperationCancelled when the progress is cancelled
 	};
 }
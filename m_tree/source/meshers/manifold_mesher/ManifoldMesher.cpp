@@ -1,7 +1,12 @@
 #include <iostream>
 #include <algorithm>
+#include <stdexcept>
+#include <atomic>
 #include "source/utilities/GeometryUtilities.hpp"
 #include "source/utilities/NodeUtilities.hpp"
+#include "source/utilities/ThreadPool.hpp"
+#include "source/utilities/Profiling.hpp"
+#include "source/tree/Simplification.hpp"
 #include "ManifoldMesher.hpp"
 #include "smoothing.hpp"
 
@@ -58,17 +63,13 @@ namespace
     
     bool is_index_in_branch_mask(const std::vector<IndexRange>& mask, const int index, const int radial_n_points)
     {
-        int offset = radial_n_points / 2;
-        for (auto range : mask)
+        // the masked polygons are the ones under the child footprint, from min_index to max_index going around the circle.
+        // Wrapped ranges are handled the same way, even when they cover more than half of the circle
+        for (auto& range : mask)
         {
-            int i = index;
-            if (range.max_index < range.min_index)
-            {
-                i = (i + offset) % radial_n_points;
-                range.min_index = (range.min_index + offset) % radial_n_points;
-                range.max_index = (range.max_index + offset) % radial_n_points;
-            }
-            if (i >= range.min_index && i < range.max_index)
+            int offset = (index - range.min_index + radial_n_points) % radial_n_points;
+            int width = (range.max_index - range.min_index + radial_n_points) % radial_n_points;
+            if (offset < width)
             {
                 return true;
             }
@@ -102,6 +103,55 @@ namespace
         }
     }
 
+    // bridges circles with different even numbers of vertices with quads only: the difference is made by quads
+    // taking two edges of the larger circle and a single vertex of the smaller one, spread evenly around the circles
+    void bridge_circles_of_different_sizes(const CircleDesignator& first_circle, const CircleDesignator& second_circle, Mesh& mesh)
+    {
+        bool first_is_larger = first_circle.radial_n > second_circle.radial_n;
+        const CircleDesignator& large = first_is_larger ? first_circle : second_circle;
+        const CircleDesignator& small = first_is_larger ? second_circle : first_circle;
+        int merged_count = (large.radial_n - small.radial_n) / 2; // quads taking two edges of the large circle
+        int step_count = small.radial_n + merged_count;
+        int i = 0; // index on the large circle
+        int j = 0; // index on the small circle
+        for (int step = 0; step < step_count; step++)
+        {
+            bool is_merged = (step + 1) * merged_count / step_count > step * merged_count / step_count;
+            int polygon_index = mesh.add_polygon();
+            if (is_merged)
+            {
+                if (first_is_larger)
+                {
+                    mesh.polygons[polygon_index] = { large.vertex_index + i, large.vertex_index + (i + 1) % large.radial_n, large.vertex_index + (i + 2) % large.radial_n, small.vertex_index + j % small.radial_n };
+                    mesh.uv_loops[polygon_index] = { large.uv_index + i, large.uv_index + i + 1, large.uv_index + i + 2, small.uv_index + j };
+                }
+                else
+                {
+                    mesh.polygons[polygon_index] = { small.vertex_index + j % small.radial_n, large.vertex_index + (i + 2) % large.radial_n, large.vertex_index + (i + 1) % large.radial_n, large.vertex_index + i };
+                    mesh.uv_loops[polygon_index] = { small.uv_index + j, large.uv_index + i + 2, large.uv_index + i + 1, large.uv_index + i };
+                }
+                i += 2;
+            }
+            else
+            {
+                const CircleDesignator& first = first_circle;
+                const CircleDesignator& second = second_circle;
+                int first_index = first_is_larger ? i : j;
+                int second_index = first_is_larger ? j : i;
+                mesh.polygons[polygon_index] =
+                {
+                    first.vertex_index + first_index,
+                    first.vertex_index + (first_index + 1) % first.radial_n,
+                    second.vertex_index + (second_index + 1) % second.radial_n,
+                    second.vertex_index + second_index
+                };
+                mesh.uv_loops[polygon_index] = { first.uv_index + first_index, first.uv_index + first_index + 1, second.uv_index + second_index + 1, second.uv_index + second_index };
+                i++;
+                j++;
+            }
+        }
+    }
+
     float get_branch_angle_around_parent(const Node& parent, const Node& branch)
     {
         Vector3 projected_branch_dir = Geometry::projected_on_plane(branch.direction, parent.direction).normalized();
@@ -127,6 +177,11 @@ namespace
         for (size_t i = 1; i < node.children.size(); i++)
         {
             auto& child = node.children[i];
+            if (child->node.is_instance()) // instances are meshed separately, they don't cut a hole in their parent
+            {
+                ranges.push_back(IndexRange{ 0, 0 });
+                continue;
+            }
             float angle = get_branch_angle_around_parent(node, child->node);
             IndexRange range = get_branch_indices_on_circle(radial_n_points, node.radius, child->node.radius, angle);
 
@@ -153,23 +208,31 @@ namespace
         return child_base_indices;
     }
     
-    void add_child_base_geometry(const std::vector<int>& child_base_indices, const CircleDesignator& child_base, const float child_radius, const Vector3& child_pos, const int offset, const float smooth_amount, Mesh& mesh)
+    // indices of vertices living in another mesh are stored as negative numbers, they are resolved when the meshes are stitched together
+    int encode_base_index(const int index, const bool is_in_other_mesh)
     {
+        return is_in_other_mesh ? -1 - index : index;
+    }
+
+    // base_mesh is the mesh containing the parent circle, it differs from mesh when branches are meshed in parallel
+    void add_child_base_geometry(const std::vector<int>& child_base_indices, const CircleDesignator& child_base, const float child_radius, const Vector3& child_pos, const int offset, const float smooth_amount, const Mesh& base_mesh, Mesh& mesh)
+    {
+        bool base_in_other_mesh = &base_mesh != &mesh;
         auto& smooth_attr = *static_cast<Attribute<float>*> (mesh.attributes[ManifoldMesher::AttributeNames::smooth_amount].get());
         auto& radius_attr = *static_cast<Attribute<float>*> (mesh.attributes[ManifoldMesher::AttributeNames::radius].get());
         auto& direction_attr = *static_cast<Attribute<Vector3>*> (mesh.attributes[ManifoldMesher::AttributeNames::direction].get());
 
-        Vector3 direction = (mesh.vertices[child_base_indices[2]] - mesh.vertices[child_base_indices[0]]).cross(mesh.vertices[child_base_indices[1]] - mesh.vertices[child_base_indices[0]]).normalized();
+        Vector3 direction = (base_mesh.vertices[child_base_indices[2]] - base_mesh.vertices[child_base_indices[0]]).cross(base_mesh.vertices[child_base_indices[1]] - base_mesh.vertices[child_base_indices[0]]).normalized();
         
         Vector3 child_base_center{ 0,0,0 };
         for (auto& i : child_base_indices)
-            child_base_center += mesh.vertices[(size_t)i];
+            child_base_center += base_mesh.vertices[(size_t)i];
         child_base_center /= child_base_indices.size();
         
         for (int i = 0; i < child_base.radial_n; i++)
         {
             int index = (i + offset) % child_base.radial_n;
-            Vector3 vertex = mesh.vertices[child_base_indices[(size_t)index]];
+            Vector3 vertex = base_mesh.vertices[child_base_indices[(size_t)index]];
             vertex = (vertex - child_base_center).normalized() * child_radius + child_pos;
             int added_vertex_index = mesh.add_vertex(vertex);
             smooth_attr.data[added_vertex_index] = smooth_amount;
@@ -179,8 +242,8 @@ namespace
             int polygon_index = mesh.add_polygon();
             mesh.polygons[polygon_index] =
             {
-                child_base_indices[index],
-                child_base_indices[(index + 1) % child_base.radial_n],
+                encode_base_index(child_base_indices[index], base_in_other_mesh),
+                encode_base_index(child_base_indices[(index + 1) % child_base.radial_n], base_in_other_mesh),
                 child_base.vertex_index + (i + 1) % child_base.radial_n,
                 child_base.vertex_index + i
             };
@@ -239,7 +302,7 @@ namespace
         return circle_uv_start_index;
     }
 
-    CircleDesignator add_child_circle(const Node& parent, const NodeChild& child, const Vector3& child_pos, const Vector3& parent_pos, const CircleDesignator& parent_base, const IndexRange child_range, const float uv_y, Mesh& mesh)
+    CircleDesignator add_child_circle(const Node& parent, const NodeChild& child, const Vector3& child_pos, const Vector3& parent_pos, const CircleDesignator& parent_base, const IndexRange child_range, const float uv_y, const Mesh& base_mesh, Mesh& mesh)
     {
         float smooth_amount = get_smooth_amount(child.node.radius, parent.length);
         
@@ -251,7 +314,7 @@ namespace
 
         CircleDesignator child_base{ (int)mesh.vertices.size(), (int)mesh.uvs.size(), child_radial_n };
         child_base.uv_index = add_child_base_uvs(uv_y, parent, child, child_range, child_radial_n, parent_base.radial_n, mesh);
-        add_child_base_geometry(child_base_indices, child_base, child.node.radius, child_pos, offset, smooth_amount, mesh);
+        add_child_base_geometry(child_base_indices, child_base, child.node.radius, child_pos, offset, smooth_amount, base_mesh, mesh);
         return child_base;
     }
     
@@ -273,26 +336,83 @@ namespace
         }
     }
     
-    void mesh_node_rec(const Node& node, const Vector3& node_position, const CircleDesignator& base, Mesh& mesh, const float uv_y)
+    // side branch whose meshing is delayed so that it can be done by another thread
+    struct SideBranch
+    {
+        const Node* parent;
+        const NodeChild* child;
+        Vector3 parent_position;
+        Vector3 child_position;
+        CircleDesignator parent_base;
+        IndexRange child_range;
+        float uv_y;
+        float child_uv_y;
+    };
+
+    int count_nodes_rec(const Node& node)
+    {
+        int count = 1;
+        for (auto& child : node.children)
+            count += count_nodes_rec(child->node);
+        return count;
+    }
+
+    // meshing progress, estimated from the number of created vertices
+    struct MeshingProgress
     {
+        Progress progress;
+        float expected_vertex_count;
+        std::atomic<size_t> created_vertex_count{ 0 }; // only used when branches are meshed in parallel
+
+        MeshingProgress(const Progress& progress, const float expected_vertex_count) : progress(progress), expected_vertex_count(expected_vertex_count) {};
+        void update(const size_t vertex_count) const { progress.update(vertex_count / expected_vertex_count); };
+        void add_vertices(const size_t count) { update(created_vertex_count += count); };
+    };
+
+    // when side_branches is not null, side branches are not meshed but added to side_branches in the order they would have been meshed.
+    // The progress is updated before each side branch meshed, the ring and bridge times are added to profile when it is not null
+    void mesh_node_rec(const Node& node, const Vector3& node_position, const CircleDesignator& base, Mesh& mesh, const float uv_y, const RingResolution& resolution, std::vector<SideBranch>* side_branches = nullptr, const MeshingProgress* progress = nullptr, MeshingProfile* profile = nullptr)
+    {
+        float* ring_time = profile != nullptr ? &profile->ring_time : nullptr;
+        float* bridge_time = profile != nullptr ? &profile->bridge_time : nullptr;
         if (node.children.size() < 2)
         {
+            // the size of the rings only changes on nodes without side branches, whose holes are cut in rings of the same size
             float uv_growth = node.length / (node.radius+.001f) / (2*M_PI);
-            auto child_circle = add_circle(node_position, node, 1 , base.radial_n, mesh, uv_y + uv_growth);
-            bridge_circles(base, child_circle, base.radial_n, mesh);
+            float end_radius = node.is_leaf() ? node.radius : node.children[0]->node.radius;
+            int radial_n = resolution.get_ring_size(end_radius, base.radial_n);
+            CircleDesignator child_circle;
+            {
+                ScopedTimer timer{ ring_time };
+                child_circle = add_circle(node_position, node, 1 , radial_n, mesh, uv_y + uv_growth);
+            }
+            {
+                ScopedTimer timer{ bridge_time };
+                if (radial_n == base.radial_n)
+                    bridge_circles(base, child_circle, base.radial_n, mesh);
+                else
+                    bridge_circles_of_different_sizes(base, child_circle, mesh);
+            }
             Vector3 child_pos = NodeUtilities::get_position_in_node(node_position, node, 1);
 
             if (!node.is_leaf())
             {
-                mesh_node_rec(node.children[0]->node, child_pos, child_circle, mesh, uv_y + uv_growth);
+                mesh_node_rec(node.children[0]->node, child_pos, child_circle, mesh, uv_y + uv_growth, resolution, side_branches, progress, profile);
             }
         }
         else
         {
             float uv_growth = node.length / (node.radius + .001f) / (2*M_PI);
-            auto end_circle = add_circle(node_position, node, 1, base.radial_n, mesh, uv_y + uv_growth);
+            CircleDesignator end_circle;
+            {
+                ScopedTimer timer{ ring_time };
+                end_circle = add_circle(node_position, node, 1, base.radial_n, mesh, uv_y + uv_growth);
+            }
             std::vector<IndexRange> children_ranges = get_children_ranges(node, base.radial_n);
-            bridge_circles(base, end_circle, base.radial_n, mesh, &children_ranges);
+            {
+                ScopedTimer timer{ bridge_time };
+                bridge_circles(base, end_circle, base.radial_n, mesh, &children_ranges);
+            }
             for (int i = 0; i < node.children.size(); i++)
             {
                 if (i == 0) // first child is the continuity of the branch
@@ -300,45 +420,502 @@ namespace
                     Vector3 child_pos = NodeUtilities::get_position_in_node(node_position, node, 1);
                     if (node.children.size() > 0)
                     {
-                        mesh_node_rec(node.children[0]->node, child_pos, end_circle, mesh, uv_y + uv_growth);
+                        mesh_node_rec(node.children[0]->node, child_pos, end_circle, mesh, uv_y + uv_growth, resolution, side_branches, progress, profile);
                     }
                 }
                 else
                 {
                     auto& child = *node.children[i];
+                    if (child.node.is_instance())
+                        continue;
                     Vector3 child_pos = get_side_child_position(node, child, node_position);
 
-                    auto child_base = add_child_circle(node, child, child_pos, node_position, base, children_ranges[i - 1], uv_y, mesh);
-                    mesh_node_rec(node.children[i]->node, child_pos, child_base, mesh, uv_y + uv_growth);
+                    if (side_branches != nullptr)
+                    {
+                        side_branches->push_back(SideBranch{ &node, &child, node_position, child_pos, base, children_ranges[i - 1], uv_y, uv_y + uv_growth });
+                        continue;
+                    }
+                    if (progress != nullptr)
+                        progress->update(mesh.vertices.size());
+                    CircleDesignator child_base;
+                    {
+                        ScopedTimer timer{ bridge_time };
+                        child_base = add_child_circle(node, child, child_pos, node_position, base, children_ranges[i - 1], uv_y, mesh, mesh);
+                    }
+                    mesh_node_rec(node.children[i]->node, child_pos, child_base, mesh, uv_y + uv_growth, resolution, nullptr, progress, profile);
                 }
             }
         }
     }
-}
-
 
-namespace Mtree
-{
+    void add_attributes(Mesh& mesh)
+    {
+        mesh.add_attribute<float>(AttributeNames::smooth_amount);
+        mesh.add_attribute<float>(AttributeNames::radius);
+        mesh.add_attribute<Vector3>(AttributeNames::direction);
+    }
 
-	Mesh ManifoldMesher::mesh_tree(Tree& tree)
+    // part of the tree meshed by a single thread, either a stem or a side branch
+    struct MeshingTask
     {
         Mesh mesh;
-        auto& smooth_attr = mesh.add_attribute<float>(AttributeNames::smooth_amount);
-        auto& radius_attr = mesh.add_attribute<float>(AttributeNames::radius);
-        auto& direction_attr = mesh.add_attribute<Vector3>(AttributeNames::direction);
-        for (auto& stem : tree.get_stems())
+        const MeshingTask* parent = nullptr; // task owning the vertices referenced by negative indices
+        std::vector<std::unique_ptr<MeshingTask>> subtasks; // side branches, in the order the serial mesher meshes them
+        int vertex_offset = 0;
+        int uv_offset = 0;
+        MeshingProfile profile; // ring and bridge times of the task only
+    };
+
+    void mesh_stem_task(const Stem& stem, const RingResolution& resolution, MeshingTask& task, std::vector<SideBranch>& side_branches, MeshingProfile* profile = nullptr)
+    {
+        add_attributes(task.mesh);
+        int radial_n = resolution.get_stem_ring_size(stem.node.radius);
+        CircleDesignator start_circle{ 0, 0, radial_n };
+        {
+            ScopedTimer timer{ profile != nullptr ? &profile->ring_time : nullptr };
+            add_circle(stem.position, stem.node, 0, radial_n, task.mesh, 0);
+        }
+        mesh_node_rec(stem.node, stem.position, start_circle, task.mesh, 0, resolution, &side_branches, nullptr, profile);
+    }
+
+    // task->parent must be set, its mesh holds the circle the side branch starts from
+    void mesh_side_branch_task(const SideBranch& side_branch, const RingResolution& resolution, MeshingTask& task, std::vector<SideBranch>& side_branches, MeshingProfile* profile = nullptr)
+    {
+        add_attributes(task.mesh);
+        CircleDesignator child_base;
+        {
+            ScopedTimer timer{ profile != nullptr ? &profile->bridge_time : nullptr };
+            child_base = add_child_circle(*side_branch.parent, *side_branch.child, side_branch.child_position, side_branch.parent_position, side_branch.parent_base, side_branch.child_range, side_branch.uv_y, task.parent->mesh, task.mesh);
+        }
+        mesh_node_rec(side_branch.child->node, side_branch.child_position, child_base, task.mesh, side_branch.child_uv_y, resolution, &side_branches, nullptr, profile);
+    }
+
+    void run_meshing_task(MeshingTask& task, std::vector<SideBranch>& side_branches, const RingResolution& resolution, ThreadPool& pool, MeshingProgress& progress, const bool detailed_profiling)
+    {
+        progress.add_vertices(task.mesh.vertices.size());
+        task.subtasks.reserve(side_branches.size());
+        for (size_t i = 0; i < side_branches.size(); i++)
+        {
+            auto subtask = std::make_unique<MeshingTask>();
+            subtask->parent = &task;
+            task.subtasks.push_back(std::move(subtask));
+        }
+        for (size_t i = 0; i < side_branches.size(); i++)
+        {
+            MeshingTask* subtask = task.subtasks[i].get();
+            SideBranch side_branch = side_branches[i];
+            pool.submit([subtask, side_branch, &resolution, &pool, &progress, detailed_profiling]()
+                {
+                    progress.progress.check_cancelled();
+                    std::vector<SideBranch> child_side_branches;
+                    mesh_side_branch_task(side_branch, resolution, *subtask, child_side_branches, detailed_profiling ? &subtask->profile : nullptr);
+                    run_meshing_task(*subtask, child_side_branches, resolution, pool, progress, detailed_profiling);
+                });
+        }
+    }
+
+    void get_tasks_in_mesh_order(MeshingTask& task, std::vector<MeshingTask*>& tasks)
+    {
+        tasks.push_back(&task);
+        for (auto& subtask : task.subtasks)
+        {
+            get_tasks_in_mesh_order(*subtask, tasks);
+        }
+    }
+
+    // polygons and uv loops are shifted by the offsets of the task, and those of its parent for the vertices it owns
+    void append_task_mesh(const MeshingTask& task, Mesh& mesh)
+    {
+        const Mesh& task_mesh = task.mesh;
+        mesh.vertices.insert(mesh.vertices.end(), task_mesh.vertices.begin(), task_mesh.vertices.end());
+        mesh.uvs.insert(mesh.uvs.end(), task_mesh.uvs.begin(), task_mesh.uvs.end());
+        for (auto& [name, attribute] : mesh.attributes)
+        {
+            attribute->extend(*task_mesh.attributes.at(name));
+        }
+        for (size_t i = 0; i < task_mesh.polygons.size(); i++)
+        {
+            std::array<int, 4> polygon = task_mesh.polygons[i];
+            std::array<int, 4> uv_loop = task_mesh.uv_loops[i];
+            for (size_t j = 0; j < 4; j++)
+            {
+                polygon[j] = polygon[j] >= 0 ? polygon[j] + task.vertex_offset : -1 - polygon[j] + task.parent->vertex_offset;
+                uv_loop[j] += task.uv_offset;
+            }
+            mesh.polygons.push_back(polygon);
+            mesh.uv_loops.push_back(uv_loop);
+        }
+    }
+
+    // concatenate the task meshes in the order of the serial mesher, so that both produce the same mesh
+    void stitch_tasks(std::vector<std::unique_ptr<MeshingTask>>& root_tasks, Mesh& mesh)
+    {
+        std::vector<MeshingTask*> tasks;
+        for (auto& task : root_tasks)
+        {
+            get_tasks_in_mesh_order(*task, tasks);
+        }
+
+        size_t vertex_count = 0, uv_count = 0, polygon_count = 0;
+        for (MeshingTask* task : tasks)
+        {
+            task->vertex_offset = (int)vertex_count;
+            task->uv_offset = (int)uv_count;
+            vertex_count += task->mesh.vertices.size();
+            uv_count += task->mesh.uvs.size();
+            polygon_count += task->mesh.polygons.size();
+        }
+        mesh.vertices.reserve(vertex_count);
+        mesh.uvs.reserve(uv_count);
+        mesh.polygons.reserve(polygon_count);
+        mesh.uv_loops.reserve(polygon_count);
+
+        for (MeshingTask* task : tasks)
+        {
+            append_task_mesh(*task, mesh);
+            task->mesh = Mesh{}; // release memory as soon as possible
+        }
+    }
+
+    void mesh_stems_serial(std::vector<Stem>& stems, const RingResolution& resolution, Mesh& mesh, const MeshingProgress& progress, MeshingProfile* profile)
+    {
+        for (auto& stem : stems)
         {
             //__debugbreak();
 
             if (stem.node.children.size() == 0)
                 continue;
-            CircleDesignator start_circle{ (int)mesh.vertices.size(), (int)mesh.uvs.size(), radial_resolution };
-            add_circle(stem.position, stem.node, 0, radial_resolution, mesh, 0);
-            mesh_node_rec(stem.node, stem.position, start_circle, mesh, 0);
+            int radial_n = resolution.get_stem_ring_size(stem.node.radius);
+            CircleDesignator start_circle{ (int)mesh.vertices.size(), (int)mesh.uvs.size(), radial_n };
+            {
+                ScopedTimer timer{ profile != nullptr ? &profile->ring_time : nullptr };
+                add_circle(stem.position, stem.node, 0, radial_n, mesh, 0);
+            }
+            mesh_node_rec(stem.node, stem.position, start_circle, mesh, 0, resolution, nullptr, &progress, profile);
         }
+    }
+
+    // the ring and bridge times of the tasks are summed in profile when it is not null
+    void mesh_stems_parallel(std::vector<Stem>& stems, const RingResolution& resolution, const int thread_count, Mesh& mesh, MeshingProgress& progress, MeshingProfile* profile)
+    {
+        bool detailed_profiling = profile != nullptr;
+        std::vector<std::unique_ptr<MeshingTask>> root_tasks;
+        {
+            ThreadPool pool{ thread_count };
+            for (auto& stem : stems)
+            {
+                if (stem.node.children.size() == 0)
+                    continue;
+                root_tasks.push_back(std::make_unique<MeshingTask>());
+                MeshingTask* task = root_tasks.back().get();
+                Stem* stem_ptr = &stem;
+                pool.submit([task, stem_ptr, &resolution, &pool, &progress, detailed_profiling]()
+                    {
+                        progress.progress.check_cancelled();
+                        std::vector<SideBranch> side_branches;
+                        mesh_stem_task(*stem_ptr, resolution, *task, side_branches, detailed_profiling ? &task->profile : nullptr);
+                        run_meshing_task(*task, side_branches, resolution, pool, progress, detailed_profiling);
+                    });
+            }
+            pool.wait();
+        }
+        if (profile != nullptr)
+        {
+            std::vector<MeshingTask*> tasks;
+            for (auto& task : root_tasks)
+            {
+                get_tasks_in_mesh_order(*task, tasks);
+            }
+            for (MeshingTask* task : tasks)
+            {
+                profile->ring_time += task->profile.ring_time;
+                profile->bridge_time += task->profile.bridge_time;
+            }
+        }
+        stitch_tasks(root_tasks, mesh);
+    }
+}
+
+
+namespace Mtree
+{
+
+	Mesh ManifoldMesher::mesh_tree(Tree& tree, const Progress& progress)
+    {
+        auto start = std::chrono::steady_clock::now();
+        MeshingProfile new_profile;
+        MeshingProfile* detailed_profile = detailed_profiling ? &new_profile : nullptr;
+        Mesh mesh;
+        add_attributes(mesh);
+        // each node adds about one circle of vertices, counting the nodes is only worth it when the progress is reported
+        float expected_vertex_count = progress.has_callback() ? (float)tree.get_node_count() * radial_resolution : 1.f;
+        MeshingProgress meshing_progress{ progress.get_step("meshing", 0, 1), std::max(1.f, expected_vertex_count) };
+        if (thread_count == 1)
+            mesh_stems_serial(tree.get_stems(), get_ring_resolution(), mesh, meshing_progress, detailed_profile);
+        else
+            mesh_stems_parallel(tree.get_stems(), get_ring_resolution(), thread_count, mesh, meshing_progress, detailed_profile);
+        meshing_progress.progress.update(1);
+        new_profile.meshing_time = std::chrono::duration<float>(std::chrono::steady_clock::now() - start).count();
+
+        auto& smooth_attr = *static_cast<Attribute<float>*> (mesh.attributes[AttributeNames::smooth_amount].get());
         if (smooth_iterations > 0)
-            MeshProcessing::Smoothing::smooth_mesh(mesh, smooth_iterations, 1, &smooth_attr.data);
+        {
+            ScopedTimer timer{ &new_profile.smoothing_time };
+            MeshProcessing::Smoothing::smooth_mesh(mesh, *get_adjacency(mesh), smooth_iterations, 1, &smooth_attr.data, thread_count, progress.get_step("smoothing", 0, 1));
+        }
+        new_profile.vertex_count = (int)mesh.vertices.size();
+        new_profile.polygon_count = (int)mesh.polygons.size();
+        last_meshing.set_profile(new_profile);
         return mesh;
     }
+
+    int RingResolution::get_adaptive_size(const float radius) const
+    {
+        // even sizes, so that rings of different sizes can be bridged with quads. Side branches are built from at least 3 vertices of their parent ring
+        int min_size = std::max(4, min_radial_resolution + min_radial_resolution % 2);
+        int max_size = std::max(min_size, radial_resolution - radial_resolution % 2);
+        return std::clamp(2 * (int)std::round(M_PI * radius / target_edge_length), min_size, max_size);
+    }
+
+    int RingResolution::get_stem_ring_size(const float radius) const
+    {
+        return target_edge_length > 0 ? get_adaptive_size(radius) : radial_resolution;
+    }
+
+    int RingResolution::get_ring_size(const float radius, const int current_size) const
+    {
+        if (target_edge_length <= 0 || current_size % 2 == 1)
+            return current_size;
+        return get_adaptive_size(radius);
+    }
+
+    RingResolution ManifoldMesher::get_ring_resolution() const
+    {
+        return RingResolution{ radial_resolution, target_edge_length, min_radial_resolution };
+    }
+
+    MeshingProfile ManifoldMesher::get_profile() const
+    {
+        return last_meshing.get_profile();
+    }
+
+    std::vector<Mesh> ManifoldMesher::mesh_tree_lods(Tree& tree, const std::vector<LodLevel>& levels, const Progress& progress)
+    {
+        // the levels are simplified from the finest to the coarsest, a level reuses the stems of the previous one when it removes at least as much
+        std::vector<size_t> order(levels.size());
+        for (size_t i = 0; i < order.size(); i++)
+            order[i] = i;
+        std::stable_sort(order.begin(), order.end(), [&](size_t a, size_t b)
+            {
+                return std::make_pair(levels[a].min_radius, levels[a].max_angle) < std::make_pair(levels[b].min_radius, levels[b].max_angle);
+            });
+        std::vector<std::vector<Stem>> level_stems(levels.size());
+        const std::vector<Stem>* previous_stems = &tree.get_stems();
+        const LodLevel* previous_level = nullptr;
+        for (size_t i : order)
+        {
+            progress.check_cancelled();
+            const LodLevel& level = levels[i];
+            bool is_coarser = previous_level != nullptr && level.min_radius >= previous_level->min_radius && level.max_angle >= previous_level->max_angle;
+            level_stems[i] = simplify_stems(is_coarser ? *previous_stems : tree.get_stems(), level.min_radius, level.max_angle);
+            previous_stems = &level_stems[i];
+            previous_level = &level;
+        }
+
+        std::vector<Mesh> meshes(levels.size());
+        Progress meshing_progress = progress.get_step("meshing", 0, 1);
+        auto mesh_level = [&](size_t i)
+            {
+                const LodLevel& level = levels[i];
+                float expected_vertex_count = 1;
+                if (meshing_progress.has_callback())
+                {
+                    for (auto& stem : level_stems[i])
+                        expected_vertex_count += (float)count_nodes_rec(stem.node) * level.radial_resolution;
+                }
+                // levels meshed in parallel report their progress in their own part of the range
+                MeshingProgress level_progress{ meshing_progress.get_step("", (float)i / levels.size(), (i + 1.f) / levels.size()), expected_vertex_count };
+                level_progress.progress.check_cancelled();
+                Mesh& mesh = meshes[i];
+                add_attributes(mesh);
+                RingResolution resolution{ level.radial_resolution, level.target_edge_length, level.min_radial_resolution };
+                mesh_stems_serial(level_stems[i], resolution, mesh, level_progress, nullptr);
+                level_stems[i].clear();
+                if (level.smooth_iterations > 0)
+                {
+                    auto& smooth_attr = *static_cast<Attribute<float>*> (mesh.attributes[AttributeNames::smooth_amount].get());
+                    MeshProcessing::Smoothing::smooth_mesh(mesh, MeshProcessing::Smoothing::get_adjacency(mesh), level.smooth_iterations, 1, &smooth_attr.data);
+                }
+                level_progress.progress.update(1);
+            };
+        if (thread_count == 1)
+        {
+            for (size_t i = 0; i < levels.size(); i++)
+                mesh_level(i);
+        }
+        else
+        {
+            ThreadPool pool{ thread_count };
+            for (size_t i = 0; i < levels.size(); i++)
+                pool.submit([&mesh_level, i]() { mesh_level(i); });
+            pool.wait();
+        }
+        meshing_progress.update(1);
+        return meshes;
+    }
+
+    std::vector<Mesh> ManifoldMesher::mesh_prototypes(Tree& tree)
+    {
+        std::vector<Mesh> meshes;
+        for (auto& prototype : tree.get_prototypes())
+        {
+            std::vector<Stem> stems;
+            stems.push_back(prototype->stem.clone());
+            Mesh& mesh = meshes.emplace_back();
+            add_attributes(mesh);
+            mesh_stems_serial(stems, get_ring_resolution(), mesh, MeshingProgress{ Progress{}, 1 }, nullptr);
+            if (smooth_iterations > 0)
+            {
+                auto& smooth_attr = *static_cast<Attribute<float>*> (mesh.attributes[AttributeNames::smooth_amount].get());
+                MeshProcessing::Smoothing::smooth_mesh(mesh, MeshProcessing::Smoothing::get_adjacency(mesh), smooth_iterations, 1, &smooth_attr.data);
+            }
+        }
+        return meshes;
+    }
+
+    std::shared_ptr<MeshChunkStream> ManifoldMesher::mesh_tree_chunks(Tree& tree, const int chunk_size)
+    {
+        return std::make_shared<MeshChunkStream>(tree.get_stems(), get_ring_resolution(), chunk_size);
+    }
+
+    struct MeshChunkStream::State
+    {
+        // side branch waiting to be meshed, the mesh of its parent is kept until then
+        struct PendingBranch
+        {
+            std::shared_ptr<MeshingTask> parent;
+            SideBranch side_branch;
+        };
+
+        std::vector<Stem>& stems;
+        RingResolution resolution;
+        int chunk_size;
+        size_t next_stem = 0;
+        std::vector<PendingBranch> pending_branches; // the last branch is meshed first, so that branches come in the order of the serial mesher
+        int vertex_count = 0;
+        int uv_count = 0;
+    };
+
+    MeshChunkStream::MeshChunkStream(std::vector<Stem>& stems, const RingResolution& resolution, const int chunk_size)
+    {
+        if (chunk_size <= 0)
+        {
+            throw std::invalid_argument("chunk size must be positive");
+        }
+        state = std::make_unique<State>(State{ stems, resolution, chunk_size, 0, {} });
+    }
+
+    MeshChunkStream::~MeshChunkStream() = default;
+
+    bool MeshChunkStream::next(MeshChunk& chunk)
+    {
+        chunk = MeshChunk{ Mesh{}, state->vertex_count, state->uv_count };
+        add_attributes(chunk.mesh);
+        bool has_geometry = false;
+        while ((int)chunk.mesh.vertices.size() < state->chunk_size)
+        {
+            auto task = std::make_shared<MeshingTask>();
+            std::shared_ptr<MeshingTask> parent; // keeps the parent alive until the task is appended
+            std::vector<SideBranch> side_branches;
+            if (!state->pending_branches.empty())
+            {
+                State::PendingBranch branch = std::move(state->pending_branches.back());
+                state->pending_branches.pop_back();
+                parent = branch.parent;
+                task->parent = parent.get();
+                mesh_side_branch_task(branch.side_branch, state->resolution, *task, side_branches);
+            }
+            else if (state->next_stem < state->stems.size())
+            {
+                Stem& stem = state->stems[state->next_stem++];
+                if (stem.node.children.size() == 0)
+                    continue;
+                mesh_stem_task(stem, state->resolution, *task, side_branches);
+            }
+            else
+                break;
+
+            task->vertex_offset = state->vertex_count;
+            task->uv_offset = state->uv_count;
+            append_task_mesh(*task, chunk.mesh);
+            state->vertex_count += (int)task->mesh.vertices.size();
+            state->uv_count += (int)task->mesh.uvs.size();
+            has_geometry = true;
+
+            // side branches only read the vertices of their parent
+            std::vector<Vector3> vertices = std::move(task->mesh.vertices);
+            task->mesh = Mesh{};
+            task->mesh.vertices = std::move(vertices);
+            for (int i = (int)side_branches.size() - 1; i >= 0; i--)
+            {
+                state->pending_branches.push_back(State::PendingBranch{ task, side_branches[i] });
+            }
+        }
+        return has_geometry;
+    }
+
+    std::shared_ptr<const MeshProcessing::Smoothing::Adjacency> ManifoldMesher::get_adjacency(const Mesh& mesh)
+    {
+        auto cached_adjacency = last_meshing.get_adjacency();
+        if (cached_adjacency != nullptr && cached_adjacency->offsets.size() == mesh.vertices.size() + 1 && cached_adjacency->topology_hash == mesh.get_topology_hash())
+        {
+            return cached_adjacency;
+        }
+        auto adjacency = std::make_shared<const MeshProcessing::Smoothing::Adjacency>(MeshProcessing::Smoothing::get_adjacency(mesh));
+        last_meshing.set_adjacency(adjacency);
+        return adjacency;
+    }
+
+    ManifoldMesher::LastMeshing::LastMeshing(const LastMeshing& other)
+    {
+        std::lock_guard<std::mutex> lock{ other.mutex };
+        profile = other.profile;
+        adjacency = other.adjacency;
+    }
+
+    ManifoldMesher::LastMeshing& ManifoldMesher::LastMeshing::operator=(const LastMeshing& other)
+    {
+        if (this != &other)
+        {
+            std::scoped_lock lock{ mutex, other.mutex };
+            profile = other.profile;
+            adjacency = other.adjacency;
+        }
+        return *this;
+    }
+
+    MeshingProfile ManifoldMesher::LastMeshing::get_profile() const
+    {
+        std::lock_guard<std::mutex> lock{ mutex };
+        return profile;
+    }
+
+    void ManifoldMesher::LastMeshing::set_profile(const MeshingProfile& new_profile)
+    {
+        std::lock_guard<std::mutex> lock{ mutex };
+        profile = new_profile;
+    }
+
+    std::shared_ptr<const MeshProcessing::Smoothing::Adjacency> ManifoldMesher::LastMeshing::get_adjacency() const
+    {
+        std::lock_guard<std::mutex> lock{ mutex };
+        return adjacency;
+    }
+
+    void ManifoldMesher::LastMeshing::set_adjacency(std::shared_ptr<const MeshProcessing::Smoothing::Adjacency> new_adjacency)
+    {
+        std::lock_guard<std::mutex> lock{ mutex };
+        adjacency = std::move(new_adjacency);
+    }
     
 }
\ No newline at end of file
@@ -1,12 +1,91 @@
 #pragma once
 #include <tuple>
+#include <memory>
+#include <mutex>
 #include "../base_types/TreeMesher.hpp"
+#include "smoothing.hpp"
 
 namespace Mtree
 {
+	// number of vertices of the rings of a tree mesh. Side branches start with as many vertices as their footprint on their parent
+	struct RingResolution
+	{
+		int radial_resolution = 8; // vertices around the stems, and the most vertices around any ring in adaptive mode
+		float target_edge_length = 0; // when positive, the rings along a branch get as many vertices as edges of this length around them
+		int min_radial_resolution = 4; // fewest vertices around a ring in adaptive mode, rings have at least 4 vertices
+
+		int get_stem_ring_size(const float radius) const;
+		int get_ring_size(const float radius, const int current_size) const; // size of the ring following a ring of current_size vertices along a branch
+	private:
+		int get_adaptive_size(const float radius) const;
+	};
+
+	struct MeshChunk
+	{
+		Mesh mesh; // polygons and uv loops index the vertices and uvs of the whole tree, not those of the chunk
+		int vertex_offset; // index of the first vertex of the chunk in the whole tree
+		int uv_offset; // index of the first uv of the chunk in the whole tree
+	};
+
+	// meshes a tree one branch at a time and returns the geometry in chunks, as soon as they hold at least chunk_size vertices.
+	// Only the branches with side branches left to mesh are kept in memory. The chunks are not smoothed
+	class MeshChunkStream
+	{
+	private:
+		struct State;
+		std::unique_ptr<State> state;
+
+	public:
+		MeshChunkStream(std::vector<Stem>& stems, const RingResolution& resolution, const int chunk_size);
+		~MeshChunkStream();
+		bool next(MeshChunk& chunk); // return false once the whole tree has been returned
+	};
+
+	struct MeshingProfile
+	{
+		float meshing_time = 0; // seconds, smoothing excluded
+		float ring_time = 0; // seconds spent creating the circles of vertices along the branches, summed over threads, only measured with detailed profiling
+		float bridge_time = 0; // seconds spent connecting circles and side branches with polygons, summed over threads, only measured with detailed profiling
+		float smoothing_time = 0;
+		int vertex_count = 0;
+		int polygon_count = 0;
+	};
+
+	struct LodLevel
+	{
+		int radial_resolution = 8; // vertices around the stems, side branches get as many as their footprint on their parent
+		float min_radius = 0; // side branches thinner than this at their base are removed
+		float max_angle = 0; // degrees, consecutive nodes of a branch deviating less than this are merged into one
+		int smooth_iterations = 0;
+		float target_edge_length = 0; // adaptive ring sizes when positive, as in ManifoldMesher
+		int min_radial_resolution = 4;
+	};
 
 	class ManifoldMesher : public TreeMesher
 	{
+	private:
+		// what is kept from the last meshed tree. A copy of the mesher can be made while another thread is meshing with it, so it is only accessed under its lock
+		class LastMeshing
+		{
+		private:
+			mutable std::mutex mutex;
+			MeshingProfile profile;
+			std::shared_ptr<const MeshProcessing::Smoothing::Adjacency> adjacency; // reused as long as the mesh topology doesn't change, shared by copies of the mesher
+
+		public:
+			LastMeshing() {};
+			LastMeshing(const LastMeshing& other);
+			LastMeshing& operator=(const LastMeshing& other);
+			MeshingProfile get_profile() const;
+			void set_profile(const MeshingProfile& new_profile);
+			std::shared_ptr<const MeshProcessing::Smoothing::Adjacency> get_adjacency() const;
+			void set_adjacency(std::shared_ptr<const MeshProcessing::Smoothing::Adjacency> new_adjacency);
+		};
+
+		LastMeshing last_meshing;
+		std::shared_ptr<const MeshProcessing::Smoothing::Adjacency> get_adjacency(const Mesh& mesh);
+		RingResolution get_ring_resolution() const;
+
 	public:
 		struct AttributeNames
 		{
@@ -15,9 +94,21 @@ namespace Mtree
 			inline static std::string direction = "direction";
 		};
 		
-		int radial_resolution = 8;
+		int radial_resolution = 8; // vertices around the stems, and the most vertices around any ring when the resolution is adaptive
 		int smooth_iterations = 4;
-		Mesh mesh_tree(Tree& tree) override;
+		float target_edge_length = 0; // when positive, the number of vertices of the rings follows the radius of the branches to keep edges about this long
+		int min_radial_resolution = 4; // fewest vertices around a ring when the resolution is adaptive
+		int thread_count = 1; // branches are meshed in parallel when different from 1, 0 uses all hardware threads
+		bool detailed_profiling = false; // measure the ring and bridge times, which slows meshing down a little
+		Mesh mesh_tree(Tree& tree, const Progress& progress = Progress{}) override; // reports the "meshing" and "smoothing" phases
+		std::shared_ptr<MeshChunkStream> mesh_tree_chunks(Tree& tree, const int chunk_size = 65536); // the tree must outlive the stream
+		MeshingProfile get_profile() const; // of the last mesh_tree call
+		// one mesh per level from a single grown tree. Each level is simplified from the previous one when it is at least as coarse,
+		// levels are meshed in parallel unless thread_count is 1
+		std::vector<Mesh> mesh_tree_lods(Tree& tree, const std::vector<LodLevel>& levels, const Progress& progress = Progress{});
+		// one mesh per prototype of tree.get_prototypes(), in the frame of the prototype. Instances are not part of the mesh of the tree,
+		// they are placed with the transforms of tree.get_branch_instances()
+		std::vector<Mesh> mesh_prototypes(Tree& tree);
 	};
 
 
@@ -1,74 +1,127 @@
+#include <algorithm>
 #include "smoothing.hpp"
 #include "source/utilities/GeometryUtilities.hpp"
+#include "source/utilities/ThreadPool.hpp"
 
 namespace Mtree::MeshProcessing::Smoothing
 {
-    void add_index_no_duplicates(std::vector<int>& indices, const int index)
+    Adjacency get_adjacency(const Mesh& mesh)
     {
-        for (auto i : indices)
+        size_t vertex_count = mesh.vertices.size();
+        // each edge adds one neighbour to both of its vertices, which gives an upper bound on the neighbourhood sizes
+        std::vector<int> capacities(vertex_count + 1, 0);
+        for (auto& polygon : mesh.polygons)
         {
-            if (index == i)
+            for (int i = 1; i < polygon.size(); i+=1)
             {
-                return;
+                capacities[polygon[i] + 1]++;
+                capacities[polygon[(i + 1) % polygon.size()] + 1]++;
             }
         }
-        indices.push_back(index);
-    }
-
+        for (size_t i = 0; i < vertex_count; i++)
+        {
+            capacities[i + 1] += capacities[i];
+        }
 
-    std::vector<std::vector<int>> get_neighbourhoods(Mtree::Mesh& mesh)
-    {
-        std::vector<std::vector<int>> vertex_neighbourhood;
-        vertex_neighbourhood.resize(mesh.vertices.size());
+        std::vector<int> neighbours(capacities.back());
+        std::vector<int> neighbour_counts(vertex_count, 0);
+        auto add_index_no_duplicates = [&](const int vertex, const int index)
+        {
+            int* start = &neighbours[capacities[vertex]];
+            int* end = start + neighbour_counts[vertex];
+            if (std::find(start, end, index) == end)
+            {
+                *end = index;
+                neighbour_counts[vertex]++;
+            }
+        };
         for (auto& polygon : mesh.polygons)
         {
             for (int i = 1; i < polygon.size(); i+=1)
             {
                 int i1 = polygon[i];
                 int i2 = polygon[(i + 1) % polygon.size()];
-                add_index_no_duplicates(vertex_neighbourhood[i1], i2);
-                add_index_no_duplicates(vertex_neighbourhood[i2], i1);
+                add_index_no_duplicates(i1, i2);
+                add_index_no_duplicates(i2, i1);
             }
         }
-        return vertex_neighbourhood;
+
+        Adjacency adjacency;
+        adjacency.topology_hash = mesh.get_topology_hash();
+        adjacency.offsets.resize(vertex_count + 1);
+        adjacency.offsets[0] = 0;
+        for (size_t i = 0; i < vertex_count; i++)
+        {
+            adjacency.offsets[i + 1] = adjacency.offsets[i] + neighbour_counts[i];
+        }
+        adjacency.indices.resize(adjacency.offsets.back());
+        for (size_t i = 0; i < vertex_count; i++)
+        {
+            std::copy_n(neighbours.begin() + capacities[i], neighbour_counts[i], adjacency.indices.begin() + adjacency.offsets[i]);
+        }
+        return adjacency;
     }
 
-    void smooth_mesh_once(std::vector<Vector3>* result, const std::vector<Vector3>* previous_iteration, const std::vector<std::vector<int>>& neighbourhoods, float factor, std::vector<float>* weights=nullptr)
+    void smooth_vertices(Vector3* result, const Vector3* previous_iteration, const Adjacency& adjacency, const float factor, const float* weights, const int begin, const int end)
     {
-        for (size_t i = 0; i < result->size(); i++)
+        const int* offsets = adjacency.offsets.data();
+        const int* indices = adjacency.indices.data();
+        for (int i = begin; i < end; i++)
         {
-            if (neighbourhoods[i].size() <= 1)
+            int neighbour_count = offsets[i + 1] - offsets[i];
+            if (neighbour_count <= 1)
             {
                 continue;
             }
             Vector3 barycenter{ 0,0,0 };
-            for (auto neighbour : neighbourhoods[i])
+            for (int j = offsets[i]; j < offsets[i + 1]; j++)
             {
-                barycenter += previous_iteration->at(neighbour);
+                barycenter += previous_iteration[indices[j]];
             }
-            barycenter /= neighbourhoods[i].size();
+            barycenter /= neighbour_count;
             float true_factor = factor;
             if (weights != nullptr)
             {
-                true_factor *= (*weights)[i];
+                true_factor *= weights[i];
             }
-            result->at(i) = Geometry::lerp(previous_iteration->at(i), barycenter, true_factor);
+            result[i] = Geometry::lerp(previous_iteration[i], barycenter, true_factor);
+        }
+    }
+
+    void smooth_mesh_once(std::vector<Vector3>* result, const std::vector<Vector3>* previous_iteration, const Adjacency& adjacency, float factor, std::vector<float>* weights, ThreadPool* pool)
+    {
+        const float* weights_data = weights == nullptr ? nullptr : weights->data();
+        int vertex_count = (int)result->size();
+        if (pool == nullptr)
+        {
+            smooth_vertices(result->data(), previous_iteration->data(), adjacency, factor, weights_data, 0, vertex_count);
+            return;
         }
+        pool->parallel_for(0, vertex_count, [&](int begin, int end)
+            {
+                smooth_vertices(result->data(), previous_iteration->data(), adjacency, factor, weights_data, begin, end);
+            });
+    }
+
+    void smooth_mesh(Mesh& mesh, const int iterations, const float factor, std::vector<float>* weights, const int thread_count)
+    {
+        smooth_mesh(mesh, get_adjacency(mesh), iterations, factor, weights, thread_count);
     }
 
-    void smooth_mesh(Mesh& mesh, const int iterations, const float factor, std::vector<float>* weights)
+    void smooth_mesh(Mesh& mesh, const Adjacency& adjacency, const int iterations, const float factor, std::vector<float>* weights, const int thread_count, const Progress& progress)
     {
-        auto neighbourhoods = get_neighbourhoods(mesh);
+        std::unique_ptr<ThreadPool> pool = thread_count == 1 ? nullptr : std::make_unique<ThreadPool>(thread_count);
         std::vector<Vector3>* previous_iteration = &mesh.vertices;
         std::vector<Vector3> buffer = mesh.vertices;
         std::vector<Vector3>* result = &buffer;
 
         for (size_t i = 0; i < iterations; i++)
         {
-            smooth_mesh_once(result, previous_iteration, neighbourhoods, factor, weights);
+            smooth_mesh_once(result, previous_iteration, adjacency, factor, weights, pool.get());
             auto tmp = result;
             result = previous_iteration;
             previous_iteration = tmp;
+            progress.update((float)(i + 1) / iterations);
         }
         if (result != &mesh.vertices)
         {
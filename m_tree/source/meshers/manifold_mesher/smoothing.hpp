@@ -1,7 +1,20 @@
 #pragma once
 #include "source/mesh/Mesh.hpp"
+#include "source/utilities/Progress.hpp"
 
 namespace Mtree::MeshProcessing::Smoothing
 {
-    void smooth_mesh(Mesh& mesh, const int iterations, const float factor, std::vector<float>* weights = nullptr);
+    // vertex neighbourhoods in compressed sparse row layout: the neighbours of vertex i are indices[offsets[i]] to indices[offsets[i+1]]
+    struct Adjacency
+    {
+        std::vector<int> offsets;
+        std::vector<int> indices;
+        std::size_t topology_hash = 0; // hash of the mesh the adjacency was built from
+    };
+
+    Adjacency get_adjacency(const Mesh& mesh);
+
+    void smooth_mesh(Mesh& mesh, const int iterations, const float factor, std::vector<float>* weights = nullptr, const int thread_count = 1);
+    
+    void smooth_mesh(Mesh& mesh, const Adjacency& adjacency, const int iterations, const float factor, std::vector<float>* weights = nullptr, const int thread_count = 1, const Progress& progress = Progress{}); // progress is updated after each iteration
 }
\ No newline at end of file
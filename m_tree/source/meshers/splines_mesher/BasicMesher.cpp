@@ -59,17 +59,21 @@ namespace Mtree
 		}	
 	}
 
-	Mesh BasicMesher::mesh_tree(Tree& tree)
+	Mesh BasicMesher::mesh_tree(Tree& tree, const Progress& progress)
 	{
+		Progress meshing_progress = progress.get_step("meshing", 0, 1);
 		std::vector<Stem>& tree_stems = tree.get_stems();
 
 		std::vector<std::vector<SplinePoint>> splines = get_splines(tree_stems);
 
 		Mesh mesh;
-		for (std::vector<SplinePoint>& spline : splines)
+		for (size_t i = 0; i < splines.size(); i++)
 		{
-			mesh_spline(mesh, spline);
+			if (i % 64 == 0)
+				meshing_progress.update((float)i / splines.size());
+			mesh_spline(mesh, splines[i]);
 		}
+		meshing_progress.update(1);
 
 		return mesh;
 	}
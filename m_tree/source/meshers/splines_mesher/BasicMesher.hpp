@@ -20,7 +20,7 @@ namespace Mtree
 
 	public:
 		int radial_resolution = 8;
-		Mesh mesh_tree(Tree& tree) override;
+		Mesh mesh_tree(Tree& tree, const Progress& progress = Progress{}) override;
 	};
 
 
@@ -0,0 +1,158 @@
+#include "BranchIndex.hpp"
+
+namespace Mtree
+{
+	namespace
+	{
+		Vector3 get_child_position(const Vector3& node_position, const NodeChild& child) // same positions as select_from_tree
+		{
+			return node_position + child.node.direction * child.position_in_parent * child.node.length;
+		}
+
+		void map_origins_rec(const Node& node, Node& copied_node, std::unordered_map<const Node*, Node*>& copies)
+		{
+			auto copy = copies.find(&node);
+			if (copy != copies.end())
+			{
+				copy->second = &copied_node;
+			}
+			for (size_t i = 0; i < node.children.size(); i++)
+			{
+				map_origins_rec(node.children[i]->node, copied_node.children[i]->node, copies);
+			}
+		}
+	}
+
+	void BranchIndex::add_branches_rec(NodeUtilities::BranchSelection& selection, Node& node, const Vector3& node_position)
+	{
+		NodeUtilities::add_to_branch(selection.back(), node, node_position);
+		bool first_child = true;
+		for (auto& child : node.children)
+		{
+			bool starts_branch = !first_child;
+			first_child = false;
+			if (child->node.creator_id != node.creator_id) // descendants of a later function can't be followed by nodes of this creator
+				continue;
+			if (starts_branch)
+			{
+				selection.emplace_back();
+			}
+			add_branches_rec(selection, child->node, get_child_position(node_position, *child));
+		}
+	}
+
+	void BranchIndex::rebuild_rec(Node& node, const Vector3& node_position)
+	{
+		for (auto& child : node.children)
+		{
+			Vector3 child_position = get_child_position(node_position, *child);
+			if (child->node.creator_id != node.creator_id)
+			{
+				add_branches(child->node, child_position);
+			}
+			rebuild_rec(child->node, child_position);
+		}
+	}
+
+	const NodeUtilities::BranchSelection& BranchIndex::get_branches(int creator_id)
+	{
+		static const NodeUtilities::BranchSelection empty_selection;
+		auto creator = creators.find(creator_id);
+		if (creator == creators.end())
+			return empty_selection;
+
+		CreatorBranches& branches = creator->second;
+		if (!branches.is_selection_built)
+		{
+			branches.selection.clear();
+			for (auto& [origin, origin_position] : branches.origins)
+			{
+				branches.selection.emplace_back();
+				add_branches_rec(branches.selection, *origin, origin_position);
+			}
+			branches.is_selection_built = true;
+		}
+		return branches.selection;
+	}
+
+	void BranchIndex::add_branches(Node& origin, const Vector3& origin_position)
+	{
+		CreatorBranches& branches = creators[origin.creator_id];
+		branches.origins.emplace_back(&origin, origin_position);
+		branches.is_selection_built = false;
+	}
+
+	void BranchIndex::add_branches(NodeChild& origin, const Vector3& parent_position)
+	{
+		add_branches(origin.node, get_child_position(parent_position, origin));
+	}
+
+	void BranchIndex::rebuild(std::vector<Stem>& stems)
+	{
+		creators.clear();
+		for (Stem& stem : stems)
+		{
+			add_branches(stem.node, stem.position);
+			rebuild_rec(stem.node, stem.position);
+		}
+	}
+
+	void BranchIndex::clear()
+	{
+		creators.clear();
+		prototypes.clear();
+	}
+
+	void BranchIndex::set_prototypes(int creator_id, Prototypes creator_prototypes)
+	{
+		prototypes[creator_id] = std::move(creator_prototypes);
+	}
+
+	const std::map<int, Prototypes>& BranchIndex::get_prototypes() const
+	{
+		return prototypes;
+	}
+
+	BranchIndex BranchIndex::copy_to(const std::vector<Stem>& stems, std::vector<Stem>& copied_stems) const
+	{
+		std::unordered_map<const Node*, Node*> copies;
+		for (auto& [creator_id, branches] : creators)
+		{
+			for (auto& origin : branches.origins)
+			{
+				copies[origin.first] = nullptr;
+			}
+		}
+		for (size_t i = 0; i < stems.size(); i++)
+		{
+			map_origins_rec(stems[i].node, copied_stems[i].node, copies);
+		}
+		// the selections are built again from the origins when needed
+		BranchIndex copy;
+		for (auto& [creator_id, branches] : creators)
+		{
+			CreatorBranches& copied_branches = copy.creators[creator_id];
+			for (auto& [origin, origin_position] : branches.origins)
+			{
+				copied_branches.origins.emplace_back(copies.at(origin), origin_position);
+			}
+		}
+		copy.prototypes = prototypes; // immutable, only the pointers are copied
+		return copy;
+	}
+
+	std::size_t BranchIndex::get_memory_usage() const
+	{
+		std::size_t size = 0;
+		for (auto& [creator_id, branches] : creators)
+		{
+			size += branches.origins.capacity() * sizeof(std::pair<Node*, Vector3>);
+			size += branches.selection.capacity() * sizeof(NodeUtilities::NodeSelection);
+			for (auto& branch : branches.selection)
+			{
+				size += branch.capacity() * sizeof(NodeUtilities::NodeSelectionElement);
+			}
+		}
+		return size;
+	}
+}
\ No newline at end of file
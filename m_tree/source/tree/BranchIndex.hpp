@@ -0,0 +1,43 @@
+#pragma once
+#include <vector>
+#include <map>
+#include <unordered_map>
+#include "Node.hpp"
+#include "Instancing.hpp"
+#include "source/utilities/NodeUtilities.hpp"
+
+namespace Mtree
+{
+	// nodes of the tree organised by creator function and by branch, as given by NodeUtilities::select_from_tree.
+	// Functions add the origins of the nodes they create, the branches of a creator are only built from its origins
+	// when they are first requested, so getting them costs as much as the nodes of the creator instead of the whole tree.
+	// Functions that move or extend nodes created by other functions rebuild the index.
+	// The index also keeps the prototypes of the functions instancing their branches, which are not part of the stems.
+	class BranchIndex
+	{
+	private:
+		struct CreatorBranches
+		{
+			std::vector<std::pair<Node*, Vector3>> origins; // with their positions, the descendants of the same creator belong to the origin
+			NodeUtilities::BranchSelection selection;
+			bool is_selection_built = false;
+		};
+
+		std::unordered_map<int, CreatorBranches> creators; // by creator id
+		std::map<int, Prototypes> prototypes; // by creator id, shared with the copies of the index
+
+		void add_branches_rec(NodeUtilities::BranchSelection& selection, Node& node, const Vector3& node_position);
+		void rebuild_rec(Node& node, const Vector3& node_position);
+
+	public:
+		const NodeUtilities::BranchSelection& get_branches(int creator_id); // empty when the creator has no nodes
+		void add_branches(Node& origin, const Vector3& origin_position); // origin and its descendants of the same creator
+		void add_branches(NodeChild& origin, const Vector3& parent_position);
+		void rebuild(std::vector<Stem>& stems); // the prototypes are kept
+		void clear();
+		void set_prototypes(int creator_id, Prototypes creator_prototypes);
+		const std::map<int, Prototypes>& get_prototypes() const;
+		BranchIndex copy_to(const std::vector<Stem>& stems, std::vector<Stem>& copied_stems) const; // same index, on a copy of the indexed stems
+		std::size_t get_memory_usage() const;
+	};
+}
\ No newline at end of file
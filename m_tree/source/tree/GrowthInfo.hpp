@@ -1,4 +1,5 @@
 #pragma once
+#include <memory>
 
 namespace Mtree
 {
@@ -6,5 +7,6 @@ namespace Mtree
 	{
 	public:
 		virtual ~GrowthInfo() {}
+		virtual std::unique_ptr<GrowthInfo> clone() const = 0;
 	};
 }
\ No newline at end of file
@@ -0,0 +1,65 @@
+#include <algorithm>
+#include "Instancing.hpp"
+#include "source/utilities/GeometryUtilities.hpp"
+
+namespace Mtree
+{
+	namespace
+	{
+		void add_instances_rec(const Node& node, const Vector3& node_position, const Prototypes& prototypes, const std::map<int, int>& prototype_offsets, std::vector<BranchInstance>& instances)
+		{
+			for (auto& child : node.children)
+			{
+				Vector3 child_position = node_position + node.direction * node.length * child->position_in_parent;
+				if (!child->node.is_instance())
+				{
+					add_instances_rec(child->node, child_position, prototypes, prototype_offsets, instances);
+					continue;
+				}
+				int prototype_index = prototype_offsets.at(child->node.creator_id) + child->node.prototype_id;
+				float scale = child->node.length / std::max(1e-6f, prototypes[prototype_index]->length);
+				instances.push_back(BranchInstance{ prototype_index, child_position, get_branch_frame(child->node), scale });
+			}
+		}
+	}
+
+	Eigen::Matrix4f BranchInstance::get_transform() const
+	{
+		Eigen::Matrix4f transform = Eigen::Matrix4f::Identity();
+		transform.block<3, 3>(0, 0) = rotation * scale;
+		transform.block<3, 1>(0, 3) = position;
+		return transform;
+	}
+
+	Eigen::Matrix3f get_branch_frame(const Node& origin)
+	{
+		// the tangent of a node isn't kept orthogonal when its direction is bent
+		Vector3 tangent = Geometry::projected_on_plane(origin.tangent, origin.direction);
+		tangent = tangent.norm() > 1e-6f ? tangent.normalized() : Geometry::get_orthogonal_vector(origin.direction).normalized();
+		Eigen::Matrix3f frame;
+		frame.col(0) = tangent;
+		frame.col(1) = origin.direction.cross(tangent);
+		frame.col(2) = origin.direction;
+		return frame;
+	}
+
+	void rotate_branch(Node& origin, const Eigen::Matrix3f& rotation)
+	{
+		origin.direction = rotation * origin.direction;
+		origin.tangent = rotation * origin.tangent;
+		for (auto& child : origin.children)
+		{
+			rotate_branch(child->node, rotation);
+		}
+	}
+
+	std::vector<BranchInstance> get_branch_instances(const std::vector<Stem>& stems, const Prototypes& prototypes, const std::map<int, int>& prototype_offsets)
+	{
+		std::vector<BranchInstance> instances;
+		for (auto& stem : stems)
+		{
+			add_instances_rec(stem.node, stem.position, prototypes, prototype_offsets, instances);
+		}
+		return instances;
+	}
+}
\ No newline at end of file
@@ -0,0 +1,33 @@
+#pragma once
+#include <vector>
+#include <map>
+#include <memory>
+#include <Eigen/Geometry>
+#include "Node.hpp"
+
+namespace Mtree
+{
+	// branch grown once and instanced on the origins of its creator
+	struct BranchPrototype
+	{
+		Stem stem; // in the frame of the prototype: starts at the origin, grows along z and has x as tangent
+		float length; // length of the branch the prototype was grown as
+	};
+
+	struct BranchInstance
+	{
+		int prototype_index; // in the prototypes given to get_branch_instances
+		Vector3 position;
+		Eigen::Matrix3f rotation; // from the frame of the prototype
+		float scale; // length of the instanced branch relative to the prototype
+
+		Eigen::Matrix4f get_transform() const;
+	};
+
+	using Prototypes = std::vector<std::shared_ptr<const BranchPrototype>>;
+
+	Eigen::Matrix3f get_branch_frame(const Node& origin); // rotation from the frame of the prototypes to the frame of a branch origin
+	void rotate_branch(Node& origin, const Eigen::Matrix3f& rotation); // rotates the directions and tangents of the node and its descendants
+	// instance nodes of the stems, in depth first order. prototype_offsets gives the index of the first prototype of each creator id
+	std::vector<BranchInstance> get_branch_instances(const std::vector<Stem>& stems, const Prototypes& prototypes, const std::map<int, int>& prototype_offsets);
+}
\ No newline at end of file
@@ -7,6 +7,26 @@ bool Mtree::Node::is_leaf() const
 	return children.size() == 0;
 }
 
+bool Mtree::Node::is_instance() const
+{
+	return prototype_id >= 0;
+}
+
+Mtree::Node Mtree::Node::clone() const
+{
+	Node copy{ direction, tangent, length, radius, creator_id };
+	copy.tangent = tangent;
+	copy.prototype_id = prototype_id;
+	if (growthInfo)
+		copy.growthInfo = growthInfo->clone();
+	copy.children.reserve(children.size());
+	for (auto& child : children)
+	{
+		copy.children.push_back(std::make_unique<NodeChild>(NodeChild{ child->node.clone(), child->position_in_parent }));
+	}
+	return copy;
+}
+
 Mtree::Node::Node(Vector3 direction, Vector3 parent_tangent, float length, float radius, int creator_id)
 {
 	this->direction = direction;
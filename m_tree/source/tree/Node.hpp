@@ -13,15 +13,18 @@ namespace Mtree
 	class Node
 	{
 	public:
-		std::vector<std::shared_ptr<NodeChild>> children;
+		std::vector<std::unique_ptr<NodeChild>> children;
 		Vector3 direction;
 		Vector3 tangent;
 		float length;
 		float radius;
 		int creator_id = 0;
+		int prototype_id = -1; // when not negative, the node stands for a whole branch instanced from this prototype of its creator, its length is the one of the branch
 		std::unique_ptr<GrowthInfo> growthInfo = nullptr;
 
 		bool is_leaf() const;
+		bool is_instance() const;
+		Node clone() const; // deep copy of the node and its descendants
 
 		Node(Vector3 direction, Vector3 parent_tangent, float length, float radius, int creator_id);
 	};
@@ -36,5 +39,7 @@ namespace Mtree
 	{
 		Node node;
 		Vector3 position;
+
+		Stem clone() const { return Stem{ node.clone(), position }; };
 	};
 }
\ No newline at end of file
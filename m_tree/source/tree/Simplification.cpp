@@ -0,0 +1,61 @@
+#include <cmath>
+#include "Simplification.hpp"
+
+namespace Mtree
+{
+	namespace
+	{
+		bool has_kept_side_children(const Node& node, const float min_radius)
+		{
+			for (size_t i = 1; i < node.children.size(); i++)
+			{
+				if (node.children[i]->node.radius >= min_radius)
+					return true;
+			}
+			return false;
+		}
+
+		Node simplify_node(const Node& node, const float min_radius, const float max_angle)
+		{
+			// leaves are not merged so that branch tips keep their radius
+			float min_cos_angle = std::cos(max_angle * (float)M_PI / 180);
+			Vector3 run_vector = node.direction * node.length;
+			const Node* last = &node; // last node of the run, its children become the children of the merged node
+			while (max_angle > 0 && !last->is_leaf() && !has_kept_side_children(*last, min_radius))
+			{
+				const Node& next = last->children[0]->node;
+				if (next.is_leaf() || has_kept_side_children(next, min_radius) || next.direction.dot(node.direction) < min_cos_angle)
+					break;
+				run_vector += next.direction * next.length;
+				last = &next;
+			}
+
+			float length = run_vector.norm();
+			Vector3 direction = last == &node ? node.direction : Vector3{ run_vector / length };
+			Node copy{ direction, node.tangent, last == &node ? node.length : length, node.radius, node.creator_id };
+			if (last == &node)
+				copy.tangent = node.tangent; // already orthogonal to the direction, projecting it again would round it differently
+			copy.prototype_id = node.prototype_id;
+			copy.children.reserve(last->children.size());
+			for (size_t i = 0; i < last->children.size(); i++)
+			{
+				auto& child = last->children[i];
+				if (i > 0 && child->node.radius < min_radius)
+					continue;
+				copy.children.push_back(std::make_unique<NodeChild>(NodeChild{ simplify_node(child->node, min_radius, max_angle), child->position_in_parent }));
+			}
+			return copy;
+		}
+	}
+
+	std::vector<Stem> simplify_stems(const std::vector<Stem>& stems, const float min_radius, const float max_angle)
+	{
+		std::vector<Stem> simplified_stems;
+		simplified_stems.reserve(stems.size());
+		for (auto& stem : stems)
+		{
+			simplified_stems.push_back(Stem{ simplify_node(stem.node, min_radius, max_angle), stem.position });
+		}
+		return simplified_stems;
+	}
+}
@@ -0,0 +1,12 @@
+#pragma once
+#include <vector>
+#include "Node.hpp"
+
+namespace Mtree
+{
+	// copy of the stems for coarser meshes, growth infos are not copied.
+	// Side branches thinner than min_radius at their base are removed with their descendants, and the nodes continuing a branch
+	// in a direction deviating by less than max_angle degrees from the start of the run are merged into a single node,
+	// as long as they carry no side branch. A max_angle of 0 keeps all nodes
+	std::vector<Stem> simplify_stems(const std::vector<Stem>& stems, const float min_radius, const float max_angle);
+}
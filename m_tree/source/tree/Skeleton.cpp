@@ -0,0 +1,94 @@
+#include "Skeleton.hpp"
+
+namespace Mtree
+{
+	namespace
+	{
+		// calls f(node, index, parent_index, position_in_parent) on the node and its descendants, parents are visited before their children.
+		// The indices follow the layout of the skeleton
+		template<typename F>
+		void visit_nodes_rec(const Node& node, int index, int parent, float position_in_parent, int& next_index, F& f)
+		{
+			f(node, index, parent, position_in_parent);
+			int first_child = next_index;
+			next_index += (int)node.children.size();
+			for (int i = 0; i < (int)node.children.size(); i++)
+			{
+				visit_nodes_rec(node.children[i]->node, first_child + i, index, node.children[i]->position_in_parent, next_index, f);
+			}
+		}
+
+		template<typename F>
+		void visit_nodes(const std::vector<Stem>& stems, F&& f)
+		{
+			int next_index = (int)stems.size();
+			for (int i = 0; i < (int)stems.size(); i++)
+			{
+				visit_nodes_rec(stems[i].node, i, -1, 0.f, next_index, f);
+			}
+		}
+
+		int get_node_count_rec(const Node& node)
+		{
+			int count = 1;
+			for (auto& child : node.children)
+			{
+				count += get_node_count_rec(child->node);
+			}
+			return count;
+		}
+	}
+
+	Skeleton::Skeleton(const std::vector<Stem>& stems)
+	{
+		int node_count = 0;
+		for (auto& stem : stems)
+		{
+			node_count += get_node_count_rec(stem.node);
+		}
+		stem_count = (int)stems.size();
+		directions.resize(node_count);
+		tangents.resize(node_count);
+		positions.resize(node_count);
+		lengths.resize(node_count);
+		radii.resize(node_count);
+		positions_in_parent.resize(node_count);
+		creator_ids.resize(node_count);
+		prototype_ids.resize(node_count);
+		parents.resize(node_count);
+		children_start.resize(node_count);
+		children_count.resize(node_count);
+
+		int next_child = stem_count;
+		visit_nodes(stems, [&](const Node& node, int index, int parent, float position_in_parent)
+			{
+				directions[index] = node.direction;
+				tangents[index] = node.tangent;
+				lengths[index] = node.length;
+				radii[index] = node.radius;
+				creator_ids[index] = node.creator_id;
+				prototype_ids[index] = node.prototype_id;
+				parents[index] = parent;
+				positions_in_parent[index] = position_in_parent;
+				positions[index] = parent == -1 ? stems[index].position : positions[parent] + directions[parent] * lengths[parent] * position_in_parent;
+				children_start[index] = next_child;
+				children_count[index] = (int)node.children.size();
+				next_child += children_count[index];
+			});
+	}
+
+	int Skeleton::get_node_count() const
+	{
+		return (int)directions.size();
+	}
+
+	bool Skeleton::is_leaf(int node) const
+	{
+		return children_count[node] == 0;
+	}
+
+	std::size_t Skeleton::get_memory_usage() const
+	{
+		return get_node_count() * (3 * sizeof(Vector3) + 3 * sizeof(float) + 5 * sizeof(int));
+	}
+}
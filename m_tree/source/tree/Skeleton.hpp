@@ -0,0 +1,32 @@
+#pragma once
+#include <vector>
+#include "Node.hpp"
+
+namespace Mtree
+{
+	// flat copy of the nodes of a tree, each attribute is stored in its own contiguous array.
+	// A node is always stored after its parent, and the children of a node are stored next to each other.
+	// The stem nodes are the first nodes of the skeleton. A skeleton is built by the code reading it and isn't kept by the tree.
+	class Skeleton
+	{
+	public:
+		std::vector<Vector3> directions;
+		std::vector<Vector3> tangents;
+		std::vector<Vector3> positions; // position of the start of the node in tree space
+		std::vector<float> lengths;
+		std::vector<float> radii;
+		std::vector<float> positions_in_parent;
+		std::vector<int> creator_ids;
+		std::vector<int> prototype_ids; // not negative for the nodes standing for an instanced branch
+		std::vector<int> parents; // -1 for stem nodes
+		std::vector<int> children_start;
+		std::vector<int> children_count;
+		int stem_count = 0;
+
+		Skeleton() {};
+		Skeleton(const std::vector<Stem>& stems);
+		int get_node_count() const;
+		bool is_leaf(int node) const;
+		std::size_t get_memory_usage() const;
+	};
+}
@@ -1,5 +1,9 @@
 #include <vector>
 #include <iostream>
+#include <algorithm>
+#include <atomic>
+#include <cstdint>
+#include <chrono>
 #include "Tree.hpp"
 #include "Node.hpp"
 
@@ -13,9 +17,104 @@ namespace Mtree
 	{
 		firstFunction = function;
 	}
-	void Tree::execute_functions()
+	namespace
 	{
-		firstFunction->execute(stems);
+		struct FunctionCall
+		{
+			TreeFunction* function;
+			int id;
+			int parent_id;
+		};
+
+		void flatten_functions_rec(TreeFunction& function, int parent_id, std::vector<FunctionCall>& calls)
+		{
+			// ids are given in execution order so that they are unique in the whole graph
+			int id = (int)calls.size();
+			calls.push_back(FunctionCall{ &function, id, parent_id });
+			for (auto& child : function.get_children())
+			{
+				flatten_functions_rec(*child, id, calls);
+			}
+		}
+
+		std::vector<Stem> copy_stems(const std::vector<Stem>& stems)
+		{
+			std::vector<Stem> copy;
+			copy.reserve(stems.size());
+			for (auto& stem : stems)
+			{
+				copy.push_back(stem.clone());
+			}
+			return copy;
+		}
+	}
+
+	void Tree::execute_functions(const Progress& progress)
+	{
+		std::vector<FunctionCall> calls;
+		flatten_functions_rec(*firstFunction, 0, calls);
+
+		// functions can modify their parameters when executed, so all hashes are computed beforehand
+		std::vector<std::size_t> hashes;
+		HashBuilder hash;
+		for (auto& call : calls)
+		{
+			hash.add((std::uint64_t)call.function->get_hash()).add(call.parent_id);
+			hashes.push_back(hash.get());
+		}
+
+		auto previous_snapshots = std::atomic_load(&snapshots);
+		auto new_snapshots = std::make_shared<std::vector<FunctionSnapshot>>();
+		stems.clear();
+		branches.clear();
+		function_profiles.clear();
+		size_t first_call = 0;
+		if (previous_snapshots)
+		{
+			for (size_t i = std::min(previous_snapshots->size(), calls.size()); i > 0; i--)
+			{
+				const FunctionSnapshot& snapshot = (*previous_snapshots)[i - 1];
+				if (snapshot.hash == hashes[i - 1])
+				{
+					stems = copy_stems(*snapshot.stems);
+					branches = snapshot.branches->copy_to(*snapshot.stems, stems);
+					first_call = i;
+					new_snapshots->assign(previous_snapshots->begin(), previous_snapshots->begin() + i);
+					break;
+				}
+			}
+		}
+
+		for (size_t i = 0; i < first_call; i++)
+		{
+			function_profiles.push_back(FunctionProfile{ calls[i].id, calls[i].parent_id, calls[i].function->get_name(), 0, true });
+		}
+
+		// when cancelled, the tree is left partially grown and keeps its previous snapshots
+		Progress growth_progress = progress.get_step("growth", 0, 1);
+		float call_count = (float)(calls.size() - first_call);
+		for (size_t i = first_call; i < calls.size(); i++)
+		{
+			Progress call_progress = growth_progress.get_step("", (i - first_call) / call_count, (i - first_call + 1) / call_count);
+			call_progress.update(0);
+			auto start = std::chrono::steady_clock::now();
+			calls[i].function->execute(stems, branches, calls[i].id, calls[i].parent_id, call_progress);
+			float time = std::chrono::duration<float>(std::chrono::steady_clock::now() - start).count();
+			function_profiles.push_back(FunctionProfile{ calls[i].id, calls[i].parent_id, calls[i].function->get_name(), time, false });
+			if (store_snapshots)
+			{
+				auto snapshot_stems = std::make_shared<std::vector<Stem>>(copy_stems(stems));
+				auto snapshot_branches = std::make_shared<const BranchIndex>(branches.copy_to(stems, *snapshot_stems));
+				new_snapshots->push_back(FunctionSnapshot{ hashes[i], snapshot_stems, snapshot_branches });
+			}
+		}
+		growth_progress.update(1);
+		std::atomic_store(&snapshots, store_snapshots ? std::shared_ptr<const std::vector<FunctionSnapshot>>{ new_snapshots } : nullptr);
+	}
+
+	void Tree::inherit_snapshots(const Tree& other)
+	{
+		std::atomic_store(&snapshots, std::atomic_load(&other.snapshots));
 	}
 
 	void Tree::print_tree()
@@ -40,4 +139,100 @@ namespace Mtree
 	{
 		return stems;
 	}
+
+	int get_node_count_rec(const Node& node)
+	{
+		int count = 1;
+		for (auto& child : node.children)
+		{
+			count += get_node_count_rec(child->node);
+		}
+		return count;
+	}
+
+	int Tree::get_node_count()
+	{
+		int count = 0;
+		for (auto& stem : stems)
+		{
+			count += get_node_count_rec(stem.node);
+		}
+		return count;
+	}
+
+	const std::vector<FunctionProfile>& Tree::get_function_profiles() const
+	{
+		return function_profiles;
+	}
+
+	namespace
+	{
+		void count_nodes_by_creator_rec(const Node& node, std::map<int, int>& counts)
+		{
+			counts[node.creator_id]++;
+			for (auto& child : node.children)
+			{
+				count_nodes_by_creator_rec(child->node, counts);
+			}
+		}
+	}
+
+	std::map<int, int> Tree::get_node_counts_by_creator() const
+	{
+		std::map<int, int> counts;
+		for (auto& stem : stems)
+		{
+			count_nodes_by_creator_rec(stem.node, counts);
+		}
+		return counts;
+	}
+
+	Prototypes Tree::get_prototypes() const
+	{
+		Prototypes prototypes;
+		for (auto& [creator_id, creator_prototypes] : branches.get_prototypes())
+		{
+			prototypes.insert(prototypes.end(), creator_prototypes.begin(), creator_prototypes.end());
+		}
+		return prototypes;
+	}
+
+	std::vector<BranchInstance> Tree::get_branch_instances() const
+	{
+		std::map<int, int> prototype_offsets;
+		int prototype_count = 0;
+		for (auto& [creator_id, creator_prototypes] : branches.get_prototypes())
+		{
+			prototype_offsets[creator_id] = prototype_count;
+			prototype_count += (int)creator_prototypes.size();
+		}
+		return Mtree::get_branch_instances(stems, get_prototypes(), prototype_offsets);
+	}
+
+	std::size_t Tree::get_memory_usage()
+	{
+		// a node is allocated by its parent, and owns a growth info
+		std::size_t node_size = sizeof(NodeChild) + sizeof(std::unique_ptr<NodeChild>) + 64;
+		std::size_t node_count = get_node_count();
+		std::size_t stem_count = stems.size();
+		for (auto& prototype : get_prototypes()) // shared by the snapshots, counted once
+		{
+			node_count += get_node_count_rec(prototype->stem.node);
+		}
+		std::size_t index_size = branches.get_memory_usage();
+		auto current_snapshots = std::atomic_load(&snapshots);
+		if (current_snapshots)
+		{
+			for (auto& snapshot : *current_snapshots)
+			{
+				for (auto& stem : *snapshot.stems)
+				{
+					node_count += get_node_count_rec(stem.node);
+				}
+				stem_count += snapshot.stems->size();
+				index_size += snapshot.branches->get_memory_usage();
+			}
+		}
+		return node_count * node_size + stem_count * sizeof(Stem) + index_size;
+	}
 }
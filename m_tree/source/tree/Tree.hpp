@@ -1,22 +1,54 @@
 #pragma once
 #include<vector>
+#include <map>
+#include <string>
 #include "Node.hpp"
+#include "BranchIndex.hpp"
+#include "Instancing.hpp"
 #include "source/tree_functions/base_types/TreeFunction.hpp"
 
 namespace Mtree
 {
+	struct FunctionSnapshot
+	{
+		std::size_t hash; // identifies the functions executed up to the snapshot, and how they are connected
+		std::shared_ptr<const std::vector<Stem>> stems; // state of the tree after the function was executed
+		std::shared_ptr<const BranchIndex> branches; // indexes the nodes of stems
+	};
+
+	struct FunctionProfile
+	{
+		int id;
+		int parent_id;
+		std::string name; // type of the function
+		float time = 0; // seconds spent executing the function
+		bool from_snapshot = false; // the function wasn't executed, its result was restored from a snapshot
+	};
+
 	class Tree
 	{
 	private:
 		std::vector<Stem> stems;
+		BranchIndex branches; // nodes of stems organised by creator function
 		std::shared_ptr<TreeFunction> firstFunction;
+		std::shared_ptr<const std::vector<FunctionSnapshot>> snapshots; // one per executed function, in execution order
+		std::vector<FunctionProfile> function_profiles; // of the last execution, in execution order
 	public:
+		bool store_snapshots = false; // keep a copy of the tree after each function so that a later execution can resume from it
+
 		Tree(std::shared_ptr<TreeFunction> trunkFunction);
 		Tree() { firstFunction = nullptr; };
 		void set_first_function(std::shared_ptr<TreeFunction> function);
-		void execute_functions();
+		void execute_functions(const Progress& progress = Progress{}); // resumes from the last snapshot matching the function graph when possible, throws OperationCancelled when the progress is cancelled
+		void inherit_snapshots(const Tree& other); // reuse the snapshots of a tree grown with a previous version of the function graph
 		void print_tree();
 		TreeFunction& get_first_function();
 		std::vector<Stem>& get_stems();
+		int get_node_count();
+		const std::vector<FunctionProfile>& get_function_profiles() const;
+		std::map<int, int> get_node_counts_by_creator() const; // number of nodes created by each function id
+		Prototypes get_prototypes() const; // branches grown once by the functions instancing their branches, by function id then in growth order
+		std::vector<BranchInstance> get_branch_instances() const; // placements of the prototypes, in the order of get_prototypes
+		std::size_t get_memory_usage(); // approximate number of bytes used by the nodes of the tree, its prototypes, its branch index and its snapshots
 	};
 }
\ No newline at end of file
@@ -1,5 +1,6 @@
 #include <iostream>
 #include <queue>
+#include <algorithm>
 
 #include "BranchFunction.hpp"
 #include "source/utilities/NodeUtilities.hpp"
@@ -10,18 +11,6 @@ using namespace Mtree;
 
 namespace
 {
-	void update_positions_rec(Node& node, const Vector3& position)
-	{
-		auto& info = static_cast<BranchFunction::BranchGrowthInfo&>(*node.growthInfo);
-		info.position = position;
-
-		for (auto& child : node.children)
-		{
-			Vector3 child_position = position + node.direction * node.length * child->position_in_parent;
-			update_positions_rec(child->node, child_position);
-		}
-	}
-
 	bool avoid_floor(const Vector3& node_position, Vector3& node_direction, float parent_length) // return true if branch should be terminated
 	{
 		if (node_direction.z() < 0)
@@ -31,18 +20,18 @@ namespace
 		return (node_position + node_direction).z() * parent_length * 4 < 0; // is node heading to floor too fast
 	}
 
-	Vector3 get_main_child_direction(Node& parent, const Vector3& parent_position, const float up_attraction, const float flatness, const float randomness, const float resolution, bool& should_terminate)
+	Vector3 get_main_child_direction(Node& parent, const Vector3& parent_position, const float up_attraction, const float flatness, const float randomness, const float resolution, RandomGenerator& rand_gen, bool& should_terminate)
 	{
-		Vector3 random_dir = Geometry::random_vec(flatness).normalized() + Vector3{ 0,0,1 } * up_attraction;
+		Vector3 random_dir = Geometry::random_vec(rand_gen, flatness).normalized() + Vector3{ 0,0,1 } * up_attraction;
 		Vector3 child_direction = parent.direction + random_dir * randomness / resolution;
 		should_terminate = avoid_floor(parent_position, child_direction, parent.length);
 		child_direction.normalize();
 		return child_direction;
 	}
 
-	Vector3 get_split_direction(const Node& parent, const Vector3& parent_position, const float up_attraction, const float flatness, const float resolution, const float angle)
+	Vector3 get_split_direction(const Node& parent, const Vector3& parent_position, const float up_attraction, const float flatness, const float resolution, const float angle, RandomGenerator& rand_gen)
 	{
-		Vector3 child_direction = Geometry::random_vec();
+		Vector3 child_direction = Geometry::random_vec(rand_gen);
 		child_direction = child_direction.cross(parent.direction) + Vector3{ 0,0,1 } *up_attraction * flatness;
 		Vector3 flat_normal = Vector3{ 0,0,1 }.cross(parent.direction).cross(parent.direction).normalized();
 		child_direction -= child_direction.dot(flat_normal) * flatness * flat_normal;
@@ -57,91 +46,76 @@ namespace
 		auto& info = static_cast<BranchFunction::BranchGrowthInfo&>(*node.growthInfo);
 		info.inactive = true;
 	}
-
-	bool propagate_inactive_rec(Node& node)
-	{
-		auto* info = dynamic_cast<BranchFunction::BranchGrowthInfo*>(node.growthInfo.get());
-
-		if (node.children.size() == 0 || info->inactive)
-			return info->inactive;
-
-		bool inactive = false;
-		for (size_t i = 0; i < node.children.size(); i++)
-		{
-			if (propagate_inactive_rec(node.children[i]->node))
-				inactive = true;
-		}
-		info->inactive = inactive;
-		return inactive;
-	}
 }
 
 namespace Mtree
 {
 	void BranchFunction::apply_gravity_to_branch(Node& branch_origin)
 	{
-		propagate_inactive_rec(branch_origin);
-		update_weight_rec(branch_origin);
-		apply_gravity_rec(branch_origin, Eigen::AngleAxisf::Identity());
+		// one pass from the extremities to compute weights, and one from the origin to bend the branch
+		update_weight_rec(branch_origin, true);
 		BranchGrowthInfo& info = static_cast<BranchGrowthInfo&>(*branch_origin.growthInfo);
-		update_positions_rec(branch_origin, info.position);
+		apply_gravity_rec(branch_origin, info.position, Eigen::Quaternionf::Identity());
 	}
 
-	void BranchFunction::apply_gravity_rec(Node& node, Eigen::AngleAxisf curent_rotation)
+	void BranchFunction::apply_gravity_rec(Node& node, const Vector3& position, Eigen::Quaternionf curent_rotation)
 	{
 		BranchGrowthInfo& info = static_cast<BranchGrowthInfo&>(*node.growthInfo);
-		if (!info.inactive || true)
-		{
-			float horizontality = 1 - abs(node.direction.z());
-			info.age += 1 / resolution;
-			float displacement = horizontality * std::pow(info.cumulated_weight, .5f) * gravity_strength / resolution / resolution / 1000 / (1 + info.age);
-			displacement *= std::exp(-std::abs(info.deviation_from_rest_pose / resolution * stiffness));
-			info.deviation_from_rest_pose += displacement;
+		float horizontality = 1 - abs(node.direction.z());
+		info.age += 1 / resolution;
+		float displacement = horizontality * std::pow(info.cumulated_weight, .5f) * gravity_strength / resolution / resolution / 1000 / (1 + info.age);
+		displacement *= std::exp(-std::abs(info.deviation_from_rest_pose / resolution * stiffness));
+		info.deviation_from_rest_pose += displacement;
 
-			Vector3 tangent = node.direction.cross(Vector3{ 0,0,-1 }).normalized();
-			Eigen::AngleAxisf rot{ displacement, tangent };
-			curent_rotation = rot * curent_rotation;
+		Vector3 tangent = node.direction.cross(Vector3{ 0,0,-1 }).normalized();
+		curent_rotation = Eigen::Quaternionf{ Eigen::AngleAxisf{ displacement, tangent } } * curent_rotation;
 
-			node.direction = curent_rotation * node.direction;
-		}
+		node.direction = curent_rotation * node.direction;
+		info.position = position;
 
 		for (auto& child : node.children)
 		{
-			apply_gravity_rec(child->node, curent_rotation);
+			Vector3 child_position = position + node.direction * node.length * child->position_in_parent;
+			apply_gravity_rec(child->node, child_position, curent_rotation);
 		}
 	}
 	
-	void BranchFunction::update_weight_rec(Node& node)
+	bool BranchFunction::update_weight_rec(Node& node, bool propagate_inactive)
 	{
+		BranchGrowthInfo& info = static_cast<BranchGrowthInfo&>(*node.growthInfo);
+		// a node becomes inactive when one of its children is, the children of an inactive node are left as they are
+		propagate_inactive = propagate_inactive && !info.inactive;
 		float node_weight = node.length;
+		bool inactive_child = false;
 		for (auto& child : node.children)
 		{
-			update_weight_rec(child->node);
-			BranchGrowthInfo& child_info = dynamic_cast<BranchGrowthInfo&>(*child->node.growthInfo);
-			node_weight += child_info.cumulated_weight;
+			inactive_child = update_weight_rec(child->node, propagate_inactive) || inactive_child;
+			node_weight += static_cast<BranchGrowthInfo&>(*child->node.growthInfo).cumulated_weight;
 		}
-
-		BranchGrowthInfo* info = dynamic_cast<BranchGrowthInfo*>(node.growthInfo.get());
-		info->cumulated_weight = node_weight;
+		info.cumulated_weight = node_weight;
+		if (propagate_inactive && node.children.size() > 0)
+			info.inactive = inactive_child;
+		return info.inactive;
 	}
 
 	// grow extremity by one level (add one or more children)
 	void BranchFunction::grow_node_once(Node& node, const int id, std::queue<std::reference_wrapper<Node>>& results) 
 	{
-		bool break_branch = rand_gen.get_0_1() * resolution < break_chance;
+		BranchGrowthInfo& info = static_cast<BranchGrowthInfo&>(*node.growthInfo);
+		RandomGenerator& node_rand_gen = info.rand_gen;
+		bool break_branch = node_rand_gen.get_0_1() * resolution < break_chance;
 		if (break_branch)
 		{
 			mark_inactive(node);
 			return;
 		}
 
-		BranchGrowthInfo& info = static_cast<BranchGrowthInfo&>(*node.growthInfo);
 		float factor_in_branch = info.current_length / info.desired_length;
 		
 		float child_radius = Geometry::lerp(info.origin_radius, info.origin_radius * end_radius, factor_in_branch);
 		float child_length = std::min(1/resolution, info.desired_length - info.current_length);
 		bool should_terminate;
-		Vector3 child_direction = get_main_child_direction(node, info.position, up_attraction, flatness, randomness.execute(factor_in_branch), resolution, should_terminate);
+		Vector3 child_direction = get_main_child_direction(node, info.position, up_attraction, flatness, randomness.execute(factor_in_branch), resolution, node_rand_gen, should_terminate);
 
 		if (should_terminate)
 		{
@@ -150,30 +124,32 @@ namespace Mtree
 		}
 
 		NodeChild child{ Node{child_direction, node.tangent, child_length, child_radius, id}, 1 };
-		node.children.push_back(std::make_shared<NodeChild>(std::move(child)));
+		node.children.push_back(std::make_unique<NodeChild>(std::move(child)));
 		auto& child_node = node.children.back()->node;
 
 		float current_length = info.current_length + child_length;
 		Vector3 child_position = info.position + child_direction * child_length;
 		BranchGrowthInfo child_info{info.desired_length, info.origin_radius, child_position, current_length};
+		child_info.rand_gen = node_rand_gen.split(0);
 		child_node.growthInfo = std::make_unique<BranchGrowthInfo>(child_info);
 		if (current_length < info.desired_length)
 		{
 			results.push(std::ref<Node>(child_node));
 		}
 
-		bool split = rand_gen.get_0_1() * resolution < split_proba; // should the node split into two children
+		bool split = node_rand_gen.get_0_1() * resolution < split_proba; // should the node split into two children
 		if (split)
 		{
-			Vector3 split_child_direction = get_split_direction(node, info.position, up_attraction, flatness, resolution, split_angle);
+			Vector3 split_child_direction = get_split_direction(node, info.position, up_attraction, flatness, resolution, split_angle, node_rand_gen);
 			float split_child_radius = node.radius * split_radius;
 			
-			NodeChild child{ Node{split_child_direction, node.tangent, child_length, split_child_radius, id}, rand_gen.get_0_1() };
-			node.children.push_back(std::make_shared<NodeChild>(std::move(child)));
+			NodeChild child{ Node{split_child_direction, node.tangent, child_length, split_child_radius, id}, node_rand_gen.get_0_1() };
+			node.children.push_back(std::make_unique<NodeChild>(std::move(child)));
 			auto& child_node = node.children.back()->node;
 
 			Vector3 split_child_position = info.position + split_child_direction * child_length;
 			BranchGrowthInfo child_info{ info.desired_length, info.origin_radius * split_radius, split_child_position, current_length};
+			child_info.rand_gen = node_rand_gen.split(1);
 			child_node.growthInfo = std::make_unique<BranchGrowthInfo>(child_info);
 			if (current_length < info.desired_length)
 			{
@@ -182,7 +158,7 @@ namespace Mtree
 		}
 	}
 
-	void BranchFunction::grow_origins(std::vector<std::reference_wrapper<Node>>& origins, const int id)
+	void BranchFunction::grow_origins(std::vector<std::reference_wrapper<Node>>& origins, const int id, const Progress& progress)
 	{
 		std::queue<std::reference_wrapper<Node>> extremities;
 		for (auto& node_ref : origins)
@@ -195,6 +171,7 @@ namespace Mtree
 			if (batch_size == 0)
 			{
 				batch_size = extremities.size();
+				progress.check_cancelled();
 				for (auto& node_ref : origins)
 				{
 					apply_gravity_to_branch(node_ref.get());
@@ -208,13 +185,67 @@ namespace Mtree
 	}
 
 
+	Prototypes BranchFunction::grow_prototypes(std::vector<std::reference_wrapper<Node>>& origins, const int id, const Progress& progress)
+	{
+		auto get_length = [](const Node& origin) { return static_cast<BranchGrowthInfo&>(*origin.growthInfo).desired_length; };
+		// the prototypes are grown from copies of origins spread over the range of branch lengths, in the frame of their origin
+		std::vector<std::reference_wrapper<Node>> sorted_origins = origins;
+		std::stable_sort(sorted_origins.begin(), sorted_origins.end(), [&](const Node& a, const Node& b) { return get_length(a) < get_length(b); });
+		size_t count = std::min(origins.size(), (size_t)prototype_count);
+		std::vector<Stem> stems;
+		std::vector<Eigen::Matrix3f> frames;
+		stems.reserve(count);
+		for (size_t i = 0; i < count; i++)
+		{
+			Node& origin = sorted_origins[(2 * i + 1) * sorted_origins.size() / (2 * count)];
+			frames.push_back(get_branch_frame(origin));
+			stems.push_back(Stem{ origin.clone(), Vector3::Zero() });
+		}
+		std::vector<std::reference_wrapper<Node>> prototype_origins;
+		for (auto& stem : stems)
+		{
+			prototype_origins.push_back(std::ref(stem.node));
+		}
+		grow_origins(prototype_origins, id, progress);
+
+		Prototypes prototypes;
+		std::vector<float> lengths; // sorted, since the prototypes are
+		for (size_t i = 0; i < count; i++)
+		{
+			rotate_branch(stems[i].node, frames[i].transpose());
+			lengths.push_back(get_length(stems[i].node));
+			prototypes.push_back(std::make_shared<const BranchPrototype>(BranchPrototype{ std::move(stems[i]), lengths.back() }));
+		}
+
+		// each origin is left as a single node standing for its whole branch
+		for (Node& origin : origins)
+		{
+			float length = get_length(origin);
+			size_t index = std::lower_bound(lengths.begin(), lengths.end(), length) - lengths.begin();
+			if (index == count || (index > 0 && length - lengths[index - 1] < lengths[index] - length))
+				index--;
+			origin.prototype_id = (int)index;
+			origin.length = length;
+		}
+		return prototypes;
+	}
+
 	// get the origins of the branches that will be created.
 	// origins are created from the nodes made by the parent TreeFunction
-	std::vector<std::reference_wrapper<Node>> BranchFunction::get_origins(std::vector<Stem>& stems, const int id, const int parent_id)
+	// created_origins receives all the created nodes with the positions of their parents, including the ones that are too short to grow
+	std::vector<std::reference_wrapper<Node>> BranchFunction::get_origins(const NodeUtilities::BranchSelection& selection, const int id, std::vector<std::pair<NodeChild*, Vector3>>& created_origins)
 	{
-		// get all nodes created by the parent TreeFunction, organised by branch
-		NodeUtilities::BranchSelection selection = NodeUtilities::select_from_tree(stems, parent_id);
-		std::vector<std::reference_wrapper<Node>> origins;
+		// origins are placed first, then the properties are evaluated for all of them at once
+		struct OriginPlacement
+		{
+			Node* parent;
+			Vector3 parent_position;
+			Vector3 tangent;
+			float position_in_parent;
+		};
+		std::vector<OriginPlacement> placements;
+		std::vector<float> factors;
+		RandomGenerator phillotaxis_rand_gen = rand_gen.split(0);
 
 		float origins_dist = 1 / (branches_density + .001); // distance between two consecutive origins
 
@@ -225,7 +256,7 @@ namespace Mtree
 				continue;
 			}
 
-			float branch_length = NodeUtilities::get_branch_length(*branch[0].node);
+			float branch_length = NodeUtilities::get_branch_length(branch);
 			float absolute_start = start * branch_length; // the length at which we can start adding new branch origins
 			float absolute_end = end * branch_length; // the length at which we stop adding new branch origins
 			float current_length = 0;
@@ -240,7 +271,7 @@ namespace Mtree
 				{
 					continue;
 				}
-				auto rot = Eigen::AngleAxisf((phillotaxis + (rand_gen.get_0_1() - .5) * 2 ) / 180 * M_PI, node.direction);
+				auto rot = Eigen::AngleAxisf((phillotaxis + phillotaxis_rand_gen.get_minus_1_1()) / 180 * M_PI, node.direction);
 				if (dist_to_next_origin > node.length)
 				{
 					dist_to_next_origin -= node.length;
@@ -264,19 +295,8 @@ namespace Mtree
 						tangent = rot * tangent;
 						Geometry::project_on_plane(tangent, node.direction);
 						tangent.normalize();
-						Vector3 child_direction = Geometry::lerp(node.direction, tangent, start_angle.execute(factor) / 90);
-				 		child_direction.normalize();
-				 		float child_radius = node.radius * start_radius.execute(factor);
-						float branch_length = length.execute(factor);
-						float node_length = std::min(branch_length, 1 / (resolution + 0.001f));
-						NodeChild child{Node{child_direction, node.tangent, node_length, child_radius, id}, position_in_parent};
-						node.children.push_back(std::make_shared<NodeChild>(std::move(child)));
-						auto& child_node = node.children.back()->node;
-						Vector3 child_position = node_position + node.direction * node.length * position_in_parent;
-						child_node.growthInfo = std::make_unique<BranchGrowthInfo>(branch_length - node_length, child_radius, child_position, child_node.length, 0);
-						
-						if (branch_length - node_length > 1e-3)
-						origins.push_back(std::ref(child_node));
+						placements.push_back(OriginPlacement{ &node, node_position, tangent, position_in_parent });
+						factors.push_back(factor);
 						position_in_parent += position_in_parent_step;
 						if (i > 0)
 						{
@@ -288,14 +308,67 @@ namespace Mtree
 				}
 			}
 		}
+
+		size_t count = placements.size();
+		std::vector<float> start_angles(count), start_radii(count), lengths(count);
+		start_angle.execute_batch(factors.data(), start_angles.data(), count);
+		start_radius.execute_batch(factors.data(), start_radii.data(), count);
+		length.execute_batch(factors.data(), lengths.data(), count);
+
+		std::vector<std::reference_wrapper<Node>> origins;
+		RandomGenerator origins_rand_gen = rand_gen.split(1); // each origin gets its own stream
+		for (size_t i = 0; i < count; i++)
+		{
+			auto& [parent, parent_position, tangent, position_in_parent] = placements[i];
+			Vector3 child_direction = Geometry::lerp(parent->direction, tangent, start_angles[i] / 90);
+			child_direction.normalize();
+			float child_radius = parent->radius * start_radii[i];
+			float branch_length = lengths[i];
+			float node_length = std::min(branch_length, 1 / (resolution + 0.001f));
+			NodeChild child{Node{child_direction, parent->tangent, node_length, child_radius, id}, position_in_parent};
+			parent->children.push_back(std::make_unique<NodeChild>(std::move(child)));
+			auto& child_node = parent->children.back()->node;
+			Vector3 child_position = parent_position + parent->direction * parent->length * position_in_parent;
+			created_origins.emplace_back(parent->children.back().get(), parent_position);
+			auto child_info = std::make_unique<BranchGrowthInfo>(branch_length - node_length, child_radius, child_position, child_node.length, 0);
+			child_info->rand_gen = origins_rand_gen.split(i);
+			child_node.growthInfo = std::move(child_info);
+
+			if (branch_length - node_length > 1e-3)
+				origins.push_back(std::ref(child_node));
+		}
 		return origins;
 	}
 
-	void BranchFunction::execute(std::vector<Stem>& stems, int id, int parent_id)
+	void BranchFunction::execute(std::vector<Stem>& stems, BranchIndex& branches, int id, int parent_id, const Progress& progress)
 	{
 		rand_gen.set_seed(seed);
-		auto origins = get_origins(stems, id, parent_id);
-		grow_origins(origins, id);
-		execute_children(stems, id);
+		length.set_random_generator(rand_gen.split(2));
+		start_radius.set_random_generator(rand_gen.split(3));
+		randomness.set_random_generator(rand_gen.split(4));
+		start_angle.set_random_generator(rand_gen.split(5));
+		// nodes created by the parent TreeFunction, organised by branch
+		const NodeUtilities::BranchSelection& selection = branches.get_branches(parent_id);
+		std::vector<std::pair<NodeChild*, Vector3>> created_origins;
+		auto origins = get_origins(selection, id, created_origins);
+		if (prototype_count > 0)
+			branches.set_prototypes(id, grow_prototypes(origins, id, progress));
+		else
+			grow_origins(origins, id, progress);
+		for (auto& [origin, parent_position] : created_origins)
+		{
+			branches.add_branches(*origin, parent_position);
+		}
+	}
+
+	void BranchFunction::add_parameters_to_hash(HashBuilder& hash) const
+	{
+		hash.add(start).add(end).add(branches_density).add(end_radius).add(break_chance).add(resolution);
+		hash.add(phillotaxis).add(gravity_strength).add(stiffness).add(up_attraction).add(flatness).add(split_radius);
+		hash.add(split_angle).add(split_proba).add(prototype_count);
+		length.add_to_hash(hash);
+		start_radius.add_to_hash(hash);
+		randomness.add_to_hash(hash);
+		start_angle.add_to_hash(hash);
 	}
 }
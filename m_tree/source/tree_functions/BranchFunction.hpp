@@ -30,8 +30,13 @@ namespace Mtree
 		PropertyWrapper start_angle{ ConstantProperty(45) }; // -180 < x < 180
 		float split_angle = 45.0f;
 		float split_proba = .5f; // 0 < x
+		// when positive, only this many branches are grown, as prototypes, and every origin becomes an instance of the prototype closest in length.
+		// Functions executed after this one don't grow on instanced branches
+		int prototype_count = 0;
 
-		void execute(std::vector<Stem>& stems, int id, int parent_id) override;
+		void execute(std::vector<Stem>& stems, BranchIndex& branches, int id, int parent_id, const Progress& progress) override;
+		std::shared_ptr<TreeFunction> clone() const override { return clone_as<BranchFunction>(); };
+		const char* get_name() const override { return "BranchFunction"; };
 
 		class BranchGrowthInfo :public GrowthInfo
 		{
@@ -44,25 +49,32 @@ namespace Mtree
 			float age = 0;
 			bool inactive = false;
 			Vector3 position;
+			RandomGenerator rand_gen; // stream of the node, the streams of its children are split from it
 			BranchGrowthInfo(float desired_length, float origin_radius, Vector3 position, float current_length = 0, float deviation = 0) :
 				desired_length(desired_length), origin_radius(origin_radius),
 				current_length(current_length), deviation_from_rest_pose(deviation),
 				position(position) {};
+			std::unique_ptr<GrowthInfo> clone() const override { return std::make_unique<BranchGrowthInfo>(*this); };
 		};
 
+	protected:
+		void add_parameters_to_hash(HashBuilder& hash) const override;
+
 	private:
 
-		std::vector<std::reference_wrapper<Node>> get_origins(std::vector<Stem>& stems, const int id, const int parent_id);
+		std::vector<std::reference_wrapper<Node>> get_origins(const NodeUtilities::BranchSelection& selection, const int id, std::vector<std::pair<NodeChild*, Vector3>>& created_origins);
+
+		void grow_origins(std::vector<std::reference_wrapper<Node>>&, const int id, const Progress& progress);
 
-		void grow_origins(std::vector<std::reference_wrapper<Node>>&, const int id);
+		Prototypes grow_prototypes(std::vector<std::reference_wrapper<Node>>& origins, const int id, const Progress& progress); // origins become instances of the returned prototypes
 
 		void grow_node_once(Node& node, const int id, std::queue<std::reference_wrapper<Node>>& results);
 
 		void apply_gravity_to_branch(Node& node);
 
-		void apply_gravity_rec(Node& node, Eigen::AngleAxisf previous_rotations);
+		void apply_gravity_rec(Node& node, const Vector3& position, Eigen::Quaternionf previous_rotations); // also updates the node positions
 		
-		void update_weight_rec(Node& node);
+		bool update_weight_rec(Node& node, bool propagate_inactive); // also propagates the inactive state, returns it
 
 	};
 
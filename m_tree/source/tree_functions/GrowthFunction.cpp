@@ -9,193 +9,290 @@
 
 namespace Mtree
 {
-	void setup_growth_information_rec(Node& node) 
-	{
-		node.growthInfo = std::make_unique<BioNodeInfo>(node.children.size() == 0 ? BioNodeInfo::NodeType::Meristem : BioNodeInfo::NodeType::Ignored);
-		for (auto& child : node.children)
-			setup_growth_information_rec(child->node);
-	}
+	using NodeType = BioNodeInfo::NodeType;
 
-	// get total amount of energy from the node and its descendance, and assign for each node the realtive amount of energy it receive
-	float GrowthFunction::update_vigor_ratio_rec(Node& node)
+	// nodes are indexed in creation order, so a parent always comes before its children.
+	// Children are stored as linked lists so that any node can get new children while the tree grows
+	struct GrowthFunction::GrowthNodes
 	{
-		BioNodeInfo& info = static_cast<BioNodeInfo&>(*node.growthInfo);
-		if (info.type == BioNodeInfo::NodeType::Meristem)
-		{
-			return 1;
-		}
-		else if (info.type == BioNodeInfo::NodeType::Branch || info.type == BioNodeInfo::NodeType::Ignored)
+		std::vector<Node*> tree_nodes; // null for the nodes created by the growth, until they are added to the tree
+		std::vector<int> parents;
+		std::vector<int> first_children;
+		std::vector<int> last_children;
+		std::vector<int> next_siblings;
+		std::vector<float> positions_in_parent;
+		std::vector<Vector3> directions;
+		std::vector<Vector3> tangents;
+		std::vector<float> lengths;
+		std::vector<float> radii;
+
+		std::vector<NodeType> types;
+		std::vector<float> branch_weights;
+		std::vector<Vector3> centers_of_mass;
+		std::vector<Vector3> absolute_positions;
+		std::vector<float> vigor_ratios;
+		std::vector<float> vigors;
+		std::vector<int> ages;
+		std::vector<float> philotaxis_angles;
+		std::vector<float> light_fluxes;
+		std::vector<Eigen::Matrix3f> rotations;
+
+		int add_node(Node* tree_node, int parent, float position_in_parent, const Vector3& direction, const Vector3& tangent, float length, float radius, NodeType type, int age = 0, float philotaxis_angle = 0)
 		{
-			float light_flux = update_vigor_ratio_rec(node.children[0]->node);
-			float vigor_ratio = 1;
-			for (size_t i = 1; i < node.children.size(); i++)
+			int index = (int)parents.size();
+			tree_nodes.push_back(tree_node);
+			parents.push_back(parent);
+			first_children.push_back(-1);
+			last_children.push_back(-1);
+			next_siblings.push_back(-1);
+			positions_in_parent.push_back(position_in_parent);
+			directions.push_back(direction);
+			tangents.push_back(tangent);
+			lengths.push_back(length);
+			radii.push_back(radius);
+			types.push_back(type);
+			branch_weights.push_back(0);
+			centers_of_mass.push_back(Vector3::Zero());
+			absolute_positions.push_back(Vector3::Zero());
+			vigor_ratios.push_back(1);
+			vigors.push_back(0);
+			ages.push_back(age);
+			philotaxis_angles.push_back(philotaxis_angle);
+			light_fluxes.push_back(0);
+			rotations.push_back(Eigen::Matrix3f::Identity());
+			if (parent != -1)
 			{
-				float child_flux = update_vigor_ratio_rec(node.children[i]->node);
-				float t = apical_dominance;
-				vigor_ratio = (t * light_flux) / (t * light_flux + (1 - t) * child_flux + .001f);
-				static_cast<BioNodeInfo*>(node.children[i]->node.growthInfo.get())->vigor_ratio = 1 - vigor_ratio;
-				light_flux += child_flux;
+				if (first_children[parent] == -1)
+					first_children[parent] = index;
+				else
+					next_siblings[last_children[parent]] = index;
+				last_children[parent] = index;
 			}
-			static_cast<BioNodeInfo*>(node.children[0]->node.growthInfo.get())->vigor_ratio = vigor_ratio;
-			return light_flux;
-		}
-		else
-		{
-			info.vigor_ratio = 0;
-			return 0;
+			return index;
 		}
-	}
 
-	// update the amount of energy available to a node
-	void GrowthFunction::update_vigor_rec(Node& node, float vigor)
-	{
-		BioNodeInfo& info = static_cast<BioNodeInfo&>(*node.growthInfo);
-		info.vigor = vigor;
-		for (auto& child : node.children)
+		// children are created the same way as by the Node constructor
+		int add_child(int parent, const Vector3& direction, float length, float radius, NodeType type, int age = 0, float philotaxis_angle = 0)
 		{
-			float child_vigor = static_cast<BioNodeInfo*>(child->node.growthInfo.get())->vigor_ratio* vigor;
-			update_vigor_rec(child->node, child_vigor);
+			Vector3 tangent = Geometry::projected_on_plane(tangents[parent], direction).normalized();
+			int child = add_node(nullptr, parent, 1, direction, tangent, length, radius, type, age, philotaxis_angle);
+			absolute_positions[child] = absolute_positions[parent] + directions[parent] * positions_in_parent[child] * lengths[parent];
+			return child;
 		}
-	}
 
-	// apply rules on the node based on the energy available to it
-	void GrowthFunction::simulate_growth_rec(Node& node, int id)
-	{
-		BioNodeInfo& info = static_cast<BioNodeInfo&>(*node.growthInfo);
-		bool primary_growth = info.type == BioNodeInfo::NodeType::Meristem && info.vigor > grow_threshold;
-		bool secondary_growth = info.vigor > grow_threshold && info.type != BioNodeInfo::NodeType::Ignored; // Todo : should be another parameter 
-		bool split = info.type == BioNodeInfo::NodeType::Meristem && info.vigor > split_threshold;
-		bool cut = info.type == BioNodeInfo::NodeType::Meristem && info.vigor < cut_threshold;
-		int child_count = node.children.size();
-		if (cut && false)
+		int add_tree_rec(Node& node, int parent, float position_in_parent)
 		{
-			info.type = BioNodeInfo::NodeType::Cut;
-			return;
-		}
-		info.age++;
-		if (secondary_growth)
-		{
-			node.radius = (1 - std::exp(-info.age * .01f) + .01f) * .5;
-		}
-		if (primary_growth) 
-		{
-			Vector3 child_direction = node.direction + Vector3{0,0,1} * gravitropism + Geometry::random_vec() * randomness;
-			child_direction.normalize();
-			float child_radius = node.radius;
-			float child_length = branch_length * (info.vigor + .1f);
-			NodeChild child = NodeChild{ Node{child_direction, node.tangent, branch_length, child_radius, id}, 1 };
-			float child_angle = split ? info.philotaxis_angle + philotaxis_angle : info.philotaxis_angle;
-			child.node.growthInfo = std::make_unique<BioNodeInfo>(BioNodeInfo::NodeType::Meristem, 0, child_angle);
-			node.children.push_back(std::make_shared<NodeChild>(std::move(child)));
-			info.type = BioNodeInfo::NodeType::Branch;
+			NodeType type = node.children.size() == 0 ? NodeType::Meristem : NodeType::Ignored;
+			int index = add_node(&node, parent, position_in_parent, node.direction, node.tangent, node.length, node.radius, type);
+			for (auto& child : node.children)
+			{
+				add_tree_rec(child->node, index, child->position_in_parent);
+			}
+			return index;
 		}
-		if (split)
+
+		// depth first order of the nodes descending from root, children are visited in the order they were added
+		std::vector<int> get_order(int root) const
 		{
-			info.philotaxis_angle += philotaxis_angle;
-			Vector3 tangent{ std::cos(info.philotaxis_angle), std::sin(info.philotaxis_angle), 0 };
-			tangent = Geometry::get_look_at_rot(node.direction) * tangent;
-			Vector3 child_direction = Geometry::lerp(node.direction, tangent, split_angle / 90);
-			child_direction.normalize();
-			float child_radius = node.radius;
-			float child_length = branch_length * (info.vigor + .1f);
-			NodeChild child = NodeChild{ Node{child_direction, node.tangent, branch_length, child_radius, id}, 1 };
-			child.node.growthInfo = std::make_unique<BioNodeInfo>(BioNodeInfo::NodeType::Meristem);
-			node.children.push_back(std::make_shared<NodeChild>(std::move(child)));
-			info.type = BioNodeInfo::NodeType::Branch;
+			std::vector<int> order;
+			std::vector<int> stack{ root };
+			std::vector<int> children;
+			while (!stack.empty())
+			{
+				int node = stack.back();
+				stack.pop_back();
+				order.push_back(node);
+				children.clear();
+				for (int child = first_children[node]; child != -1; child = next_siblings[child])
+					children.push_back(child);
+				stack.insert(stack.end(), children.rbegin(), children.rend());
+			}
+			return order;
 		}
-		for (size_t i = 0; i < child_count; i++)
+
+		void apply_to_tree(int creator_id)
 		{
-			simulate_growth_rec(node.children[i]->node, id);
+			for (size_t i = 0; i < parents.size(); i++)
+			{
+				if (tree_nodes[i] == nullptr)
+				{
+					Node& parent = *tree_nodes[parents[i]];
+					parent.children.push_back(std::make_unique<NodeChild>(NodeChild{ Node{directions[i], parent.tangent, lengths[i], radii[i], creator_id}, positions_in_parent[i] }));
+					tree_nodes[i] = &parent.children.back()->node;
+					tree_nodes[i]->tangent = tangents[i]; // the tangent depends on the direction the node had when it was created
+				}
+				Node& node = *tree_nodes[i];
+				node.direction = directions[i];
+				node.radius = radii[i];
+				auto info = std::make_unique<BioNodeInfo>(types[i], ages[i], philotaxis_angles[i]);
+				info->branch_weight = branch_weights[i];
+				info->center_of_mass = centers_of_mass[i];
+				info->absolute_position = absolute_positions[i];
+				info->vigor_ratio = vigor_ratios[i];
+				info->vigor = vigors[i];
+				node.growthInfo = std::move(info);
+			}
 		}
-	}
+	};
 
-	void GrowthFunction::get_weight_rec(Node& node)
+	// distribute the energy to each node, then apply rules on the nodes based on the energy available to them.
+	// Nodes created during the sweep are not part of the order and don't grow until the next iteration
+	void GrowthFunction::simulate_growth(GrowthNodes& nodes, const std::vector<int>& order, float target_light_flux, int id)
 	{
-		BioNodeInfo& info = static_cast<BioNodeInfo&>(*node.growthInfo);
-		for (auto& child : node.children)
-		{
-			get_weight_rec(child->node);
-		}
-		float segment_weight = node.length * node.radius * node.radius;
-		Vector3 center_of_mass = (info.absolute_position + node.direction * node.length / 2) * segment_weight;
-		float total_weight = segment_weight;
-		for (auto& child : node.children)
+		for (int node : order)
 		{
-			BioNodeInfo& child_info = static_cast<BioNodeInfo&>(*child->node.growthInfo);
-			center_of_mass += child_info.center_of_mass * child_info.branch_weight;
-			total_weight += child_info.branch_weight;
+			int parent = nodes.parents[node];
+			if (node == order[0])
+			{
+				nodes.vigors[node] = target_light_flux;
+			}
+			else
+			{
+				nodes.vigors[node] = nodes.vigor_ratios[node] * nodes.vigors[parent];
+				nodes.absolute_positions[node] = nodes.absolute_positions[parent] + nodes.directions[parent] * nodes.positions_in_parent[node] * nodes.lengths[parent];
+			}
+
+			float vigor = nodes.vigors[node];
+			NodeType type = nodes.types[node];
+			bool primary_growth = type == NodeType::Meristem && vigor > grow_threshold;
+			bool secondary_growth = vigor > grow_threshold && type != NodeType::Ignored; // Todo : should be another parameter 
+			bool split = type == NodeType::Meristem && vigor > split_threshold;
+			int age = ++nodes.ages[node];
+			if (secondary_growth)
+			{
+				nodes.radii[node] = (1 - std::exp(-age * .01f) + .01f) * .5;
+			}
+			if (primary_growth)
+			{
+				RandomGenerator node_rand_gen = rand_gen.split(node); // a meristem only grows once, its stream doesn't depend on the visit order
+				Vector3 child_direction = nodes.directions[node] + Vector3{ 0,0,1 } *gravitropism + Geometry::random_vec(node_rand_gen) * randomness;
+				child_direction.normalize();
+				float child_angle = split ? nodes.philotaxis_angles[node] + philotaxis_angle : nodes.philotaxis_angles[node];
+				nodes.add_child(node, child_direction, branch_length, nodes.radii[node], NodeType::Meristem, 0, child_angle);
+				nodes.types[node] = NodeType::Branch;
+			}
+			if (split)
+			{
+				nodes.philotaxis_angles[node] += philotaxis_angle;
+				Vector3 tangent{ std::cos(nodes.philotaxis_angles[node]), std::sin(nodes.philotaxis_angles[node]), 0 };
+				tangent = Geometry::get_look_at_rot(nodes.directions[node]) * tangent;
+				Vector3 child_direction = Geometry::lerp(nodes.directions[node], tangent, split_angle / 90);
+				child_direction.normalize();
+				nodes.add_child(node, child_direction, branch_length, nodes.radii[node], NodeType::Meristem);
+				nodes.types[node] = NodeType::Branch;
+			}
 		}
-		center_of_mass /= total_weight;
-		info.center_of_mass = center_of_mass;
-		info.branch_weight = total_weight;
 	}
 
-	void GrowthFunction::apply_gravity_rec(Node& node, Eigen::Matrix3f curent_rotation)
+	// compute the weight and center of mass of each branch from the extremities to the root.
+	// When update_light_flux is true, also get the total amount of energy from each node and its descendance,
+	// and assign to each node the relative amount of energy it receives. Return the energy of the root
+	float GrowthFunction::update_weight(GrowthNodes& nodes, const std::vector<int>& order, bool update_light_flux)
 	{
-		BioNodeInfo& info = static_cast<BioNodeInfo&>(*node.growthInfo);
-		Vector3 offset = (info.center_of_mass - info.absolute_position);
-		offset[2] = 0;
-		float lever_arm = offset.norm();
-		float torque = info.branch_weight * lever_arm;
-		float bendiness = std::exp(-(info.age/2 + info.vigor));
-		float angle = torque * bendiness * gravity_strength * 50;
-		Vector3 tangent = node.direction.cross(Vector3{ 0,0,-1 });
-		Eigen::Matrix3f rot;
-		rot = Eigen::AngleAxis<float>(angle, tangent);
-		curent_rotation = curent_rotation * rot;
-		node.direction = curent_rotation * node.direction;
-		
-		for (auto& child : node.children)
+		for (auto it = order.rbegin(); it != order.rend(); it++)
 		{
-			apply_gravity_rec(child->node, curent_rotation);
+			int node = *it;
+			float segment_weight = nodes.lengths[node] * nodes.radii[node] * nodes.radii[node];
+			Vector3 center_of_mass = (nodes.absolute_positions[node] + nodes.directions[node] * nodes.lengths[node] / 2) * segment_weight;
+			float total_weight = segment_weight;
+			for (int child = nodes.first_children[node]; child != -1; child = nodes.next_siblings[child])
+			{
+				center_of_mass += nodes.centers_of_mass[child] * nodes.branch_weights[child];
+				total_weight += nodes.branch_weights[child];
+			}
+			center_of_mass /= total_weight;
+			nodes.centers_of_mass[node] = center_of_mass;
+			nodes.branch_weights[node] = total_weight;
+
+			if (!update_light_flux)
+				continue;
+			NodeType type = nodes.types[node];
+			if (type == NodeType::Meristem)
+			{
+				nodes.light_fluxes[node] = 1;
+			}
+			else if (type == NodeType::Branch || type == NodeType::Ignored)
+			{
+				int first_child = nodes.first_children[node];
+				float light_flux = nodes.light_fluxes[first_child];
+				float vigor_ratio = 1;
+				for (int child = nodes.next_siblings[first_child]; child != -1; child = nodes.next_siblings[child])
+				{
+					float child_flux = nodes.light_fluxes[child];
+					float t = apical_dominance;
+					vigor_ratio = (t * light_flux) / (t * light_flux + (1 - t) * child_flux + .001f);
+					nodes.vigor_ratios[child] = 1 - vigor_ratio;
+					light_flux += child_flux;
+				}
+				nodes.vigor_ratios[first_child] = vigor_ratio;
+				nodes.light_fluxes[node] = light_flux;
+			}
+			else
+			{
+				nodes.vigor_ratios[node] = 0;
+				nodes.light_fluxes[node] = 0;
+			}
 		}
+		return nodes.light_fluxes[order[0]];
 	}
 
-	void GrowthFunction::update_absolute_position_rec(Node& node, const Vector3& node_position)
+	void GrowthFunction::apply_gravity(GrowthNodes& nodes, const std::vector<int>& order)
 	{
-		static_cast<BioNodeInfo*>(node.growthInfo.get())->absolute_position = node_position;
-		for (auto& child : node.children)
+		for (int node : order)
 		{
-			Vector3 child_position = node_position + node.direction * child->position_in_parent * node.length;
-			update_absolute_position_rec(child->node, child_position);
+			Vector3 offset = (nodes.centers_of_mass[node] - nodes.absolute_positions[node]);
+			offset[2] = 0;
+			float lever_arm = offset.norm();
+			float torque = nodes.branch_weights[node] * lever_arm;
+			float bendiness = std::exp(-(nodes.ages[node] / 2 + nodes.vigors[node]));
+			float angle = torque * bendiness * gravity_strength * 50;
+			Vector3 tangent = nodes.directions[node].cross(Vector3{ 0,0,-1 });
+			Eigen::Matrix3f rot;
+			rot = Eigen::AngleAxis<float>(angle, tangent);
+			Eigen::Matrix3f curent_rotation = node == order[0] ? rot : Eigen::Matrix3f{ nodes.rotations[nodes.parents[node]] * rot };
+			nodes.rotations[node] = curent_rotation;
+			nodes.directions[node] = curent_rotation * nodes.directions[node];
 		}
 	}
 
-	void GrowthFunction::execute(std::vector<Stem>& stems, int id, int parent_id)
+	void GrowthFunction::execute(std::vector<Stem>& stems, BranchIndex& branches, int id, int parent_id, const Progress& progress)
 	{
 		rand_gen.set_seed(seed);
 
+		GrowthNodes nodes;
+		std::vector<int> roots;
+		std::vector<std::vector<int>> orders;
 		for (Stem& stem : stems)
 		{
-			setup_growth_information_rec(stem.node);
+			roots.push_back(nodes.add_tree_rec(stem.node, -1, 0));
+			nodes.absolute_positions[roots.back()] = stem.position;
+			orders.push_back(nodes.get_order(roots.back()));
+			update_weight(nodes, orders.back(), true); // get total available energy
 		}
 
 		for (size_t i = 0; i < iterations; i++) // an iteration can be seen as a year of growth
 		{
-			for (Stem& stem : stems) // the energy is not shared between stems
+			progress.update((float)i / iterations);
+			for (size_t stem = 0; stem < stems.size(); stem++) // the energy is not shared between stems
 			{
 				float target_light_flux = 1 + std::pow((float)i, 1.5);
-				float light_flux = update_vigor_ratio_rec(stem.node); // get total available energy
 
-				if (target_light_flux > light_flux)
-				{
-					cut_threshold -= .1f;
-					//grow_threshold -= .1f
-				}
-				else if (target_light_flux < light_flux)
-				{
-					cut_threshold += .1f;
-				}
-				//cut_threshold = (light_flux / target_light_flux) / 2;
-
-				update_vigor_rec(stem.node, target_light_flux); // distribute the energy in each node
-				simulate_growth_rec(stem.node, id); // apply rules to the tree
-				update_absolute_position_rec(stem.node, stem.position);
-				get_weight_rec(stem.node);
-				Eigen::Matrix3f rot;
-				rot = rot.Identity();
-				apply_gravity_rec(stem.node, rot);
+				simulate_growth(nodes, orders[stem], target_light_flux, id); // distribute the energy and apply rules to the tree
+				orders[stem] = nodes.get_order(roots[stem]);
+				// the energy only depends on the structure of the tree, it is computed for the next iteration along with the weights
+				update_weight(nodes, orders[stem], i + 1 < iterations);
+				apply_gravity(nodes, orders[stem]);
 			}
 		}
+		nodes.apply_to_tree(id);
+		branches.rebuild(stems); // the growth moves and extends the nodes of the other functions
+	}
+
+	void GrowthFunction::add_parameters_to_hash(HashBuilder& hash) const
+	{
+		hash.add(iterations).add(apical_dominance).add(grow_threshold).add(split_angle).add(branch_length).add(gravitropism);
+		hash.add(randomness).add(cut_threshold).add(split_threshold).add(gravity_strength).add(apical_control).add(codominant_proba);
+		hash.add(codominant_count).add(branch_angle).add(philotaxis_angle).add(flower_threshold).add(growth_delta).add(flowering_delta);
+		hash.add(root_flux);
 	}
 }
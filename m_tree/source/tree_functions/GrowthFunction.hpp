@@ -7,12 +7,10 @@ namespace Mtree
 	class GrowthFunction : public TreeFunction
 	{
 	private:
-		float update_vigor_ratio_rec(Node& node);
-		void update_vigor_rec(Node& node, float vigor);
-		void simulate_growth_rec(Node& node, int id);
-		void get_weight_rec(Node& node);
-		void apply_gravity_rec(Node& node, Eigen::Matrix3f curent_rotation);
-		void update_absolute_position_rec(Node& node, const Vector3& node_position);
+		struct GrowthNodes; // nodes being grown and their growth information, stored in contiguous arrays
+		void simulate_growth(GrowthNodes& nodes, const std::vector<int>& order, float target_light_flux, int id);
+		float update_weight(GrowthNodes& nodes, const std::vector<int>& order, bool update_light_flux);
+		void apply_gravity(GrowthNodes& nodes, const std::vector<int>& order);
 
 	public:
 		int iterations = 5;
@@ -39,7 +37,12 @@ namespace Mtree
 		float root_flux = 5;
 
 
-		void execute(std::vector<Stem>& stems, int id, int parent_id) override;
+		void execute(std::vector<Stem>& stems, BranchIndex& branches, int id, int parent_id, const Progress& progress) override;
+		std::shared_ptr<TreeFunction> clone() const override { return clone_as<GrowthFunction>(); };
+		const char* get_name() const override { return "GrowthFunction"; };
+
+	protected:
+		void add_parameters_to_hash(HashBuilder& hash) const override;
 	};
 
 	class BioNodeInfo : public GrowthInfo
@@ -55,6 +58,7 @@ namespace Mtree
 		float philotaxis_angle = 0;
 
 		BioNodeInfo(NodeType type, int age = 0, float philotaxis_angle = 0) { this->type = type; this->age = age; this->philotaxis_angle = philotaxis_angle; };
+		std::unique_ptr<GrowthInfo> clone() const override { return std::make_unique<BioNodeInfo>(*this); };
 	};
 
 }
@@ -0,0 +1,163 @@
+#include <cmath>
+#include <algorithm>
+#include <Eigen/Geometry>
+#include "LeavesFunction.hpp"
+#include "source/utilities/GeometryUtilities.hpp"
+
+namespace Mtree
+{
+	namespace
+	{
+		// copies the leaves of source to leaves from first_leaf, moved by the placement of an instance.
+		// Leaves are scaled with the instance, so that a shortened branch keeps the leaf density of its prototype relative to its size
+		void add_placed_leaves(LeafInstances& leaves, int first_leaf, LeafInstances& source, const Vector3& position, const Eigen::Matrix3f& rotation, float scale)
+		{
+			Eigen::Quaternionf placement_rotation{ rotation };
+			for (int i = 0; i < source.count; i++)
+			{
+				int leaf = first_leaf + i;
+				Eigen::Map<Vector3>(leaves.positions() + 3 * leaf) = position + rotation * Eigen::Map<Vector3>(source.positions() + 3 * i) * scale;
+				Eigen::Map<Vector3>(leaves.normals() + 3 * leaf) = rotation * Eigen::Map<Vector3>(source.normals() + 3 * i);
+				leaves.scales()[leaf] = source.scales()[i] * scale;
+				float* source_rotation = source.rotations() + 4 * i;
+				Eigen::Quaternionf leaf_rotation = placement_rotation * Eigen::Quaternionf{ source_rotation[0], source_rotation[1], source_rotation[2], source_rotation[3] };
+				float* rotation_values = leaves.rotations() + 4 * leaf;
+				rotation_values[0] = leaf_rotation.w();
+				rotation_values[1] = leaf_rotation.x();
+				rotation_values[2] = leaf_rotation.y();
+				rotation_values[3] = leaf_rotation.z();
+			}
+		}
+	}
+
+	LeavesFunction::BranchDistances LeavesFunction::get_branch_distances(const Skeleton& skeleton) const
+	{
+		// a branch follows the first child of each node. Parents are stored before their children
+		int node_count = skeleton.get_node_count();
+		BranchDistances distances{ std::vector<float>(node_count, 0), std::vector<float>(node_count, 0) };
+		for (int node = skeleton.stem_count; node < node_count; node++)
+		{
+			int parent = skeleton.parents[node];
+			if (node == skeleton.children_start[parent])
+				distances.from_start[node] = distances.from_start[parent] + skeleton.lengths[parent] * skeleton.positions_in_parent[node];
+		}
+		for (int node = node_count - 1; node >= 0; node--)
+		{
+			if (skeleton.is_leaf(node))
+			{
+				distances.to_tip[node] = skeleton.lengths[node];
+				continue;
+			}
+			int first_child = skeleton.children_start[node];
+			distances.to_tip[node] = skeleton.lengths[node] * skeleton.positions_in_parent[first_child] + distances.to_tip[first_child];
+		}
+		return distances;
+	}
+
+	std::vector<std::array<int, 2>> LeavesFunction::get_leaf_ranges(const Skeleton& skeleton, const BranchDistances& distances) const
+	{
+		// leaf j of a branch is at (j + .5) / density from the start of the branch, and belongs to the node it falls on
+		std::vector<std::array<int, 2>> ranges(skeleton.get_node_count(), { 0, 0 });
+		if (density <= 0)
+			return ranges;
+		for (int node = 0; node < skeleton.get_node_count(); node++)
+		{
+			if (skeleton.radii[node] > max_radius || skeleton.prototype_ids[node] >= 0)
+				continue;
+			float start = distances.from_start[node];
+			float end = start + skeleton.lengths[node];
+			if (max_distance_to_tip > 0)
+				start = std::max(start, start + distances.to_tip[node] - max_distance_to_tip);
+			int first_leaf = (int)std::ceil(start * density - .5f);
+			int end_leaf = (int)std::ceil(end * density - .5f);
+			ranges[node] = { first_leaf, std::max(first_leaf, end_leaf) };
+		}
+		return ranges;
+	}
+
+	LeafInstances LeavesFunction::get_leaves(const Skeleton& skeleton, const RandomGenerator& rand_gen) const
+	{
+		BranchDistances distances = get_branch_distances(skeleton);
+		std::vector<std::array<int, 2>> ranges = get_leaf_ranges(skeleton, distances);
+		std::vector<int> first_leaves(skeleton.get_node_count() + 1, 0);
+		for (int node = 0; node < skeleton.get_node_count(); node++)
+		{
+			first_leaves[node + 1] = first_leaves[node] + ranges[node][1] - ranges[node][0];
+		}
+
+		LeafInstances leaves{ first_leaves.back() };
+		float phyllotaxis_radians = phyllotaxis * (float)M_PI / 180;
+		float start_radians = start_angle * (float)M_PI / 180;
+		for (int node = 0; node < skeleton.get_node_count(); node++)
+		{
+			if (ranges[node][0] == ranges[node][1])
+				continue;
+			Vector3 direction = skeleton.directions[node];
+			Vector3 tangent = Geometry::projected_on_plane(skeleton.tangents[node], direction);
+			tangent = tangent.norm() > 1e-6f ? tangent.normalized() : Geometry::get_orthogonal_vector(direction).normalized();
+			Vector3 bitangent = direction.cross(tangent);
+			RandomGenerator node_rand_gen = rand_gen.split(node);
+			for (int j = ranges[node][0]; j < ranges[node][1]; j++)
+			{
+				int leaf = first_leaves[node] + j - ranges[node][0];
+				float distance_in_node = (j + .5f) / density - distances.from_start[node];
+				float angle = j * phyllotaxis_radians + randomness * node_rand_gen.get_minus_1_1() * (float)M_PI;
+				float elevation = start_radians * (1 + randomness * node_rand_gen.get_minus_1_1() * .5f);
+				Vector3 radial = tangent * std::cos(angle) + bitangent * std::sin(angle);
+				Vector3 leaf_direction = direction * std::cos(elevation) + radial * std::sin(elevation);
+				Vector3 side = direction.cross(radial);
+				Vector3 normal = side.cross(leaf_direction);
+				Eigen::Matrix3f frame;
+				frame << side, leaf_direction, normal;
+				Eigen::Quaternionf rotation{ frame };
+
+				float maturity = maturity_length > 0 ? std::min(1.f, (distances.to_tip[node] - distance_in_node) / maturity_length) : 1;
+				float scale = size * (tip_size + (1 - tip_size) * maturity) * (1 + randomness * node_rand_gen.get_minus_1_1() * .5f);
+
+				Eigen::Map<Vector3>(leaves.positions() + 3 * leaf) = skeleton.positions[node] + direction * distance_in_node + radial * skeleton.radii[node];
+				Eigen::Map<Vector3>(leaves.normals() + 3 * leaf) = normal;
+				leaves.scales()[leaf] = scale;
+				float* rotation_values = leaves.rotations() + 4 * leaf;
+				rotation_values[0] = rotation.w();
+				rotation_values[1] = rotation.x();
+				rotation_values[2] = rotation.y();
+				rotation_values[3] = rotation.z();
+			}
+		}
+		return leaves;
+	}
+
+	LeafInstances LeavesFunction::execute(Tree& tree) const
+	{
+		RandomGenerator rand_gen{ seed };
+		LeafInstances tree_leaves = get_leaves(Skeleton{ tree.get_stems() }, rand_gen.split(0)); // the skeleton is only kept while the leaves are placed
+		Prototypes prototypes = tree.get_prototypes();
+		if (prototypes.empty())
+			return tree_leaves;
+
+		// the leaves of each prototype are placed once, then copied on its instances
+		std::vector<LeafInstances> prototype_leaves;
+		for (size_t i = 0; i < prototypes.size(); i++)
+		{
+			std::vector<Stem> prototype_stems;
+			prototype_stems.push_back(prototypes[i]->stem.clone());
+			prototype_leaves.push_back(get_leaves(Skeleton{ prototype_stems }, rand_gen.split(i + 1)));
+		}
+		std::vector<BranchInstance> instances = tree.get_branch_instances();
+		int count = tree_leaves.count;
+		for (auto& instance : instances)
+		{
+			count += prototype_leaves[instance.prototype_index].count;
+		}
+		LeafInstances leaves{ count };
+		add_placed_leaves(leaves, 0, tree_leaves, Vector3::Zero(), Eigen::Matrix3f::Identity(), 1);
+		int first_leaf = tree_leaves.count;
+		for (auto& instance : instances)
+		{
+			LeafInstances& source = prototype_leaves[instance.prototype_index];
+			add_placed_leaves(leaves, first_leaf, source, instance.position, instance.rotation, instance.scale);
+			first_leaf += source.count;
+		}
+		return leaves;
+	}
+}
\ No newline at end of file
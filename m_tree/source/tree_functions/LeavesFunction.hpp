@@ -0,0 +1,57 @@
+#pragma once
+#include <vector>
+#include <array>
+#include "source/tree/Tree.hpp"
+#include "source/tree/Skeleton.hpp"
+#include "source/utilities/RandomGenerator.hpp"
+
+namespace Mtree
+{
+	// leaves of a tree, in a single buffer holding one contiguous array per attribute: positions (3 floats per leaf),
+	// normals (3), scales (1) and rotations (quaternions as w, x, y, z). A leaf is modeled along y, facing z,
+	// and its rotation takes it to its place on the branch
+	struct LeafInstances
+	{
+		int count = 0;
+		std::vector<float> buffer;
+
+		static constexpr int floats_per_leaf = 11;
+
+		LeafInstances(int count = 0) : count{ count }, buffer(count * floats_per_leaf) {};
+		float* positions() { return buffer.data(); };
+		float* normals() { return buffer.data() + 3 * count; };
+		float* scales() { return buffer.data() + 6 * count; };
+		float* rotations() { return buffer.data() + 7 * count; };
+	};
+
+	// places leaves along the thin nodes of a grown tree, turning around each branch by the phyllotaxis angle.
+	// Leaves are evaluated on the finished tree, like a mesh, so that they follow the changes made by every function.
+	// Leaves near the tip of a branch are younger, and smaller. Instanced branches get the leaves of their prototype, scaled with the branch
+	class LeavesFunction
+	{
+	public:
+		int seed = 42;
+		float density = 10; // leaves per unit length of branch
+		float phyllotaxis = 137.5f; // angle in degrees around the branch between consecutive leaves
+		float start_angle = 45; // angle in degrees between the branch and its leaves
+		float max_radius = .05f; // nodes thicker than this don't grow leaves
+		float max_distance_to_tip = 0; // when positive, only the part of a branch this close to its tip grows leaves
+		float size = .1f;
+		float tip_size = .3f; // size of the leaves at the tip of a branch, relative to the mature leaves
+		float maturity_length = 1; // distance from the tip of its branch at which a leaf reaches its full size
+		float randomness = .2f; // variation of the angles and sizes of the leaves
+
+		LeafInstances execute(Tree& tree) const;
+		LeafInstances get_leaves(const Skeleton& skeleton, const RandomGenerator& rand_gen) const; // leaves of the nodes of a skeleton, instances excluded
+
+	private:
+		struct BranchDistances
+		{
+			std::vector<float> from_start; // distance from the start of its branch to the start of each node
+			std::vector<float> to_tip; // distance from the start of each node to the tip of its branch
+		};
+
+		BranchDistances get_branch_distances(const Skeleton& skeleton) const;
+		std::vector<std::array<int, 2>> get_leaf_ranges(const Skeleton& skeleton, const BranchDistances& distances) const; // indices along their branch of the first and past the last leaves of each node
+	};
+}
\ No newline at end of file
@@ -18,7 +18,7 @@ namespace Mtree
 		}
 		node.radius = pow(total_children_radius, 1 / power) + constant_growth * node.length / 100;
 	}
-	void PipeRadiusFunction::execute(std::vector<Stem>& stems, int id, int parent_id)
+	void PipeRadiusFunction::execute(std::vector<Stem>& stems, BranchIndex& branches, int id, int parent_id, const Progress& progress)
 	{
 		rand_gen.set_seed(seed);
 
@@ -26,7 +26,11 @@ namespace Mtree
 		{
 			update_radius_rec(stem.node);
 		}
-		execute_children(stems, id);
+	}
+
+	void PipeRadiusFunction::add_parameters_to_hash(HashBuilder& hash) const
+	{
+		hash.add(power).add(end_radius).add(constant_growth);
 	}
 
 }
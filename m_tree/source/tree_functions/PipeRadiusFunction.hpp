@@ -19,7 +19,12 @@ namespace Mtree
 		float power = 2.f;
 		float end_radius = .01f;
 		float constant_growth = .01f;
-		void execute(std::vector<Stem>& stems, int id, int parent_id) override;
+		void execute(std::vector<Stem>& stems, BranchIndex& branches, int id, int parent_id, const Progress& progress) override;
+		std::shared_ptr<TreeFunction> clone() const override { return clone_as<PipeRadiusFunction>(); };
+		const char* get_name() const override { return "PipeRadiusFunction"; };
+
+	protected:
+		void add_parameters_to_hash(HashBuilder& hash) const override;
 	};
 
 }
@@ -2,7 +2,7 @@
 #include "source/utilities/GeometryUtilities.hpp"
 namespace Mtree
 {
-	void TrunkFunction::execute(std::vector<Stem>& stems, int id, int parent_id)
+	void TrunkFunction::execute(std::vector<Stem>& stems, BranchIndex& branches, int id, int parent_id, const Progress& progress)
 	{
 		rand_gen.set_seed(seed);
 
@@ -18,19 +18,24 @@ namespace Mtree
 			
 			float factor = std::pow((float)i / (node_count), shape);
 			float radius = Geometry::lerp(start_radius, end_radius, factor);
-			Vector3 direction = current_node->direction + Geometry::random_vec() * (randomness / (resolution+.001f));
+			Vector3 direction = current_node->direction + Geometry::random_vec(rand_gen) * (randomness / (resolution+.001f));
 			direction += Vector3(0,0,up_attraction / (resolution + .001f));
 			direction.normalize();
 			float position_in_parent = 1;
 			NodeChild child{ Node{direction, firstNode.tangent, segment_length, radius, id}, position_in_parent };
-			current_node->children.push_back(std::make_shared<NodeChild>(std::move(child)));
+			current_node->children.push_back(std::make_unique<NodeChild>(std::move(child)));
 			current_node = &current_node->children.back()->node;
 		}
 
 		Vector3 position{ 0,0,0 };
 		Stem stem{ std::move(firstNode), position };
 		stems.push_back(std::move(stem));
-		execute_children(stems, id);
+		branches.rebuild(stems); // adding a stem can move the first nodes of the other stems
+	}
+
+	void TrunkFunction::add_parameters_to_hash(HashBuilder& hash) const
+	{
+		hash.add(length).add(start_radius).add(end_radius).add(shape).add(resolution).add(randomness).add(up_attraction);
 	}
 
 }
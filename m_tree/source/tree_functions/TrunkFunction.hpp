@@ -15,7 +15,12 @@ namespace Mtree
 		float randomness = .1f;
 		float up_attraction = .6f;
 
-		void execute(std::vector<Stem>& stems, int id, int parent_id) override;
+		void execute(std::vector<Stem>& stems, BranchIndex& branches, int id, int parent_id, const Progress& progress) override;
+		std::shared_ptr<TreeFunction> clone() const override { return clone_as<TrunkFunction>(); };
+		const char* get_name() const override { return "TrunkFunction"; };
+
+	protected:
+		void add_parameters_to_hash(HashBuilder& hash) const override;
 	};
 
 }
@@ -1,16 +1,33 @@
 #pragma once
 #include <vector>
+#include <memory>
+#include <cmath>
+#include <algorithm>
+#include <type_traits>
 #include "source/utilities/RandomGenerator.hpp"
 #include "source/utilities/GeometryUtilities.hpp"
+#include "source/utilities/HashBuilder.hpp"
 
 
 namespace Mtree
 {
     
 
+	// immutable once given to a PropertyWrapper, which can then be copied without copying the property.
+	// Random values are drawn from the generator of the wrapper
 	struct Property
 	{
-        virtual float execute(float x) = 0;
+        virtual float execute(float x, RandomGenerator& rand_gen) const = 0;
+        // values of the property at count factors, the same as calling execute on each factor in order
+        virtual void execute_batch(const float* x, float* values, const size_t count, RandomGenerator& rand_gen) const
+        {
+            for (size_t i = 0; i < count; i++)
+            {
+                values[i] = execute(x[i], rand_gen);
+            }
+        }
+        virtual void add_to_hash(HashBuilder& hash) const = 0;
+        virtual ~Property() = default;
 	};
 
 
@@ -20,24 +37,46 @@ namespace Mtree
 
         ConstantProperty(float value=1) : value(value) {};
 
-        float execute(float x) override
+        float execute(float x, RandomGenerator& rand_gen) const override
         {
             return value;
         }
+
+        void execute_batch(const float* x, float* values, const size_t count, RandomGenerator& rand_gen) const override
+        {
+            std::fill(values, values + count, value);
+        }
+
+        void add_to_hash(HashBuilder& hash) const override
+        {
+            hash.add(std::string{ "constant" }).add(value);
+        }
     };
     
     struct RandomProperty : Property
     {
-		RandomGenerator rand_gen;
         float min_value;
         float max_value;
 
         RandomProperty(float min=0, float max=1) : min_value(min), max_value(max) {};
 
-        float execute(float x) override
+        float execute(float x, RandomGenerator& rand_gen) const override
         {
             return Geometry::lerp(min_value, max_value, rand_gen.get_0_1());
         }
+
+        void execute_batch(const float* x, float* values, const size_t count, RandomGenerator& rand_gen) const override
+        {
+            for (size_t i = 0; i < count; i++)
+            {
+                values[i] = Geometry::lerp(min_value, max_value, rand_gen.get_0_1());
+            }
+        }
+
+        void add_to_hash(HashBuilder& hash) const override
+        {
+            hash.add(std::string{ "random" }).add(min_value).add(max_value);
+        }
     };
 
     struct SimpleCurveProperty : Property
@@ -51,7 +90,7 @@ namespace Mtree
         SimpleCurveProperty(float x_min=0, float x_max=1, float y_min=0, float y_max=1, float power = 1) : 
             x_min(x_min), x_max(x_max), y_min(y_min), y_max(y_max), power(power) {};
 
-        float execute(float x) override\
+        float execute(float x, RandomGenerator& rand_gen) const override
         {
             float factor = std::clamp((x - x_min) / std::max(0.001f, (x_max - x_min)), 0.f, 1.f);
             if (power > 0 && power != 1)
@@ -60,21 +99,104 @@ namespace Mtree
             }
             return Geometry::lerp(y_min, y_max, factor); 
         }
+
+        void execute_batch(const float* x, float* values, const size_t count, RandomGenerator& rand_gen) const override
+        {
+            float width = std::max(0.001f, (x_max - x_min));
+            bool has_power = power > 0 && power != 1;
+            for (size_t i = 0; i < count; i++)
+            {
+                float factor = std::clamp((x[i] - x_min) / width, 0.f, 1.f);
+                if (has_power)
+                {
+                    factor = std::pow(factor, power);
+                }
+                values[i] = Geometry::lerp(y_min, y_max, factor);
+            }
+        }
+
+        void add_to_hash(HashBuilder& hash) const override
+        {
+            hash.add(std::string{ "simple_curve" }).add(x_min).add(x_max).add(y_min).add(y_max).add(power);
+        }
+    };
+
+    // piecewise linear curve through points sorted by x, constant before the first point and after the last one
+    struct CurveProperty : Property
+    {
+        std::vector<float> x_values;
+        std::vector<float> y_values;
+
+        CurveProperty() : x_values{ 0, 1 }, y_values{ 0, 1 } {};
+
+        CurveProperty(std::vector<std::pair<float, float>> points)
+        {
+            if (points.empty())
+            {
+                points = { {0.f, 0.f}, {1.f, 1.f} };
+            }
+            std::stable_sort(points.begin(), points.end(), [](auto& a, auto& b) { return a.first < b.first; });
+            for (auto& [x, y] : points)
+            {
+                x_values.push_back(x);
+                y_values.push_back(y);
+            }
+        };
+
+        std::vector<std::pair<float, float>> get_points() const
+        {
+            std::vector<std::pair<float, float>> points;
+            for (size_t i = 0; i < x_values.size(); i++)
+            {
+                points.emplace_back(x_values[i], y_values[i]);
+            }
+            return points;
+        }
+
+        float execute(float x, RandomGenerator& rand_gen) const override
+        {
+            size_t next = std::upper_bound(x_values.begin(), x_values.end(), x) - x_values.begin();
+            if (next == 0)
+                return y_values.front();
+            if (next == x_values.size())
+                return y_values.back();
+            float factor = (x - x_values[next - 1]) / std::max(1e-6f, x_values[next] - x_values[next - 1]);
+            return Geometry::lerp(y_values[next - 1], y_values[next], factor);
+        }
+
+        void execute_batch(const float* x, float* values, const size_t count, RandomGenerator& rand_gen) const override
+        {
+            for (size_t i = 0; i < count; i++)
+            {
+                values[i] = CurveProperty::execute(x[i], rand_gen);
+            }
+        }
+
+        void add_to_hash(HashBuilder& hash) const override
+        {
+            hash.add(std::string{ "curve" }).add((int)x_values.size());
+            for (size_t i = 0; i < x_values.size(); i++)
+            {
+                hash.add(x_values[i]).add(y_values[i]);
+            }
+        }
     };
     
     struct PropertyWrapper
     {
-        std::shared_ptr<Property> property;
+        std::shared_ptr<const Property> property; // shared by the copies of the wrapper
+        RandomGenerator rand_gen; // copied, so that functions copied to other threads don't share random streams
 
         PropertyWrapper() { property = std::make_shared<ConstantProperty>(1); };
 
-        template <class T>
+        // only properties are wrapped by these constructors, other wrappers are copied
+        template <class T, class = std::enable_if_t<std::is_base_of_v<Property, T>>>
         PropertyWrapper(T& property)
         {
             this->property = std::make_shared<T>(property);
         };
 
-        template <class T>
+        template <class T, class = std::enable_if_t<std::is_base_of_v<Property, T>>>
         PropertyWrapper(T&& property)
         {
             this->property = std::make_shared<T>(property);
@@ -88,7 +210,23 @@ namespace Mtree
 
         float execute(float x)
         {
-            return property->execute(x);
+            return property->execute(x, rand_gen);
+        };
+
+        void execute_batch(const float* x, float* values, const size_t count)
+        {
+            property->execute_batch(x, values, count, rand_gen);
+        };
+
+        void add_to_hash(HashBuilder& hash) const
+        {
+            property->add_to_hash(hash);
+        };
+
+        // the function using the property gives it a stream derived from its seed, so that random values are reproducible
+        void set_random_generator(const RandomGenerator& rand_gen)
+        {
+            this->rand_gen = rand_gen;
         };
     };
 }
\ No newline at end of file
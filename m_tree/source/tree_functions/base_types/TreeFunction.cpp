@@ -1,19 +1,38 @@
+#include <cstdint>
+#include <typeinfo>
 #include "TreeFunction.hpp"
 
 namespace Mtree
 {
-	void TreeFunction::execute_children(std::vector<Stem>& stems, int id)
-	{
-		int child_id = id;
-		for (std::shared_ptr<TreeFunction>& child : children)
-		{
-			child_id++;
-			child->execute(stems, child_id, id);
-		}
-	}
 	void TreeFunction::add_child(std::shared_ptr<TreeFunction> child)
 	{
 		children.push_back(child);
 	}
+
+	const std::vector<std::shared_ptr<TreeFunction>>& TreeFunction::get_children() const
+	{
+		return children;
+	}
+
+	std::size_t TreeFunction::get_hash() const
+	{
+		HashBuilder hash;
+		hash.add(std::string{ typeid(*this).name() }).add(seed);
+		add_parameters_to_hash(hash);
+		return hash.get();
+	}
+
+	void TreeFunction::reseed(int variant_seed)
+	{
+		std::uint32_t hash = (std::uint32_t)seed * 2654435761u ^ ((std::uint32_t)variant_seed + 0x9e3779b9u);
+		hash ^= hash >> 16;
+		hash *= 0x85ebca6bu;
+		hash ^= hash >> 13;
+		seed = (int)(hash & 0x7fffffff);
+		for (auto& child : children)
+		{
+			child->reseed(variant_seed);
+		}
+	}
 	
 }
\ No newline at end of file
@@ -1,7 +1,10 @@
 #pragma once
 #include <vector>
 #include "source/tree/Node.hpp"
+#include "source/tree/BranchIndex.hpp"
 #include "source/utilities/RandomGenerator.hpp"
+#include "source/utilities/HashBuilder.hpp"
+#include "source/utilities/Progress.hpp"
 
 namespace Mtree
 {
@@ -10,11 +13,29 @@ namespace Mtree
 	protected:
 		RandomGenerator rand_gen;
 		std::vector<std::shared_ptr<TreeFunction>> children;
-		void execute_children(std::vector<Stem>& stems, int id);
+		virtual void add_parameters_to_hash(HashBuilder& hash) const = 0;
 	public:
 		int seed = 42;
 
-		virtual void execute(std::vector<Stem>& stems, int id=0, int parent_id = 0) = 0;
+		// functions add the nodes they create to branches, and update progress or check it for cancellation in their long loops
+		virtual void execute(std::vector<Stem>& stems, BranchIndex& branches, int id=0, int parent_id = 0, const Progress& progress = Progress{}) = 0;
+		virtual std::shared_ptr<TreeFunction> clone() const = 0; // deep copy of the function and its children
+		virtual const char* get_name() const = 0; // name of the function type, as shown in profiles
 		void add_child(std::shared_ptr<TreeFunction> child);
+		const std::vector<std::shared_ptr<TreeFunction>>& get_children() const;
+		std::size_t get_hash() const; // identifies the type, seed and parameters of the function, children are not included
+		void reseed(int variant_seed); // derive new seeds for the function and its children, each variant seed gives a different tree
+
+	protected:
+		template <class T>
+		std::shared_ptr<TreeFunction> clone_as() const
+		{
+			auto copy = std::make_shared<T>(static_cast<const T&>(*this));
+			for (auto& child : copy->children)
+			{
+				child = child->clone();
+			}
+			return copy;
+		}
 	};
 }
\ No newline at end of file
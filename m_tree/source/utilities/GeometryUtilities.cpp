@@ -39,18 +39,18 @@ namespace Mtree {
 			return rot;
 		}
 
-		Vector3 random_vec_on_unit_sphere()
+		Vector3 random_vec_on_unit_sphere(RandomGenerator& rand_gen)
 		{
-			auto vec = Vector3{};
-			vec.setRandom();
+			auto vec = random_vec(rand_gen);
 			vec.normalize();
 			return vec;
 		}
 
-		Vector3 random_vec(float flatness)
+		Vector3 random_vec(RandomGenerator& rand_gen, float flatness)
 		{
-			auto vec = Vector3{};
-			vec.setRandom();
+			float x = rand_gen.get_minus_1_1();
+			float y = rand_gen.get_minus_1_1();
+			auto vec = Vector3{ x, y, rand_gen.get_minus_1_1() };
 			vec.z() *= (1 - flatness);
 			return vec;
 		}
@@ -3,6 +3,7 @@
 #include <Eigen/Core>
 #include <Eigen/Geometry>
 #include <cmath>
+#include "RandomGenerator.hpp"
 
 #ifndef M_PI
     #define M_PI 3.14159265358979323846
@@ -17,9 +18,9 @@ namespace Mtree { namespace Geometry
 
 	Eigen::Matrix3f get_look_at_rot(Vector3 direction);
 
-	Vector3 random_vec_on_unit_sphere();
+	Vector3 random_vec_on_unit_sphere(RandomGenerator& rand_gen);
 	
-	Vector3 random_vec(float flatness=0);
+	Vector3 random_vec(RandomGenerator& rand_gen, float flatness=0); // components in [-1, 1]
 
 	Vector3 get_orthogonal_vector(const Vector3& v);
 
@@ -0,0 +1,47 @@
+#pragma once
+#include <cstdint>
+#include <cstring>
+#include <string>
+
+namespace Mtree
+{
+	// FNV-1a style hash of a sequence of values, hashing a whole word at a time
+	class HashBuilder
+	{
+	private:
+		std::uint64_t hash = 14695981039346656037ull;
+
+	public:
+		HashBuilder& add(std::uint64_t value)
+		{
+			hash ^= value;
+			hash *= 1099511628211ull;
+			hash ^= hash >> 32; // let high bits of the value reach the low bits of the hash
+			return *this;
+		};
+
+		HashBuilder& add(int value)
+		{
+			return add((std::uint64_t)(std::uint32_t)value);
+		};
+
+		HashBuilder& add(float value)
+		{
+			std::uint32_t bits;
+			std::memcpy(&bits, &value, sizeof(bits));
+			return add((std::uint64_t)bits);
+		};
+
+		HashBuilder& add(const std::string& value)
+		{
+			for (char c : value)
+			{
+				hash ^= (unsigned char)c;
+				hash *= 1099511628211ull;
+			}
+			return add((std::uint64_t)value.size());
+		};
+
+		std::size_t get() const { return (std::size_t)hash; };
+	};
+}
@@ -19,11 +19,23 @@ namespace Mtree
 			return length;
 		}
 
+		float get_branch_length(const NodeSelection& branch)
+		{
+			const NodeSelectionElement& last = branch.back();
+			return last.length_in_branch + get_branch_length(*last.node);
+		}
+
+		void add_to_branch(NodeSelection& branch, Node& node, const Vector3& node_position)
+		{
+			float length_in_branch = branch.empty() ? 0 : branch.back().length_in_branch + branch.back().node->length;
+			branch.push_back(NodeSelectionElement{ node, node_position, length_in_branch });
+		}
+
 		void select_from_tree_rec(BranchSelection& selection, Node& node, const Vector3& node_position, int id)
 		{
 			if (node.creator_id == id)
 			{
-				selection[selection.size() - 1].push_back(NodeSelectionElement{node, node_position});
+				add_to_branch(selection.back(), node, node_position);
 			}
 			bool first_child = true;
 			for (auto& child : node.children)
@@ -9,7 +9,8 @@ namespace Mtree {
 		{
 			Node* node;
 			Vector3 node_position;
-			NodeSelectionElement(Node& node, const Vector3& position) : node(&node), node_position(position) {};
+			float length_in_branch; // length of the selected nodes before this one in the branch
+			NodeSelectionElement(Node& node, const Vector3& position, float length_in_branch = 0) : node(&node), node_position(position), length_in_branch(length_in_branch) {};
 		};
 
 		using NodeSelection = std::vector<NodeSelectionElement>;
@@ -17,6 +18,8 @@ namespace Mtree {
 
 
 		float get_branch_length(Node& branch_origin);
+		float get_branch_length(const NodeSelection& branch); // length from the first selected node, only walks the nodes after the last selected one
+		void add_to_branch(NodeSelection& branch, Node& node, const Vector3& node_position);
 		BranchSelection select_from_tree(std::vector<Stem>& stems, int id);
 		Vector3 get_position_in_node(const Vector3& node_position, const Node& node, const float factor);
 
@@ -0,0 +1,30 @@
+#include "Profiling.hpp"
+#ifdef _WIN32
+	#define NOMINMAX
+	#include <windows.h>
+	#include <psapi.h>
+#else
+	#include <sys/resource.h>
+#endif
+
+namespace Mtree
+{
+	std::size_t get_peak_memory_usage()
+	{
+#ifdef _WIN32
+		PROCESS_MEMORY_COUNTERS counters;
+		if (GetProcessMemoryInfo(GetCurrentProcess(), &counters, sizeof(counters)))
+			return counters.PeakWorkingSetSize;
+		return 0;
+#else
+		rusage usage;
+		if (getrusage(RUSAGE_SELF, &usage) != 0)
+			return 0;
+	#ifdef __APPLE__
+		return (std::size_t)usage.ru_maxrss; // bytes
+	#else
+		return (std::size_t)usage.ru_maxrss * 1024; // kilobytes
+	#endif
+#endif
+	}
+}
@@ -0,0 +1,27 @@
+#pragma once
+#include <chrono>
+#include <cstddef>
+
+namespace Mtree
+{
+	// adds the seconds spent in its scope to a counter, does nothing when the counter is null
+	class ScopedTimer
+	{
+	private:
+		float* total;
+		std::chrono::steady_clock::time_point start;
+	public:
+		ScopedTimer(float* total) : total(total)
+		{
+			if (total != nullptr)
+				start = std::chrono::steady_clock::now();
+		};
+		~ScopedTimer()
+		{
+			if (total != nullptr)
+				*total += std::chrono::duration<float>(std::chrono::steady_clock::now() - start).count();
+		};
+	};
+
+	std::size_t get_peak_memory_usage(); // peak resident memory of the process in bytes, 0 when unknown
+}
@@ -0,0 +1,51 @@
+#include <algorithm>
+#include "Progress.hpp"
+
+namespace Mtree
+{
+	Progress::Progress(ProgressCallback callback, std::shared_ptr<CancellationToken> cancellation_token)
+	{
+		if (callback || cancellation_token)
+		{
+			shared = std::make_shared<Shared>();
+			shared->callback = callback;
+			shared->cancellation_token = cancellation_token;
+		}
+	}
+
+	Progress Progress::get_step(const std::string& phase, float begin, float end) const
+	{
+		Progress step = *this;
+		if (!phase.empty())
+			step.phase = phase;
+		step.begin = this->begin + begin * (this->end - this->begin);
+		step.end = this->begin + end * (this->end - this->begin);
+		return step;
+	}
+
+	void Progress::update(float fraction) const
+	{
+		check_cancelled();
+		if (shared == nullptr || !shared->callback)
+			return;
+		float total_fraction = begin + std::min(std::max(fraction, 0.f), 1.f) * (end - begin);
+		std::lock_guard<std::mutex> lock{ shared->mutex };
+		bool is_new_phase = phase != shared->reported_phase;
+		if (!is_new_phase && total_fraction < shared->reported_fraction + .01f && !(total_fraction == 1 && shared->reported_fraction < 1))
+			return;
+		shared->reported_phase = phase;
+		shared->reported_fraction = total_fraction;
+		shared->callback(phase, total_fraction);
+	}
+
+	void Progress::check_cancelled() const
+	{
+		if (shared != nullptr && shared->cancellation_token != nullptr && shared->cancellation_token->is_cancelled())
+			throw OperationCancelled{};
+	}
+
+	bool Progress::has_callback() const
+	{
+		return shared != nullptr && (bool)shared->callback;
+	}
+}
\ No newline at end of file
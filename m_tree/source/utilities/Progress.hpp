@@ -0,0 +1,56 @@
+#pragma once
+#include <atomic>
+#include <memory>
+#include <mutex>
+#include <string>
+#include <functional>
+#include <stdexcept>
+
+namespace Mtree
+{
+	// can be cancelled from any thread, the computations it was given to stop at their next safe point
+	class CancellationToken
+	{
+	private:
+		std::atomic<bool> cancelled{ false };
+	public:
+		void cancel() { cancelled = true; };
+		bool is_cancelled() const { return cancelled; };
+	};
+
+	class OperationCancelled : public std::runtime_error
+	{
+	public:
+		OperationCancelled() : std::runtime_error("operation cancelled") {};
+	};
+
+	using ProgressCallback = std::function<void(const std::string& phase, float fraction)>;
+
+	// optional progress callback and cancellation token of a long computation.
+	// Copies share the callback and the token, a step reports its progress within a range of the progress it was made from.
+	// The callback can be called from several threads, but never concurrently, and only when the progress advanced by 1% or more
+	class Progress
+	{
+	private:
+		struct Shared
+		{
+			ProgressCallback callback;
+			std::shared_ptr<CancellationToken> cancellation_token;
+			std::mutex mutex;
+			std::string reported_phase;
+			float reported_fraction = -1;
+		};
+		std::shared_ptr<Shared> shared;
+		std::string phase;
+		float begin = 0;
+		float end = 1;
+
+	public:
+		Progress() {};
+		Progress(ProgressCallback callback, std::shared_ptr<CancellationToken> cancellation_token = nullptr);
+		Progress get_step(const std::string& phase, float begin, float end) const; // begin and end are fractions of this progress, an empty phase keeps the current one
+		void update(float fraction) const; // report the fraction of the step that is done, throw OperationCancelled when cancelled
+		void check_cancelled() const; // throw OperationCancelled when cancelled
+		bool has_callback() const;
+	};
+}
\ No newline at end of file
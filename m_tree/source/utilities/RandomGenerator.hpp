@@ -1,15 +1,35 @@
 #pragma once
-#include <random>
+#include <cstdint>
 namespace Mtree
 {
+	// counter based generator: the n-th number of a stream only depends on the stream key and n.
+	// Generators don't share any state, and independent streams can be split from a generator (per node, per branch...),
+	// so that the result doesn't depend on the order in which the streams are used.
 	class RandomGenerator
 	{
 	private:
-		std::mt19937 engine;
-		std::uniform_real_distribution<float> uniform;
+		std::uint64_t key = 0;
+		std::uint64_t counter = 0;
+
+		static std::uint64_t mix(std::uint64_t x) // splitmix64
+		{
+			x += 0x9e3779b97f4a7c15ull;
+			x = (x ^ (x >> 30)) * 0xbf58476d1ce4e5b9ull;
+			x = (x ^ (x >> 27)) * 0x94d049bb133111ebull;
+			return x ^ (x >> 31);
+		};
 	public:
-		RandomGenerator() { uniform = std::uniform_real_distribution<float>{ 0.0f,1.0f }; };
-		void set_seed(int seed) { engine = std::mt19937{ (unsigned int) seed }; srand(seed); };
-		float get_0_1() { return uniform(engine); };
+		RandomGenerator() {};
+		RandomGenerator(int seed) { set_seed(seed); };
+		void set_seed(int seed) { key = mix((std::uint32_t)seed); counter = 0; };
+		RandomGenerator split(std::uint64_t stream_id) const // independent stream, identified by stream_id
+		{
+			RandomGenerator stream;
+			stream.key = mix(key ^ mix(stream_id));
+			return stream;
+		};
+		std::uint64_t get_uint64() { return mix(key + 0x9e3779b97f4a7c15ull * counter++); };
+		float get_0_1() { return (get_uint64() >> 40) * (1.0f / (1 << 24)); };
+		float get_minus_1_1() { return get_0_1() * 2 - 1; };
 	};
 }
\ No newline at end of file
@@ -0,0 +1,106 @@
+#include <algorithm>
+#include "ThreadPool.hpp"
+
+namespace Mtree
+{
+	ThreadPool::ThreadPool(int thread_count)
+	{
+		if (thread_count <= 0)
+			thread_count = get_hardware_thread_count();
+		for (int i = 0; i < thread_count; i++)
+		{
+			workers.emplace_back(&ThreadPool::worker_loop, this);
+		}
+	}
+
+	ThreadPool::~ThreadPool()
+	{
+		{
+			std::lock_guard<std::mutex> lock{ mutex };
+			stopping = true;
+		}
+		task_available.notify_all();
+		for (auto& worker : workers)
+		{
+			worker.join();
+		}
+	}
+
+	void ThreadPool::submit(std::function<void()> task)
+	{
+		{
+			std::lock_guard<std::mutex> lock{ mutex };
+			tasks.push(std::move(task));
+			unfinished_tasks++;
+		}
+		task_available.notify_one();
+	}
+
+	void ThreadPool::wait()
+	{
+		std::unique_lock<std::mutex> lock{ mutex };
+		all_tasks_done.wait(lock, [this] { return unfinished_tasks == 0; });
+		if (first_exception != nullptr)
+		{
+			auto exception = first_exception;
+			first_exception = nullptr;
+			std::rethrow_exception(exception);
+		}
+	}
+
+	void ThreadPool::parallel_for(const int begin, const int end, const std::function<void(int, int)>& function)
+	{
+		int chunk_count = get_thread_count() * 4; // more chunks than threads to balance uneven work
+		int chunk_size = std::max(1, (end - begin + chunk_count - 1) / chunk_count);
+		for (int chunk_begin = begin; chunk_begin < end; chunk_begin += chunk_size)
+		{
+			int chunk_end = std::min(end, chunk_begin + chunk_size);
+			submit([&function, chunk_begin, chunk_end]() { function(chunk_begin, chunk_end); });
+		}
+		wait();
+	}
+
+	int ThreadPool::get_thread_count() const
+	{
+		return (int)workers.size();
+	}
+
+	int ThreadPool::get_hardware_thread_count()
+	{
+		return std::max(1, (int)std::thread::hardware_concurrency());
+	}
+
+	void ThreadPool::worker_loop()
+	{
+		while (true)
+		{
+			std::function<void()> task;
+			{
+				std::unique_lock<std::mutex> lock{ mutex };
+				task_available.wait(lock, [this] { return stopping || !tasks.empty(); });
+				if (tasks.empty()) // only reached when stopping
+					return;
+				task = std::move(tasks.front());
+				tasks.pop();
+			}
+			try
+			{
+				task();
+			}
+			catch (...)
+			{
+				std::lock_guard<std::mutex> lock{ mutex };
+				if (first_exception == nullptr)
+					first_exception = std::current_exception();
+			}
+			bool done;
+			{
+				std::lock_guard<std::mutex> lock{ mutex };
+				unfinished_tasks--;
+				done = unfinished_tasks == 0;
+			}
+			if (done)
+				all_tasks_done.notify_all();
+		}
+	}
+}
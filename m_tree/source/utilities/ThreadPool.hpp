@@ -0,0 +1,33 @@
+#pragma once
+#include <vector>
+#include <queue>
+#include <thread>
+#include <mutex>
+#include <condition_variable>
+#include <functional>
+#include <exception>
+
+namespace Mtree
+{
+	class ThreadPool
+	{
+	private:
+		std::vector<std::thread> workers;
+		std::queue<std::function<void()>> tasks;
+		std::mutex mutex;
+		std::condition_variable task_available;
+		std::condition_variable all_tasks_done;
+		int unfinished_tasks = 0;
+		bool stopping = false;
+		std::exception_ptr first_exception = nullptr;
+		void worker_loop();
+	public:
+		ThreadPool(int thread_count = 0); // a thread count of 0 uses one thread per hardware thread
+		~ThreadPool();
+		void submit(std::function<void()> task); // can be called from within a running task
+		void wait(); // block until every submitted task is done, rethrow the first exception raised by a task
+		void parallel_for(const int begin, const int end, const std::function<void(int, int)>& function); // call function on sub ranges of [begin, end) and wait for completion
+		int get_thread_count() const;
+		static int get_hardware_thread_count();
+	};
+}
@@ -6,4 +6,7 @@ import m_tree
 tree = m_tree.Tree()
 trunk_function = m_tree.TrunkFunction()
 tree.set_trunk_function(trunk_function)
+tree.execute_functions()
+mesh = m_tree.ManifoldMesher().mesh_tree(tree)
+print(f"{tree.get_node_count()} nodes, {len(mesh.get_vertices()) // 3} vertices")
 
@@ -1,30 +1,449 @@
 #include <iostream>
+#include <cstring>
+#include <map>
+#include <set>
+#include <sstream>
+#include <fstream>
+#include <cstdio>
+#include <thread>
+#include <atomic>
 
 #include "source/mesh/Mesh.hpp"
+#include "source/mesh/MeshExport.hpp"
 #include "source/tree/Tree.hpp"
+#include "source/tree/Skeleton.hpp"
 #include "source/tree_functions/TrunkFunction.hpp"
 #include "source/tree_functions/BranchFunction.hpp"
 #include "source/tree_functions/GrowthFunction.hpp"
+#include "source/tree_functions/LeavesFunction.hpp"
 #include "source/meshers/splines_mesher/BasicMesher.hpp"
 #include "source/meshers/manifold_mesher/ManifoldMesher.hpp"
+#include "source/forest/ForestGenerator.hpp"
 
 
 using namespace Mtree;
 
+template <typename T>
+bool same_bytes(const std::vector<T>& a, const std::vector<T>& b)
+{
+    return a.size() == b.size() && std::memcmp(a.data(), b.data(), a.size() * sizeof(T)) == 0;
+}
+
+bool same_mesh(const Mesh& a, const Mesh& b)
+{
+    for (auto& [name, attribute] : a.attributes)
+    {
+        auto* float_attribute = dynamic_cast<Attribute<float>*>(attribute.get());
+        if (float_attribute != nullptr && !same_bytes(float_attribute->data, static_cast<Attribute<float>&>(*b.attributes.at(name)).data))
+            return false;
+    }
+    return same_bytes(a.vertices, b.vertices) && same_bytes(a.uvs, b.uvs) && same_bytes(a.polygons, b.polygons) && same_bytes(a.uv_loops, b.uv_loops);
+}
+
 int main()
 {
     std::cout<<"hello world"<<std::endl;
 
     auto trunk = std::make_shared<TrunkFunction>();
     auto branch = std::make_shared<BranchFunction>();
+    auto branch_secondary = std::make_shared<BranchFunction>();
     trunk->add_child(branch);
+    branch->add_child(branch_secondary);
+    branch_secondary->length = ConstantProperty{ 2 };
     branch->start_radius = ConstantProperty{ 1.5 };
     //trunk->length = 0.001;
     Tree tree(trunk);
     tree.execute_functions();
     ManifoldMesher mesher;
     mesher.radial_resolution = 32;
-    mesher.mesh_tree(tree);
+    Mesh mesh = mesher.mesh_tree(tree);
+
+    mesher.thread_count = 4;
+    Mesh parallel_mesh = mesher.mesh_tree(tree);
+    if (!same_mesh(mesh, parallel_mesh))
+    {
+        std::cout << "parallel meshing differs from serial meshing" << std::endl;
+        return 1;
+    }
+
+    tree.store_snapshots = true;
+    tree.execute_functions();
+    branch_secondary->end_radius = .01f;
+    Tree regrown_tree{ trunk };
+    regrown_tree.inherit_snapshots(tree);
+    regrown_tree.execute_functions();
+    Tree full_tree{ trunk };
+    full_tree.execute_functions();
+    mesher.thread_count = 1;
+    if (!same_mesh(mesher.mesh_tree(regrown_tree), mesher.mesh_tree(full_tree)))
+    {
+        std::cout << "regrowing from a snapshot differs from a full growth" << std::endl;
+        return 1;
+    }
+
+    Skeleton skeleton{ full_tree.get_stems() };
+    if (skeleton.get_node_count() != full_tree.get_node_count() || skeleton.stem_count != (int)full_tree.get_stems().size())
+    {
+        std::cout << "skeleton doesn't match the tree nodes" << std::endl;
+        return 1;
+    }
+    BranchIndex branch_index;
+    branch_index.rebuild(full_tree.get_stems());
+    for (int id = 0; id < 3; id++)
+    {
+        // same nodes, positions and branch lengths as a search of the whole tree, branches can be in another order
+        std::map<Node*, std::pair<Vector3, float>> indexed_nodes, searched_nodes;
+        for (auto& branch : branch_index.get_branches(id))
+            for (auto& element : branch)
+                indexed_nodes[element.node] = { element.node_position, NodeUtilities::get_branch_length(branch) };
+        for (auto& branch : NodeUtilities::select_from_tree(full_tree.get_stems(), id))
+            for (auto& element : branch)
+                searched_nodes[element.node] = { element.node_position, NodeUtilities::get_branch_length(*branch[0].node) };
+        if (indexed_nodes.size() == 0 || indexed_nodes != searched_nodes)
+        {
+            std::cout << "branch index differs from a search of the tree" << std::endl;
+            return 1;
+        }
+    }
+
+    // only the modified function is executed again, and all nodes are counted
+    auto& function_profiles = regrown_tree.get_function_profiles();
+    int counted_nodes = 0;
+    for (auto& [creator_id, count] : regrown_tree.get_node_counts_by_creator())
+        counted_nodes += count;
+    if (function_profiles.size() != 3 || !function_profiles[1].from_snapshot || function_profiles[2].from_snapshot || function_profiles[2].name != "BranchFunction" || counted_nodes != regrown_tree.get_node_count())
+    {
+        std::cout << "wrong growth profile" << std::endl;
+        return 1;
+    }
+
+    // executing a function doesn't change its hash, so a second tree grown from the same functions restores all of them
+    auto growth_trunk = std::make_shared<TrunkFunction>();
+    auto growth = std::make_shared<GrowthFunction>();
+    growth->iterations = 3;
+    growth_trunk->add_child(growth);
+    Tree growth_tree{ growth_trunk };
+    growth_tree.store_snapshots = true;
+    growth_tree.execute_functions();
+    Tree restored_growth_tree{ growth_trunk };
+    restored_growth_tree.inherit_snapshots(growth_tree);
+    restored_growth_tree.execute_functions();
+    for (auto& profile : restored_growth_tree.get_function_profiles())
+    {
+        if (!profile.from_snapshot)
+        {
+            std::cout << "executing a function changed its hash" << std::endl;
+            return 1;
+        }
+    }
+    mesher.detailed_profiling = true;
+    Mesh profiled_mesh = mesher.mesh_tree(full_tree);
+    MeshingProfile meshing_profile = mesher.get_profile();
+    if (meshing_profile.vertex_count != (int)profiled_mesh.vertices.size() || meshing_profile.polygon_count != (int)profiled_mesh.polygons.size() || meshing_profile.ring_time <= 0 || meshing_profile.bridge_time <= 0)
+    {
+        std::cout << "wrong meshing profile" << std::endl;
+        return 1;
+    }
+    mesher.detailed_profiling = false;
+
+    // a mesher can be copied while another thread is meshing with it, the copy gets the smoothing data once it is stored
+    ManifoldMesher busy_mesher;
+    std::atomic<bool> meshing_done{ false };
+    std::thread meshing_thread{ [&]() { busy_mesher.mesh_tree(full_tree); meshing_done = true; } };
+    while (!meshing_done)
+    {
+        ManifoldMesher copied_mesher = busy_mesher;
+        copied_mesher = busy_mesher;
+    }
+    meshing_thread.join();
+    ManifoldMesher finished_mesher = busy_mesher;
+    if (finished_mesher.get_profile().vertex_count != busy_mesher.get_profile().vertex_count)
+    {
+        std::cout << "wrong copy of a meshing mesher" << std::endl;
+        return 1;
+    }
+
+    BasicMesher basic_mesher;
+    basic_mesher.mesh_tree(full_tree);
+
+    mesher.smooth_iterations = 0;
+    Mesh unsmoothed_mesh = mesher.mesh_tree(full_tree);
+    Mesh chunked_mesh;
+    auto chunks = mesher.mesh_tree_chunks(full_tree, 1000);
+    MeshChunk chunk;
+    while (chunks->next(chunk))
+    {
+        if (chunk.vertex_offset != (int)chunked_mesh.vertices.size() || chunk.uv_offset != (int)chunked_mesh.uvs.size())
+        {
+            std::cout << "wrong chunk offsets" << std::endl;
+            return 1;
+        }
+        chunked_mesh.vertices.insert(chunked_mesh.vertices.end(), chunk.mesh.vertices.begin(), chunk.mesh.vertices.end());
+        chunked_mesh.uvs.insert(chunked_mesh.uvs.end(), chunk.mesh.uvs.begin(), chunk.mesh.uvs.end());
+        chunked_mesh.polygons.insert(chunked_mesh.polygons.end(), chunk.mesh.polygons.begin(), chunk.mesh.polygons.end());
+        chunked_mesh.uv_loops.insert(chunked_mesh.uv_loops.end(), chunk.mesh.uv_loops.begin(), chunk.mesh.uv_loops.end());
+    }
+    if (!same_mesh(chunked_mesh, unsmoothed_mesh))
+    {
+        std::cout << "chunked meshing differs from meshing the whole tree" << std::endl;
+        return 1;
+    }
+
+    // thin branches get smaller rings, stitched to the larger ones without degenerate quads
+    mesher.target_edge_length = .05f;
+    Mesh adaptive_mesh = mesher.mesh_tree(full_tree);
+    mesher.thread_count = 3;
+    Mesh parallel_adaptive_mesh = mesher.mesh_tree(full_tree);
+    mesher.thread_count = 1;
+    mesher.target_edge_length = 0;
+    bool has_degenerate_quad = false;
+    for (auto& polygon : adaptive_mesh.polygons)
+        for (int i = 0; i < 4; i++)
+            has_degenerate_quad |= polygon[i] == polygon[(i + 1) % 4];
+    if (!same_mesh(adaptive_mesh, parallel_adaptive_mesh) || adaptive_mesh.vertices.size() >= unsmoothed_mesh.vertices.size() || has_degenerate_quad)
+    {
+        std::cout << "wrong adaptive ring resolution" << std::endl;
+        return 1;
+    }
+
+    // rings smaller than 4 vertices can't hold the base of a side branch
+    ManifoldMesher small_ring_mesher;
+    small_ring_mesher.radial_resolution = 8;
+    small_ring_mesher.min_radial_resolution = 2;
+    small_ring_mesher.target_edge_length = .5f;
+    small_ring_mesher.thread_count = 1;
+    Mesh small_ring_mesh = small_ring_mesher.mesh_tree(full_tree);
+    if (small_ring_mesh.vertices.empty())
+    {
+        std::cout << "wrong minimum ring size" << std::endl;
+        return 1;
+    }
+
+    // a level removing nothing gives the full mesh, coarser levels have fewer vertices
+    std::vector<LodLevel> levels{ {32, 0, 0, 0}, {16, .05f, 10, 0}, {8, .1f, 20, 0} };
+    for (int thread_count : {1, 3})
+    {
+        mesher.thread_count = thread_count;
+        std::vector<Mesh> lods = mesher.mesh_tree_lods(full_tree, levels);
+        if (!same_mesh(lods[0], unsmoothed_mesh) || lods[1].vertices.size() >= lods[0].vertices.size() || lods[2].vertices.size() >= lods[1].vertices.size())
+        {
+            std::cout << "wrong levels of detail" << std::endl;
+            return 1;
+        }
+    }
+    mesher.thread_count = 1;
+
+    std::map<std::string, float> reported_fractions;
+    Progress progress{ [&](const std::string& phase, float fraction) { reported_fractions[phase] = fraction; } };
+    Tree reported_tree{ trunk };
+    reported_tree.execute_functions(progress);
+    mesher.smooth_iterations = 2;
+    mesher.mesh_tree(reported_tree, progress);
+    if (reported_fractions != std::map<std::string, float>{ {"growth", 1.f}, {"meshing", 1.f}, {"smoothing", 1.f} })
+    {
+        std::cout << "progress is not reported up to the end of each phase" << std::endl;
+        return 1;
+    }
+    auto cancellation_token = std::make_shared<CancellationToken>();
+    cancellation_token->cancel();
+    for (int thread_count : {1, 4})
+    {
+        mesher.thread_count = thread_count;
+        try
+        {
+            mesher.mesh_tree(reported_tree, Progress{ nullptr, cancellation_token });
+            std::cout << "cancelled meshing wasn't stopped" << std::endl;
+            return 1;
+        }
+        catch (const OperationCancelled&) {}
+    }
+    try
+    {
+        reported_tree.execute_functions(Progress{ nullptr, cancellation_token });
+        std::cout << "cancelled growth wasn't stopped" << std::endl;
+        return 1;
+    }
+    catch (const OperationCancelled&) {}
+
+    // properties evaluated at once give the same values as one at a time, copies of a wrapper share the property and not the stream
+    std::vector<float> factors{ -.5f, 0, .2f, .5f, .7f, 1, 1.5f };
+    for (int i = 0; i < 1000; i++)
+        factors.push_back(i * .003f);
+    for (PropertyWrapper property : { PropertyWrapper{ ConstantProperty{ 2 } }, PropertyWrapper{ RandomProperty{ 1, 3 } }, PropertyWrapper{ SimpleCurveProperty{ 0, 1, 9, 2, 2 } },
+        PropertyWrapper{ SimpleCurveProperty{ .1f, 3, 9, 2, 1 } }, PropertyWrapper{ CurveProperty{ {{.5f, 6}, {0, 9}, {1, 2}} } } })
+    {
+        property.set_random_generator(RandomGenerator{ 5 });
+        PropertyWrapper copy = property;
+        std::vector<float> batch_values(factors.size());
+        property.execute_batch(factors.data(), batch_values.data(), factors.size());
+        bool same_values = copy.property == property.property;
+        for (size_t i = 0; i < factors.size(); i++)
+            same_values = same_values && copy.execute(factors[i]) == batch_values[i];
+        if (!same_values)
+        {
+            std::cout << "batched property evaluation differs" << std::endl;
+            return 1;
+        }
+    }
+    CurveProperty curve{ {{.5f, 6}, {0, 9}, {1, 2}} };
+    RandomGenerator curve_generator;
+    if (curve.execute(-1, curve_generator) != 9 || curve.execute(.25f, curve_generator) != 7.5f || curve.execute(.75f, curve_generator) != 4 || curve.execute(2, curve_generator) != 2)
+    {
+        std::cout << "wrong curve property" << std::endl;
+        return 1;
+    }
+
+    // an instanced layer only grows its prototypes, each origin becomes a single node, and snapshots keep the prototypes
+    auto instanced_trunk = std::make_shared<TrunkFunction>();
+    auto instanced_branch = std::make_shared<BranchFunction>();
+    instanced_trunk->add_child(instanced_branch);
+    instanced_branch->length = RandomProperty{ 2, 6 };
+    instanced_branch->prototype_count = 4;
+    Tree instanced_tree{ instanced_trunk };
+    instanced_tree.store_snapshots = true;
+    instanced_tree.execute_functions();
+    Tree restored_tree{ instanced_trunk };
+    restored_tree.inherit_snapshots(instanced_tree);
+    restored_tree.execute_functions();
+    std::vector<BranchInstance> instances = instanced_tree.get_branch_instances();
+    std::vector<BranchInstance> restored_instances = restored_tree.get_branch_instances();
+    std::vector<Mesh> prototype_meshes = mesher.mesh_prototypes(instanced_tree);
+    std::vector<Mesh> restored_prototype_meshes = mesher.mesh_prototypes(restored_tree);
+    int unscaled_instance_count = 0;
+    for (auto& instance : instances)
+        unscaled_instance_count += instance.scale == 1;
+    bool same_instances = instances.size() == restored_instances.size() && prototype_meshes.size() == restored_prototype_meshes.size();
+    for (size_t i = 0; same_instances && i < instances.size(); i++)
+        same_instances = instances[i].prototype_index == restored_instances[i].prototype_index && instances[i].get_transform() == restored_instances[i].get_transform();
+    for (size_t i = 0; same_instances && i < prototype_meshes.size(); i++)
+        same_instances = prototype_meshes[i].vertices.size() > 0 && same_mesh(prototype_meshes[i], restored_prototype_meshes[i]);
+    if (prototype_meshes.size() != 4 || (int)instances.size() != instanced_tree.get_node_counts_by_creator()[1] || unscaled_instance_count < 4 || !same_instances)
+    {
+        std::cout << "wrong instanced branches" << std::endl;
+        return 1;
+    }
+
+    // edges are unique and join each polygon corner to the next one, and the topology hash ignores the shape of the mesh
+    ManifoldMesher edge_mesher;
+    edge_mesher.radial_resolution = 8;
+    Mesh edge_mesh = edge_mesher.mesh_tree(tree);
+    std::vector<int> loop_edges;
+    std::vector<std::array<int, 2>> edges = edge_mesh.get_edges(loop_edges);
+    std::set<std::array<int, 2>> unique_edges{ edges.begin(), edges.end() };
+    bool valid_edges = unique_edges.size() == edges.size() && loop_edges.size() == edge_mesh.polygons.size() * 4;
+    for (size_t corner = 0; valid_edges && corner < loop_edges.size(); corner++)
+    {
+        auto& polygon = edge_mesh.polygons[corner / 4];
+        int vertex = polygon[corner % 4];
+        int next_vertex = polygon[(corner + 1) % 4];
+        valid_edges = edges[loop_edges[corner]] == std::array<int, 2>{ std::min(vertex, next_vertex), std::max(vertex, next_vertex) };
+    }
+    edge_mesher.smooth_iterations = 0;
+    Mesh unsmoothed_edge_mesh = edge_mesher.mesh_tree(tree);
+    edge_mesher.radial_resolution = 12;
+    Mesh finer_edge_mesh = edge_mesher.mesh_tree(tree);
+    if (!valid_edges || same_bytes(edge_mesh.vertices, unsmoothed_edge_mesh.vertices) || edge_mesh.get_topology_hash() != unsmoothed_edge_mesh.get_topology_hash()
+        || edge_mesh.get_topology_hash() == finer_edge_mesh.get_topology_hash())
+    {
+        std::cout << "wrong mesh edges or topology hash" << std::endl;
+        return 1;
+    }
+
+    // exported meshes have the announced size, memory mapped files are the same as streamed ones, and raw meshes read back unchanged
+    for (MeshFormat format : { MeshFormat::Ply, MeshFormat::Glb, MeshFormat::Raw })
+    {
+        std::ostringstream exported;
+        write_mesh(edge_mesh, format, exported);
+        std::string path = "exported_mesh.tmp";
+        write_mesh(edge_mesh, format, path, true);
+        std::ifstream mapped_file{ path, std::ios::binary };
+        std::string mapped{ std::istreambuf_iterator<char>(mapped_file), std::istreambuf_iterator<char>() };
+        mapped_file.close();
+        std::remove(path.c_str());
+        bool valid_export = exported.str().size() == get_export_size(edge_mesh, format) && mapped == exported.str();
+        if (valid_export && format == MeshFormat::Raw)
+        {
+            std::istringstream raw_stream{ exported.str() };
+            valid_export = same_mesh(read_raw_mesh(raw_stream), edge_mesh);
+        }
+        if (!valid_export)
+        {
+            std::cout << "wrong exported mesh" << std::endl;
+            return 1;
+        }
+    }
+
+    // leaves face along their normal, are placed again identically, and instanced branches get the leaves of their prototype
+    LeavesFunction leaves_function;
+    leaves_function.max_radius = 1;
+    LeafInstances leaves = leaves_function.execute(tree);
+    bool valid_leaves = leaves.count > 0 && leaves.buffer == leaves_function.execute(tree).buffer && (int)leaves.buffer.size() == leaves.count * LeafInstances::floats_per_leaf;
+    for (int i = 0; valid_leaves && i < leaves.count; i++)
+    {
+        float* rotation = leaves.rotations() + 4 * i;
+        Eigen::Quaternionf leaf_rotation{ rotation[0], rotation[1], rotation[2], rotation[3] };
+        valid_leaves = std::abs(leaf_rotation.norm() - 1) < 1e-4f && (leaf_rotation * Vector3::UnitZ() - Eigen::Map<Vector3>(leaves.normals() + 3 * i)).norm() < 1e-4f && leaves.scales()[i] > 0;
+    }
+    LeafInstances instanced_leaves = leaves_function.execute(instanced_tree);
+    // the leaves of the instances come last, copied from their prototype and scaled with the instance
+    Prototypes leaf_prototypes = instanced_tree.get_prototypes();
+    std::vector<LeafInstances> prototype_leaves;
+    for (size_t i = 0; i < leaf_prototypes.size(); i++)
+    {
+        std::vector<Stem> prototype_stems;
+        prototype_stems.push_back(leaf_prototypes[i]->stem.clone());
+        prototype_leaves.push_back(leaves_function.get_leaves(Skeleton{ prototype_stems }, RandomGenerator{ leaves_function.seed }.split(i + 1)));
+    }
+    int instance_leaf = instanced_leaves.count;
+    for (auto& instance : instances)
+        instance_leaf -= prototype_leaves[instance.prototype_index].count;
+    valid_leaves = valid_leaves && instance_leaf >= 0;
+    for (auto& instance : instances)
+    {
+        LeafInstances& source = prototype_leaves[instance.prototype_index];
+        for (int i = 0; valid_leaves && i < source.count; i++)
+            valid_leaves = instanced_leaves.scales()[instance_leaf + i] == source.scales()[i] * instance.scale;
+        instance_leaf += source.count;
+    }
+    leaves_function.density = 0;
+    if (!valid_leaves || instanced_leaves.count <= (int)instances.size() || leaves_function.execute(tree).count != 0)
+    {
+        std::cout << "wrong leaves" << std::endl;
+        return 1;
+    }
+
+    // trees grown concurrently are the same as trees grown one after the other
+    branch->start_angle = RandomProperty{ 30, 60 };
+    ForestGenerator forest;
+    forest.thread_count = 3;
+    forest.mesher.radial_resolution = 8;
+    std::vector<int> seeds{ 1, 2, 3 };
+    std::vector<Mesh> forest_meshes = forest.generate(trunk, seeds);
+    for (size_t i = 0; i < seeds.size(); i++)
+    {
+        auto variant = trunk->clone();
+        variant->reseed(seeds[i]);
+        Tree variant_tree{ variant };
+        variant_tree.execute_functions();
+        if (!same_mesh(forest.mesher.mesh_tree(variant_tree), forest_meshes[i]))
+        {
+            std::cout << "tree grown in parallel differs from the same tree grown alone" << std::endl;
+            return 1;
+        }
+    }
+
+    // a cancelled stream only returns the trees that were finished
+    auto cancelled_forest = forest.stream(trunk, std::vector<int>(20, 1));
+    cancelled_forest->cancel();
+    ForestResult forest_result;
+    while (cancelled_forest->next(forest_result))
+    {
+        if (forest_result.mesh.vertices.empty())
+        {
+            std::cout << "cancelled stream returned a skipped tree" << std::endl;
+            return 1;
+        }
+    }
 
     return 0;
-}
\ No newline at end of file
+}
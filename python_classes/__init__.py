@@ -1,11 +1,14 @@
 from . import operators
 from . import nodes
+from . import generation
 
 def register():
     operators.register()
     nodes.register()
+    generation.register()
 
 
 def unregister():
+    generation.unregister()
     operators.unregister()
     nodes.unregister()
\ No newline at end of file
@@ -0,0 +1,10 @@
+from . import rebuild_scheduler
+from . import tree_cache
+
+
+def register():
+    pass
+
+def unregister():
+    rebuild_scheduler.scheduler.cancel_all()
+    tree_cache.tree_cache.clear()
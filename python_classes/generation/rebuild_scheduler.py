@@ -0,0 +1,150 @@
+import time
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import bpy
+from ... import m_tree
+from .tree_cache import tree_cache
+
+
+class BuildJob:
+    def __init__(self, key, generation, tree_key, tree, needs_growth, mesher):
+        self.key = key
+        self.generation = generation
+        self.tree_key = tree_key
+        self.tree = tree
+        self.needs_growth = needs_growth
+        self.mesher = mesher
+        self.cancellation_token = m_tree.CancellationToken()
+        self.progress = None # (phase, fraction), written by the worker thread
+
+    def set_progress(self, phase, fraction):
+        self.progress = (phase, fraction)
+
+    def run(self):
+        # both calls release the GIL, blender keeps running while the tree is built.
+        # A cancelled job raises m_tree.OperationCancelled, and the partially grown tree is not cached
+        if self.needs_growth:
+            self.tree.execute_functions(self.set_progress, self.cancellation_token)
+            tree_cache.add(self.tree_key, self.tree)
+        return self.mesher.mesh_tree(self.tree, self.set_progress, self.cancellation_token)
+
+
+class RebuildScheduler:
+    '''
+    Builds trees on a worker thread when the parameters of a mesher node change.
+    Requests arriving within `delay` seconds of each other are merged into a single build,
+    and only the result of the latest request of a mesher node is written to its blender object.
+    '''
+
+    def __init__(self, delay=.15, poll_interval=.02):
+        self.delay = delay
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.generations = {} # latest requested generation, per mesher node
+        self.deadlines = {} # time at which a pending request is started, per mesher node
+        self.running = [] # (job, future) pairs
+        self.executor = None
+        self.timer = self.tick # keep a single reference so the timer can be unregistered
+
+    @staticmethod
+    def get_key(mesher_node):
+        return (mesher_node.get_node_tree().name, mesher_node.name)
+
+    @staticmethod
+    def get_mesher_node(key):
+        node_tree = bpy.data.node_groups.get(key[0], None)
+        if node_tree is None:
+            return None
+        return node_tree.nodes.get(key[1], None)
+
+    def request(self, mesher_node):
+        key = self.get_key(mesher_node)
+        with self.lock:
+            self.generations[key] = self.generations.get(key, 0) + 1
+        for job, future in self.running: # superseded builds stop at their next safe point
+            if job.key == key:
+                job.cancellation_token.cancel()
+        self.deadlines[key] = time.monotonic() + self.delay
+        if not bpy.app.timers.is_registered(self.timer):
+            bpy.app.timers.register(self.timer, first_interval=self.poll_interval)
+
+    def cancel_all(self):
+        with self.lock:
+            for key in self.generations:
+                self.generations[key] += 1
+        for job, future in self.running:
+            job.cancellation_token.cancel()
+        self.deadlines.clear()
+        self.running.clear()
+        self.show_progress()
+        if bpy.app.timers.is_registered(self.timer):
+            bpy.app.timers.unregister(self.timer)
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def is_latest(self, job):
+        with self.lock:
+            return self.generations.get(job.key) == job.generation
+
+    def run_job(self, job):
+        if not self.is_latest(job): # a newer request arrived while the job was waiting
+            return None
+        try:
+            return job.run()
+        except m_tree.OperationCancelled:
+            return None
+
+    def start_job(self, key):
+        mesher_node = self.get_mesher_node(key)
+        if mesher_node is None or not mesher_node.get_tree_validity():
+            return
+        with self.lock:
+            generation = self.generations[key]
+        # the function graph reads blender data, so it has to be built on the main thread
+        tree_key, tree, needs_growth = mesher_node.prepare_tree()
+        job = BuildJob(key, generation, tree_key, tree, needs_growth, mesher_node.create_mesher())
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mtree_rebuild")
+        self.running.append((job, self.executor.submit(self.run_job, job)))
+
+    def collect_results(self):
+        still_running = []
+        for job, future in self.running:
+            if not future.done():
+                still_running.append((job, future))
+                continue
+            if future.exception() is not None:
+                traceback.print_exception(type(future.exception()), future.exception(), future.exception().__traceback__)
+                continue
+            cpp_mesh = future.result()
+            if cpp_mesh is None or not self.is_latest(job):
+                continue
+            mesher_node = self.get_mesher_node(job.key)
+            if mesher_node is not None:
+                mesher_node.output_object(cpp_mesh)
+                mesher_node.store_profile(job.tree, job.mesher, job.needs_growth)
+        self.running = still_running
+
+    def tick(self):
+        now = time.monotonic()
+        for key, deadline in list(self.deadlines.items()):
+            if deadline <= now:
+                del self.deadlines[key]
+                self.start_job(key)
+        self.collect_results()
+        self.show_progress()
+        if self.deadlines or self.running:
+            return self.poll_interval
+        return None # unregisters the timer
+
+    def show_progress(self):
+        # progress of the oldest running build in the status bar, cleared once every build is done
+        progress = next((job.progress for job, future in self.running if job.progress is not None), None)
+        text = None if progress is None else f"Modular Tree: {progress[0]} {progress[1]:.0%}"
+        for window in bpy.context.window_manager.windows:
+            window.workspace.status_text_set(text)
+
+
+scheduler = RebuildScheduler()
@@ -0,0 +1,50 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class TreeCache:
+    '''
+    Grown trees, keyed by a hash of the function graph they were grown from.
+    Editing only the mesher parameters, or going back to previous parameters, reuses the grown tree instead of growing it again.
+    The least recently used trees are dropped when the trees use more than max_memory bytes.
+    '''
+
+    def __init__(self, max_memory=512 * 2**20):
+        self.max_memory = max_memory
+        self.lock = threading.Lock() # trees are added from the rebuild worker thread
+        self.entries = OrderedDict() # key -> (tree, memory)
+        self.memory = 0
+
+    @staticmethod
+    def get_key(function_signature):
+        return hashlib.sha1(repr(function_signature).encode()).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def add(self, key, tree):
+        memory = tree.get_memory_usage()
+        if memory > self.max_memory:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.memory -= self.entries.pop(key)[1]
+            self.entries[key] = (tree, memory)
+            self.memory += memory
+            while self.memory > self.max_memory:
+                _, (_, evicted_memory) = self.entries.popitem(last=False)
+                self.memory -= evicted_memory
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.memory = 0
+
+
+tree_cache = TreeCache()
@@ -1,13 +1,26 @@
 import bpy
 from bpy.utils import register_class, unregister_class
-from .node_tree import MtreeNodeTree
+from .node_tree import MtreeNodeTree, compiled_graphs
 
 classes = [MtreeNodeTree]
 
+@bpy.app.handlers.persistent
+def clear_compiled_graphs(*args):
+    # undo and file loading replace the node trees without calling their update
+    compiled_graphs.clear()
+
+handlers = [bpy.app.handlers.undo_post, bpy.app.handlers.redo_post, bpy.app.handlers.load_post]
+
 def register():
     for cls in classes:
         register_class(cls)
+    for handler in handlers:
+        handler.append(clear_compiled_graphs)
 
 def unregister():
+    for handler in handlers:
+        if clear_compiled_graphs in handler:
+            handler.remove(clear_compiled_graphs)
+    compiled_graphs.clear()
     for cls in reversed(classes):
         unregister_class(cls)
\ No newline at end of file
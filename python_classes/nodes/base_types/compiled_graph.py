@@ -0,0 +1,112 @@
+from .node import MtreeFunctionNode
+
+
+class CompiledGraph:
+    '''
+    Topology of a node tree, computed once and kept until the node tree is edited: the order of its nodes,
+    the mesher node each node is connected to, the validity of each mesher node and the functions it grows.
+    The native functions are kept between builds, only the parameters that changed since the previous build are set on them.
+    '''
+
+    def __init__(self, node_tree):
+        self.node_tree = node_tree
+        names = [node.name for node in node_tree.nodes]
+        self.children = {node.name: [child.name for child in node.get_child_nodes()] for node in node_tree.nodes}
+        self.order = self.get_topological_order(names) # parents before children, nodes in a loop are left out
+        self.meshers = self.get_meshers(names) # name of the mesher node connected to each node, or None
+        self.function_calls = {} # (node name, index of the parent call) of each function grown by a valid mesher node, in the order of the function ids
+        for name, node in zip(names, node_tree.nodes):
+            if node.bl_idname == "mt_MesherNode" and self.has_valid_tree(node):
+                self.function_calls[name] = self.get_function_calls(node.outputs[0].links[0].to_node.name)
+        self.functions = {} # native function of each function node, created by the first build
+        self.applied_parameters = {} # parameter values last set on each native function
+
+    def get_topological_order(self, names):
+        parent_counts = {name: 0 for name in names}
+        for name in names:
+            for child in self.children[name]:
+                parent_counts[child] += 1
+        ready = [name for name in reversed(names) if parent_counts[name] == 0]
+        order = []
+        while ready:
+            name = ready.pop()
+            order.append(name)
+            for child in self.children[name]:
+                parent_counts[child] -= 1
+                if parent_counts[child] == 0:
+                    ready.append(child)
+        return order
+
+    def get_meshers(self, names):
+        neighbours = {name: list(children) for name, children in self.children.items()}
+        for name in names:
+            for child in self.children[name]:
+                neighbours[child].append(name)
+        meshers = {}
+        for name in names:
+            if name in meshers:
+                continue
+            component = [name]
+            meshers[name] = None
+            for current in component: # grows while it is iterated
+                for neighbour in neighbours[current]:
+                    if neighbour not in meshers:
+                        meshers[neighbour] = None
+                        component.append(neighbour)
+            mesher = next((node for node in component if self.node_tree.nodes[node].bl_idname == "mt_MesherNode"), None)
+            for node in component:
+                meshers[node] = mesher
+        return meshers
+
+    def has_valid_tree(self, mesher_node):
+        if len(mesher_node.outputs[0].links) != 1 or not isinstance(mesher_node.outputs[0].links[0].to_node, MtreeFunctionNode):
+            return False
+        ordered = set(self.order)
+        descendants = [mesher_node.name]
+        for name in descendants: # grows while it is iterated
+            if name not in ordered:
+                return False
+            descendants += self.children[name]
+        return True
+
+    def get_function_calls(self, trunk_name):
+        calls = []
+        def add_calls_rec(name, parent_index):
+            calls.append((name, parent_index))
+            index = len(calls) - 1
+            for child in self.children[name]:
+                if isinstance(self.node_tree.nodes[child], MtreeFunctionNode):
+                    add_calls_rec(child, index)
+        add_calls_rec(trunk_name, -1)
+        return calls
+
+    def get_mesher(self, name):
+        mesher = self.meshers.get(name, None)
+        return None if mesher is None else self.node_tree.nodes[mesher]
+
+    def is_valid(self, mesher_name):
+        return mesher_name in self.function_calls
+
+    def get_function_nodes(self, mesher_name):
+        # names of the function nodes, indexed by the ids the tree gives to the functions
+        return [name for name, _ in self.function_calls[mesher_name]]
+
+    def get_trunk_function(self, mesher_name):
+        calls = self.function_calls[mesher_name]
+        if calls[0][0] not in self.functions:
+            links = set() # a node reached through several parents is called once per path, but linked once to each parent
+            for name, parent_index in calls:
+                if name not in self.functions:
+                    self.functions[name] = self.node_tree.nodes[name].create_function()
+                    self.applied_parameters[name] = {}
+                if parent_index >= 0 and (calls[parent_index][0], name) not in links:
+                    links.add((calls[parent_index][0], name))
+                    self.functions[calls[parent_index][0]].add_child(self.functions[name])
+        for name in dict.fromkeys(name for name, _ in calls):
+            self.node_tree.nodes[name].update_function(self.functions[name], self.applied_parameters[name])
+        return self.functions[calls[0][0]]
+
+    def get_function_signature(self, mesher_name):
+        # describes every input of the functions last returned by get_trunk_function, graphs with equal signatures grow the same tree
+        return tuple((self.node_tree.nodes[name].bl_idname, parent_index, tuple(self.applied_parameters[name].items()))
+                     for name, parent_index in self.function_calls[mesher_name])
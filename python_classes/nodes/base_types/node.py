@@ -1,5 +1,7 @@
 import bpy
 
+missing = object() # value of the parameters that were never set
+
 
 
 class MtreeNode:
@@ -40,24 +42,8 @@ class MtreeNode:
             setattr(socket, key, value)
 
 
-    def get_mesher_rec(self, seen_nodes):
-        if self.bl_idname == 'mt_MesherNode':
-            return self
-
-        seen_nodes.add(self.name)
-        
-        for neighbour in self.get_neighbours():
-            if neighbour.name in seen_nodes:
-                continue
-            mesher = neighbour.get_mesher_rec(seen_nodes)
-            if mesher is not None:
-                return mesher
-        return None
-    
-
     def get_mesher(self):
-        seen_nodes = set()
-        return self.get_mesher_rec(seen_nodes)
+        return self.get_node_tree().get_compiled_graph().get_mesher(self.name)
 
     # Node events, don't override ----------------
 
@@ -92,25 +78,29 @@ class MtreeFunctionNode(MtreeNode):
         for parameter in self.exposed_parameters + self.advanced_parameters:
             layout.prop(self, parameter)
 
-    def construct_function(self):
-        function_instance = self.tree_function()
+    def create_function(self):
+        # children are added by the compiled graph of the node tree, parameters by update_function
+        return self.tree_function()
+
+    def update_function(self, function_instance, applied_parameters):
+        # only the parameters that changed since they were recorded in applied_parameters are set on the function.
+        # Properties linked to a node are compared through their signature
         for parameter in self.exposed_parameters:
-            setattr(function_instance, parameter, getattr(self, parameter))
-        
+            value = getattr(self, parameter)
+            if applied_parameters.get(parameter, missing) != value:
+                setattr(function_instance, parameter, value)
+                applied_parameters[parameter] = value
         for input_socket in self.inputs:
-            if input_socket.is_property:
-                if input_socket.bl_idname == "mt_PropertySocket":
-                    property = input_socket.get_property()
-                    setattr(function_instance, input_socket.property_name, property)
-                else:
-                    setattr(function_instance, input_socket.property_name, input_socket.property_value)
-        
-        for child in self.get_child_nodes():
-            if isinstance(child, MtreeFunctionNode):
-                child_function = child.construct_function()
-                function_instance.add_child(child_function)
-
-        return function_instance
+            if not input_socket.is_property:
+                continue
+            is_property_socket = input_socket.bl_idname == "mt_PropertySocket"
+            if is_property_socket and input_socket.is_linked:
+                value = input_socket.links[0].from_node.get_property_signature()
+            else:
+                value = input_socket.property_value
+            if applied_parameters.get(input_socket.property_name, missing) != value:
+                setattr(function_instance, input_socket.property_name, input_socket.get_property() if is_property_socket else value)
+                applied_parameters[input_socket.property_name] = value
 
 
 class MtreePropertyNode(MtreeNode):
@@ -122,4 +112,8 @@ class MtreePropertyNode(MtreeNode):
             if input_socket.is_property:
                 setattr(property, input_socket.property_name, input_socket.property_value)
         return property
+
+    def get_property_signature(self):
+        inputs = tuple((socket.property_name, socket.property_value) for socket in self.inputs if socket.is_property)
+        return (self.bl_idname, inputs)
     
@@ -1,7 +1,22 @@
 import bpy
+from .compiled_graph import CompiledGraph
+
+compiled_graphs = {} # compiled graph of each node tree, dropped when the node tree is edited
 
 
 class MtreeNodeTree(bpy.types.NodeTree):
     bl_idname = "mt_MtreeNodeTree"
     bl_label = "Mtree"
-    bl_icon = "ONIONSKIN_ON"
\ No newline at end of file
+    bl_icon = "ONIONSKIN_ON"
+
+    def update(self):
+        # called by blender when nodes or links change. Parameter edits don't change the graph, they are patched by each build
+        compiled_graphs.pop(self.as_pointer(), None)
+
+    def get_compiled_graph(self):
+        graph = compiled_graphs.get(self.as_pointer(), None)
+        if graph is None:
+            graph = CompiledGraph(self)
+            compiled_graphs[self.as_pointer()] = graph
+        graph.node_tree = self # the python object of a node tree isn't kept by blender
+        return graph
\ No newline at end of file
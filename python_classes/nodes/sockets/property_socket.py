@@ -14,7 +14,7 @@ class MtreePropertySocket(bpy.types.NodeSocket, MtreeSocket):
         self["property_value"] = max(self.min_value, min(self.max_value, self.property_value))
         mesher = self.node.get_mesher()
         if mesher is not None:
-            mesher.build_tree()
+            mesher.request_rebuild()
     
     property_value : bpy.props.FloatProperty(default = 0, update=update_value)
 
@@ -3,16 +3,24 @@ from bpy.utils import register_class, unregister_class
 import nodeitems_utils
 
 from .branch_node import BranchNode
-from .tree_mesher_node import TreeMesherNode
+from .tree_mesher_node import TreeMesherNode, clear_node_data
 from .trunk_node import TrunkNode
 from .pipe_radius_node import PipeRadiusNode
 
 classes = [BranchNode, TreeMesherNode, TrunkNode, PipeRadiusNode]
 
+@bpy.app.handlers.persistent
+def clear_mesher_node_data(*args):
+    clear_node_data()
+
 def register():
     for cls in classes:
         register_class(cls)
+    bpy.app.handlers.load_post.append(clear_mesher_node_data)
 
 def unregister():
+    if clear_mesher_node_data in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(clear_mesher_node_data)
+    clear_node_data()
     for cls in classes:
         unregister_class(cls)
@@ -1,11 +1,24 @@
 import time
+import copy
 import numpy as np
 import bpy
 from .... import m_tree
 from ..base_types.node import MtreeNode 
+from ...generation.rebuild_scheduler import scheduler
+from ...generation.tree_cache import tree_cache
+
+meshers = {} # last mesher of each mesher node. New meshers are copied from it to keep its cached smoothing data
+grown_trees = {} # last tree of each mesher node. New trees resume growing from its snapshots
+profiles = {} # timings and counts of the last build of each mesher node
+mesh_topologies = {} # blender mesh and topology hash of the last mesh written by each mesher node
+
+def clear_node_data():
+    # the pointers of the mesher nodes are not valid anymore once the addon is unregistered or a file is loaded
+    for node_data in (meshers, grown_trees, profiles, mesh_topologies):
+        node_data.clear()
 
 def on_update_prop(node, context):
-    node.build_tree()
+    node.request_rebuild()
 
 class TreeMesherNode(bpy.types.Node, MtreeNode):
     bl_idname = "mt_MesherNode"
@@ -13,11 +26,19 @@ class TreeMesherNode(bpy.types.Node, MtreeNode):
 
     radial_resolution : bpy.props.IntProperty(name="Radial Resolution", default=32, min=3, update=on_update_prop)
     smoothness : bpy.props.IntProperty(name="smoothness", default=4, min=0, update=on_update_prop)
+    target_edge_length : bpy.props.FloatProperty(name="Target Edge Length", default=0, min=0, precision=3, update=on_update_prop, description="When positive, thinner branches get fewer vertices around them to keep edges about this long")
+    min_radial_resolution : bpy.props.IntProperty(name="Min Radial Resolution", default=4, min=4, update=on_update_prop)
     tree_object : bpy.props.StringProperty(default="")
+    show_profile : bpy.props.BoolProperty(name="Show Profile", default=False, description="Time the generation of the tree and show where the time is spent")
 
     def init(self, context):
         self.add_output("mt_TreeSocket", "Tree", is_property=False)
 
+    def free(self):
+        # the grown tree of a deleted node would otherwise be kept alive outside of the tree cache
+        for node_data in (meshers, grown_trees, profiles, mesh_topologies):
+            node_data.pop(self.as_pointer(), None)
+
     def draw_generate(self, container):
         properties = container.operator("mtree.node_function", text="Generate Tree")
         properties.node_tree_name = self.get_node_tree().name
@@ -32,6 +53,9 @@ class TreeMesherNode(bpy.types.Node, MtreeNode):
     def draw_properties(self, container):
         container.prop(self, "radial_resolution")
         container.prop(self, "smoothness")
+        container.prop(self, "target_edge_length")
+        if self.target_edge_length > 0:
+            container.prop(self, "min_radial_resolution")
 
     def draw_distribute_leaves(self, container):
         if self.has_valid_tree_object():
@@ -51,21 +75,94 @@ class TreeMesherNode(bpy.types.Node, MtreeNode):
         leaves_row = layout.row()
         leaves_row.enabled = valid_tree
         self.draw_distribute_leaves(leaves_row)
+        layout.prop(self, "show_profile")
+        if self.show_profile:
+            self.draw_profile(layout.box())
+
+    def draw_profile(self, container):
+        profile = profiles.get(self.as_pointer(), None)
+        if profile is None:
+            container.label(text="Generate the tree to profile it")
+            return
+        if profile["growth"] is None:
+            container.label(text="Growth: tree reused from the cache")
+        else:
+            for function in profile["growth"]:
+                time_text = "snapshot" if function["from_snapshot"] else f"{function['time'] * 1000:.1f} ms"
+                container.label(text=f"{function['node_name']}: {time_text}, {function['node_count']} nodes")
+        meshing = profile["meshing"]
+        container.label(text=f"Meshing: {meshing['meshing_time'] * 1000:.1f} ms (rings {meshing['ring_time'] * 1000:.1f} ms, bridges {meshing['bridge_time'] * 1000:.1f} ms)")
+        container.label(text=f"Smoothing: {meshing['smoothing_time'] * 1000:.1f} ms")
+        container.label(text=f"{meshing['vertex_count']} vertices, {meshing['polygon_count']} polygons")
+        container.label(text=f"Peak memory: {profile['peak_memory'] / 2**20:.0f} MB")
 
     def build_tree(self):
         if not self.get_tree_validity():
             return
-        tree = m_tree.Tree()
-        trunk_function = self.outputs[0].links[0].to_node.construct_function()
-        tree.set_trunk_function(trunk_function)
-        tree.execute_functions()
+        tree_key, tree, needs_growth = self.prepare_tree()
+        if needs_growth:
+            tree.execute_functions()
+            tree_cache.add(tree_key, tree)
         cpp_mesh = self.mesh_tree(tree)
         self.output_object(cpp_mesh)
-    
-    def mesh_tree(self, tree):
-        mesher = m_tree.ManifoldMesher()
+        self.store_profile(tree, meshers[self.as_pointer()], needs_growth)
+
+    def store_profile(self, tree, mesher, grown):
+        # growth timings are only meaningful when the tree was grown for this build, not taken from the cache
+        growth = None
+        if grown:
+            function_nodes = self.get_node_tree().get_compiled_graph().get_function_nodes(self.name)
+            growth = tree.get_profile()["functions"]
+            for function in growth:
+                function["node_name"] = function_nodes[function["id"]] if function["id"] < len(function_nodes) else function["name"]
+        profiles[self.as_pointer()] = {"growth": growth, "meshing": mesher.get_profile(), "peak_memory": m_tree.get_peak_memory_usage()}
+        if self.show_profile:
+            for window in bpy.context.window_manager.windows:
+                for area in window.screen.areas:
+                    if area.type == 'NODE_EDITOR':
+                        area.tag_redraw()
+
+    def request_rebuild(self):
+        # build in the background, successive edits are merged into a single build
+        if self.get_tree_validity():
+            scheduler.request(self)
+
+    def prepare_tree(self):
+        # returns the key of the tree in the cache, the tree, and whether the tree still has to be grown
+        graph = self.get_node_tree().get_compiled_graph()
+        trunk_function = graph.get_trunk_function(self.name)
+        tree_key = tree_cache.get_key(graph.get_function_signature(self.name))
+        tree = tree_cache.get(tree_key)
+        needs_growth = tree is None
+        if needs_growth:
+            tree = self.create_tree(trunk_function)
+            previous_tree = grown_trees.get(self.as_pointer(), None)
+            if previous_tree is not None:
+                tree.inherit_snapshots(previous_tree) # only the functions downstream of the edit are executed again
+        grown_trees[self.as_pointer()] = tree
+        return tree_key, tree, needs_growth
+
+    def create_tree(self, trunk_function):
+        tree = m_tree.Tree()
+        # the functions of the compiled graph are patched by the next builds, the tree grows from its own copy
+        tree.set_trunk_function(trunk_function.clone())
+        tree.store_snapshots = True
+        return tree
+
+    def create_mesher(self):
+        previous_mesher = meshers.get(self.as_pointer(), None)
+        mesher = m_tree.ManifoldMesher() if previous_mesher is None else copy.copy(previous_mesher)
         mesher.radial_n_points = self.radial_resolution
         mesher.smooth_iterations = self.smoothness
+        mesher.target_edge_length = self.target_edge_length
+        mesher.min_radial_resolution = self.min_radial_resolution
+        mesher.thread_count = 0
+        mesher.detailed_profiling = self.show_profile
+        meshers[self.as_pointer()] = mesher
+        return mesher
+    
+    def mesh_tree(self, tree):
+        mesher = self.create_mesher()
         mesh_data = mesher.mesh_tree(tree)
         return mesh_data
 
@@ -83,59 +180,66 @@ class TreeMesherNode(bpy.types.Node, MtreeNode):
     def output_object(self, cp_mesh):
         tree_obj = self.get_current_tree_object()
         tree_mesh = tree_obj.data
-        tree_mesh.clear_geometry()
         bpy.context.view_layer.objects.active = tree_obj
-        self.fill_blender_mesh(tree_mesh, cp_mesh)
-   
+        # when only the shape changed, the geometry of the blender mesh is kept and only its data is updated
+        topology = (tree_mesh.as_pointer(), cp_mesh.get_topology_hash())
+        if mesh_topologies.get(self.as_pointer(), None) == topology and self.can_update_blender_mesh(tree_mesh, cp_mesh):
+            self.update_blender_mesh(tree_mesh, cp_mesh)
+        else:
+            tree_mesh.clear_geometry()
+            self.fill_blender_mesh(tree_mesh, cp_mesh)
+        mesh_topologies[self.as_pointer()] = topology
+
+    def can_update_blender_mesh(self, mesh, cpp_mesh):
+        # the mesh may have been edited since it was filled
+        buffers = cpp_mesh.get_buffers()
+        return (len(mesh.vertices) * 3 == len(buffers["vertices"]) and len(mesh.loops) == len(buffers["polygons"])
+                and "radius" in mesh.attributes and "direction" in mesh.attributes and len(mesh.uv_layers) > 0)
+
+    def update_blender_mesh(self, mesh, cpp_mesh):
+        buffers = cpp_mesh.get_buffers()
+        mesh.vertices.foreach_set("co", buffers["vertices"])
+        self.set_attributes_and_uvs(mesh, buffers)
+        mesh.update()
+
     def fill_blender_mesh(self, mesh, cpp_mesh):
-        verts = cpp_mesh.get_vertices()
-        faces = np.copy(cpp_mesh.get_polygons()[::-1]) # reverse faces to flip normals
-        radii = cpp_mesh.get_float_attribute("radius")
-        directions = cpp_mesh.get_vector3_attribute("direction")
+        buffers = cpp_mesh.get_buffers() # views on the mesh memory, no copy is made
+        verts = buffers["vertices"]
+        faces = np.ascontiguousarray(buffers["polygons"][::-1]) # reverse faces to flip normals
+        edges, loop_edges = cpp_mesh.get_edges() # computed natively so that blender doesn't have to
+        # each corner of a reversed face goes to the previous corner of the original face
+        loop_edges = np.ascontiguousarray(loop_edges.reshape(-1, 4)[::-1, [2, 1, 0, 3]]).ravel()
 
         mesh.vertices.add(len(verts)//3)
         mesh.vertices.foreach_set("co", verts)
+        mesh.edges.add(len(edges)//2)
+        mesh.edges.foreach_set("vertices", edges)
         mesh.attributes.new(name='radius', type='FLOAT', domain='POINT')
-        mesh.attributes['radius'].data.foreach_set('value', radii)
         mesh.attributes.new(name='direction', type='FLOAT_VECTOR', domain='POINT')
-        mesh.attributes['direction'].data.foreach_set('vector', directions)
         
         mesh.loops.add(len(faces))
         mesh.loops.foreach_set("vertex_index", faces)
+        mesh.loops.foreach_set("edge_index", loop_edges)
         
-        loop_start = np.arange(0, len(faces), 4, dtype=np.int)
-        loop_total = np.ones(len(faces)//4, dtype = np.int)*4
+        loop_start = np.arange(0, len(faces), 4, dtype=np.int32)
+        loop_total = np.ones(len(faces)//4, dtype=np.int32)*4
         mesh.polygons.add(len(faces)//4)
         mesh.polygons.foreach_set("loop_start", loop_start)
         mesh.polygons.foreach_set("loop_total", loop_total)
-        mesh.polygons.foreach_set('use_smooth',  np.ones(len(faces)//4, dtype=np.bool))
+        mesh.polygons.foreach_set('use_smooth',  np.ones(len(faces)//4, dtype=bool))
         
-        
-        uv_data = cpp_mesh.get_uvs()
-        uv_data.shape = (len(uv_data)//2, 2)
-        uv_loops = np.copy(cpp_mesh.get_uv_loops()[::-1]) # need to be reversed since faces are reversed
-        uvs = uv_data[uv_loops].flatten()
-        uv_layer = mesh.uv_layers.new() if len(mesh.uv_layers) == 0 else mesh.uv_layers[0]
-        uv_layer.data.foreach_set("uv", uvs)
-        
-        mesh.update(calc_edges=True)    
+        if len(mesh.uv_layers) == 0:
+            mesh.uv_layers.new()
+        self.set_attributes_and_uvs(mesh, buffers)
+        mesh.update()
+
+    def set_attributes_and_uvs(self, mesh, buffers):
+        mesh.attributes['radius'].data.foreach_set('value', buffers["attributes"]["radius"])
+        mesh.attributes['direction'].data.foreach_set('vector', buffers["attributes"]["direction"])
+        uv_data = buffers["uvs"].reshape(-1, 2)
+        uv_loops = buffers["uv_loops"][::-1] # need to be reversed since faces are reversed
+        uvs = uv_data[uv_loops].ravel()
+        mesh.uv_layers[0].data.foreach_set("uv", uvs)
 
     def get_tree_validity(self):
-        has_valid_child = len(self.outputs[0].links) == 1
-        loops_detected = self.detect_loop_rec(self)
-        return has_valid_child and not loops_detected
-
-    def detect_loop_rec(self, node = None, seen_nodes = None):
-        if node is None: 
-            node = self
-        if seen_nodes is None:
-            seen_nodes = set()
-        for output in node.outputs:
-            for link in output.links:
-                destination_node = link.to_node
-                if destination_node in seen_nodes:
-                    return True
-                seen_nodes.add(destination_node)
-                self.detect_loop_rec(destination_node, seen_nodes)
-        return False
-
+        return self.get_node_tree().get_compiled_graph().is_valid(self.name)